@@ -1,18 +1,29 @@
 import asyncio
 from pydantic import BaseModel, ValidationError, validator
-from typing import List, Optional, Dict, Any, Literal, AsyncGenerator
-import instructor
-from openai import AsyncOpenAI
+from typing import List, Optional, Dict, Any, Literal, AsyncGenerator, Union
 from dotenv import load_dotenv
 import os
-from search import search_card_by_name, get_rulings_for_question, analyze_card_mechanics
+import time
+from search import search_card_by_name, get_rulings_for_question, mechanics_search, get_cards_by_names
 from vlm_rulebook_search import unstructured_search
+from db import run_in_db
+from semantic_cache import SemanticCache
+from card_mentions import MAX_MENTIONED_CARDS, find_card_mentions
+from metrics import AGENT_ACTIONS, AGENT_TURNS, DUPLICATE_ACTIONS, record_stage, span
 
 # Load environment variables
 load_dotenv()
 
-# Set up OpenAI API client
-client = instructor.patch(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+# OpenAI API client, created on first use: importing openai alone takes about half a second of startup
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        import instructor
+        from openai import AsyncOpenAI
+        _client = instructor.patch(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+    return _client
 
 # Pydantic Models
 
@@ -47,47 +58,156 @@ class Answer(BaseModel):
 
 class AgentResponse(BaseModel):
     thought: Optional[Thought] = None
-    action: Optional[Action] = None
+    action: Optional[Action] = None  # first action of the turn, kept for single-action clients
+    actions: List[Action] = []
     observation: Optional[Observation] = None
     answer: Optional[Answer] = None
 
+class AgentDelta(BaseModel):
+    # Incremental text of one section of a streamed completion
+    section: Literal["thought", "answer", "ruling"]
+    content: str
+    turn: int
+
+class StreamingResponseParser:
+    # Splits a streamed completion into Thought/Answer/Ruling text deltas as the tokens arrive.
+    # Follows the same line rules as parse_response: a section starts at a line beginning with its
+    # prefix, a Thought is one line, and an Answer runs until the Ruling.
+    PREFIXES = {"Thought:": "thought", "Action:": "action", "Answer:": "answer", "Ruling:": "ruling", "PAUSE": "pause"}
+    STREAMED_SECTIONS = {"thought", "answer", "ruling"}
+
+    def __init__(self, turn: int = 0):
+        self.turn = turn
+        self.text = ""
+        self.section: Optional[str] = None
+        self.line = ""
+        self.line_classified = False
+        self.skip_space = False
+
+    def feed(self, chunk: str) -> List[AgentDelta]:
+        self.text += chunk
+        pieces: List[tuple] = []
+        for char in chunk:
+            if char == "\n":
+                if not self.line_classified:
+                    self._classify(pieces, end_of_line=True)
+                if self.section == "thought":
+                    self.section = None
+                else:
+                    self._emit("\n", pieces)
+                self.line = ""
+                self.line_classified = False
+            elif self.line_classified:
+                if self.skip_space and char in " \t":
+                    continue
+                self.skip_space = False
+                self._emit(char, pieces)
+            else:
+                self.line += char
+                self._classify(pieces)
+
+        # Merge consecutive characters of the same section into one delta
+        deltas: List[AgentDelta] = []
+        for section, text in pieces:
+            if deltas and deltas[-1].section == section:
+                deltas[-1].content += text
+            else:
+                deltas.append(AgentDelta(section=section, content=text, turn=self.turn))
+        return deltas
+
+    def _classify(self, pieces: List[tuple], end_of_line: bool = False):
+        for prefix, section in self.PREFIXES.items():
+            if self.line.startswith(prefix):
+                self.section = section
+                self.line_classified = True
+                self.skip_space = True
+                for char in self.line[len(prefix):].lstrip():
+                    self.skip_space = False
+                    self._emit(char, pieces)
+                return
+        if end_of_line or not any(prefix.startswith(self.line) for prefix in self.PREFIXES):
+            # Not a section header: the line continues the current section
+            self.line_classified = True
+            for char in self.line:
+                self._emit(char, pieces)
+
+    def _emit(self, text: str, pieces: List[tuple]):
+        if self.section in self.STREAMED_SECTIONS:
+            pieces.append((self.section, text))
+
 class YuGiOhAgent:
-    def __init__(self, system: Optional[str] = "", verbose: bool = False):
+    def __init__(self, system: Optional[str] = "", verbose: bool = False, prefetch: bool = False, stream: bool = False,
+                 semantic_cache: Optional[SemanticCache] = None, link_mentions: bool = False):
         self.system = system
         self.messages: List[Message] = []
         if self.system:
             self.messages.append(Message(role="system", content=system))
         self.verbose = verbose
+        self.prefetch = prefetch
+        self.stream = stream
+        self.semantic_cache = semantic_cache
+        self.link_mentions = link_mentions
+        self.completion_count = 0
         self.action_history: List[str] = []
         self.thinking_turns = 0
         self.max_thinking_turns = 3
     
-    async def __call__(self, question: str, cards: List[Card]) -> AsyncGenerator[AgentResponse, None]:
-        self.messages.append(Message(role="user", content=f"Question: {question}\nCards: {[card.name for card in cards]}"))
+    async def __call__(self, question: str, cards: List[Card]) -> AsyncGenerator[Union[AgentResponse, AgentDelta], None]:
+        if self.link_mentions:
+            cards = cards + await self.find_mentioned_cards(question, cards)
+        card_names = [card.name for card in cards]
+        if self.semantic_cache is not None:
+            # A reworded question about the same cards reuses the stored answer and skips the loop
+            cached_answer = await run_in_db(self.semantic_cache.lookup, question, card_names)
+            if cached_answer:
+                print("Answered from semantic cache")
+                yield AgentResponse(
+                    thought=Thought(content="This question matches one that was already answered for the same cards."),
+                    answer=Answer(**cached_answer)
+                )
+                return
+
+        self.messages.append(Message(role="user", content=f"Question: {question}\nCards: {card_names}"))
         turn_count = 0
         max_turns = 15
         action_count = 0
         max_actions = 10
+
+        if self.prefetch:
+            # Analyze every card, search its rulings and search the rulebook up front, all at once, before
+            # the first model turn. These don't count against max_actions, which is the model's own budget
+            prefetch_actions = self.get_prefetch_actions(question, cards)
+            print(f"Prefetching {len(prefetch_actions)} actions")
+            async for response in self.run_actions(None, prefetch_actions, cards):
+                yield response
         
         while turn_count < max_turns:
             turn_count += 1
             print(f"Turn {turn_count}")
-            result = await self.execute()
+            AGENT_TURNS.inc(kind="action")
+            async for item in self.generate():
+                if isinstance(item, AgentDelta):
+                    yield item
+                else:
+                    result = item
             response = self.parse_response(result)
             yield response
             
-            if response.action:
-                if self.is_duplicate_action(response.action):
-                    print(f"Skipping duplicate action: {response.action.name}")
-                    continue
-                
-                action_count += 1
-                print(f"Performing action {action_count}: {response.action.name}")
-                observation = await self.perform_action(response.action, cards)
-                response.observation = Observation(content=observation)
-                self.messages.append(Message(role="system", content=f"Observation: {observation}"))
-                self.action_history.append(f"{response.action.name}:{response.action.input}")
-                yield response
+            if response.actions:
+                actions = []
+                for action in response.actions:
+                    if self.is_duplicate_action(action) or action in actions:
+                        print(f"Skipping duplicate action: {action.name}")
+                        DUPLICATE_ACTIONS.inc(action=action.name)
+                        continue
+                    actions.append(action)
+                actions = actions[:max_actions - action_count]
+                # With nothing left to run (all duplicates, or no budget) fall through to the checks below
+                if actions:
+                    print(f"Performing actions {action_count + 1}-{action_count + len(actions)}: {[action.name for action in actions]}")
+                    async for action_response in self.run_actions(response.thought, actions, cards):
+                        action_count += 1
+                        yield action_response
             
             if self.has_sufficient_information():
                 print("Sufficient information gathered. Starting thinking turns.")
@@ -96,9 +216,14 @@ class YuGiOhAgent:
                     thinking_prompt = self.get_thinking_prompt(self.thinking_turns)
                     self.messages.append(Message(role="system", content=thinking_prompt))
                     print(f"Thinking turn {self.thinking_turns}")
+                    AGENT_TURNS.inc(kind="thinking")
                     
                     # Execute thinking turn
-                    result = await self.execute()
+                    async for item in self.generate():
+                        if isinstance(item, AgentDelta):
+                            yield item
+                        else:
+                            result = item
                     response = self.parse_response(result)
                     yield response
                     
@@ -107,10 +232,17 @@ class YuGiOhAgent:
                         self.messages.append(Message(role="assistant", content=response.thought.content))
                 
                 print("Executing final answer")
-                final_result = await self.execute_final_answer()
+                AGENT_TURNS.inc(kind="final")
+                async for item in self.generate(final=True):
+                    if isinstance(item, AgentDelta):
+                        yield item
+                    else:
+                        final_result = item
                 final_response = self.parse_response(final_result)
                 if final_response.answer:
                     print("Final answer provided")
+                    if self.semantic_cache is not None:
+                        await run_in_db(self.semantic_cache.store, question, card_names, final_response.answer.dict())
                     yield final_response
                 else:
                     print("Unable to reach a conclusive answer")
@@ -145,6 +277,39 @@ class YuGiOhAgent:
                 )
                 break
 
+    async def run_actions(self, thought: Optional[Thought], actions: List[Action], cards: List[Card]) -> AsyncGenerator[AgentResponse, None]:
+        # Independent actions run concurrently; observations are recorded in the order they were requested
+        observations = await asyncio.gather(*(self.perform_action(action, cards) for action in actions))
+        for action, observation in zip(actions, observations):
+            AGENT_ACTIONS.inc(action=action.name)
+            if len(actions) > 1:
+                self.messages.append(Message(role="system", content=f"Observation ({action.name}: {action.input}): {observation}"))
+            else:
+                self.messages.append(Message(role="system", content=f"Observation: {observation}"))
+            self.action_history.append(f"{action.name}:{action.input}")
+            yield AgentResponse(thought=thought, action=action, actions=[action], observation=Observation(content=observation))
+
+    async def find_mentioned_cards(self, question: str, cards: List[Card]) -> List[Card]:
+        # Cards named in the question that the user didn't select join the inquiry
+        selected = {card.name for card in cards}
+        names = [name for name in await run_in_db(find_card_mentions, question) if name not in selected][:MAX_MENTIONED_CARDS]
+        if not names:
+            return []
+        print(f"Cards mentioned in the question: {names}")
+        rows = await run_in_db(get_cards_by_names, names)
+        return [
+            Card(name=row['name'], humanReadableCardType=row['humanReadableCardType'], desc=row['desc'], race=row['race'],
+                 atk=row['atk'], def_=row['def'], attribute=row['attribute'], level=row['level'])
+            for row in rows
+        ]
+
+    def get_prefetch_actions(self, question: str, cards: List[Card]) -> List[Action]:
+        actions = [Action(name="analyze_mechanics", input=card.name) for card in cards]
+        actions += [Action(name="search_rulings", input=card.name) for card in cards]
+        # The rulebook search too, so has_sufficient_information can be met without spending a model turn on it
+        actions.append(Action(name="search_rulebook", input=question))
+        return actions
+
     def has_sufficient_information(self) -> bool:
         #required_actions = {"analyze_mechanics", "search_rulings"}
         required_actions = {'analyze_mechanics', 'search_rulings', 'search_rulebook'}
@@ -178,7 +343,42 @@ class YuGiOhAgent:
         return f"{action.name}:{action.input}" in self.action_history
 
    
-    async def execute_final_answer(self):
+    async def generate(self, final: bool = False) -> AsyncGenerator[Union[AgentDelta, str], None]:
+        # Yields text deltas while streaming, then the full completion text as the last item
+        self.completion_count += 1
+        if not self.stream:
+            yield await (self.execute_final_answer() if final else self.execute())
+            return
+
+        messages = self.final_answer_messages() if final else [message.dict() for message in self.messages]
+        parser = StreamingResponseParser(turn=self.completion_count)
+        started = time.perf_counter()
+        first_token = True
+        stream = await get_client().chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=300,
+            n=1,
+            stop=None,
+            temperature=0.7,
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                if first_token:
+                    first_token = False
+                    record_stage("llm.first_token", time.perf_counter() - started)
+                for delta in parser.feed(text):
+                    yield delta
+        # Includes the time the caller spent on the deltas in between, which is the latency a client sees
+        record_stage("llm.completion", time.perf_counter() - started)
+        print(f"Executing: {parser.text.strip()}")
+        yield parser.text.strip()
+
+    def final_answer_messages(self) -> List[Dict[str, str]]:
         messages = [message.dict() for message in self.messages]
         
         # # Check if the last message contains a valid answer
@@ -194,26 +394,32 @@ class YuGiOhAgent:
             "role": "system",
             "content": "You have gathered and analyzed all necessary information. Please provide a final answer and ruling based on your analysis. Be decisive and explain your reasoning clearly. If there are any remaining uncertainties, acknowledge them but provide the most likely ruling based on the available information."
         })
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=300,
-            n=1,
-            stop=None,
-            temperature=0.7,
-        )
+        return messages
+
+    async def execute_final_answer(self):
+        messages = self.final_answer_messages()
+        with span("llm.completion"):
+            response = await get_client().chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                max_tokens=300,
+                n=1,
+                stop=None,
+                temperature=0.7,
+            )
         return response.choices[0].message.content.strip()
     
     async def execute(self):
         messages = [message.dict() for message in self.messages]
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=300,
-            n=1,
-            stop=None,
-            temperature=0.7,
-        )
+        with span("llm.completion"):
+            response = await get_client().chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                max_tokens=300,
+                n=1,
+                stop=None,
+                temperature=0.7,
+            )
         print(f"Executing: {response.choices[0].message.content.strip()}")
         return response.choices[0].message.content.strip()
     
@@ -226,9 +432,16 @@ class YuGiOhAgent:
             if line.startswith("Thought:"):
                 response.thought = Thought(content=line[8:].strip())
             elif line.startswith("Action:"):
+                # Several Action lines in one turn are run in parallel
                 action_parts = line[7:].strip().split(":", 1)
                 if len(action_parts) == 2:
-                    response.action = Action(name=action_parts[0].strip(), input=action_parts[1].strip())
+                    try:
+                        action = Action(name=action_parts[0].strip(), input=action_parts[1].strip())
+                    except ValidationError:
+                        continue
+                    response.actions.append(action)
+                    if response.action is None:
+                        response.action = action
             elif line.startswith("Answer:"):
                 # answer_parts = line[7:].strip().split("\nRuling:", 1)
                 answer_parts = content.split("Answer:", 1)[1].split("Ruling:", 1)
@@ -240,23 +453,25 @@ class YuGiOhAgent:
         return response
 
     async def perform_action(self, action: Action, cards: List[Card]) -> str:
-        if action.name == "search_rulings":
-            card_names = [card.name for card in cards]
-            if action.input not in card_names:
-                return f"Error: Can only search rulings for cards mentioned in the question. '{action.input}' is not in the provided list of cards."
-            rulings = await get_rulings_for_question(action.input, card_names)
-            return "\n".join([ruling.content for ruling in rulings])
-        elif action.name == "analyze_mechanics":
-            card = next((c for c in cards if c.name == action.input), None)
-            if card:
-                mechanics = analyze_card_mechanics(card)
-                return str(mechanics)
-            return f"Card '{action.input}' not found in the provided list."
-        elif action.name == "search_rulebook":
-            # self.rulebook_searched = True
-            return await unstructured_search(action.input)
-        else:
-            return f"Unknown action: {action.name}"
+        # Each action is its own stage: action.search_rulings, action.analyze_mechanics, action.search_rulebook
+        with span(f"action.{action.name}"):
+            if action.name == "search_rulings":
+                card_names = [card.name for card in cards]
+                if action.input not in card_names:
+                    return f"Error: Can only search rulings for cards mentioned in the question. '{action.input}' is not in the provided list of cards."
+                rulings = await get_rulings_for_question(action.input, card_names)
+                return "\n".join([ruling.content for ruling in rulings])
+            elif action.name == "analyze_mechanics":
+                card = next((c for c in cards if c.name == action.input), None)
+                if card:
+                    mechanics = await mechanics_search(card)
+                    return str(mechanics)
+                return f"Card '{action.input}' not found in the provided list."
+            elif action.name == "search_rulebook":
+                # self.rulebook_searched = True
+                return await unstructured_search(action.input)
+            else:
+                return f"Unknown action: {action.name}"
 
         
 
@@ -272,18 +487,19 @@ prompt = """
 You are a Yu-Gi-Oh! judge AI. Your job is to answer questions about card interactions and provide rulings. You run in a loop of Thought, Action, PAUSE, Observation. At the end of the loop, you output an Answer with a Ruling.
 
 1. Use Thought to describe your thoughts about the question you have been asked.
-2. Use Action to run one of the actions available to you, then return PAUSE.
+2. Use Action to run one of the actions available to you, then return PAUSE. If you need several actions that don't depend on each other's results, write one Action line for each before PAUSE and they will run in parallel.
 3. You will receive an Observation, which is the result of running the action.
 4. Repeat steps 1-3 until you have enough information to provide an Answer, or until you've taken 10 turns.
 5. End with an Answer that includes an explanation and a Ruling.
 
 Your available actions are:
 - search_rulings: Search for relevant rulings about the cards. Only use this for cards mentioned in the question.
-- analyze_mechanics: Get a detailed breakdown of a card's mechanics.
+- analyze_mechanics: Get a detailed breakdown of a card's mechanics, including each of its effects split into condition, cost and resolution, with its conjunctions, targeting and once-per-turn limits.
 - search_rulebook: Look up relevant rules in the Yu-Gi-Oh! rulebook.
 
 Important guidelines:
 - Do not repeat the same action with the same input.
+- Prefer requesting all the independent actions you need in a single turn.
 - Only search for rulings of the specific cards mentioned in the question.
 - If you're unsure after 10 turns, provide your best answer based on the information you have, or state that you're unsure.
 
@@ -0,0 +1,229 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from fixture import build_fixture, load_names, query_corpus
+
+'''
+Latency benchmark for the search and ruling retrieval hot paths.
+
+Builds (or reuses) a synthetic fixture database (fixture.py), replays a seeded corpus of card name
+queries and ruling questions against each stage, and reports p50/p95/p99 latency, throughput and
+the process's peak RSS per stage. The cross-encoder is replaced by StubCrossEncoder, so rerank
+numbers measure the batching/caching path plus a configurable per-pair cost, not the model.
+Results are written as JSON; --compare prints the change against an earlier results file.
+
+    python benchmarks/bench_search.py --cards 5000 --rulings 20000 --queries 500
+    python benchmarks/bench_search.py --compare benchmarks/results/search_<commit>.json
+'''
+
+STAGES = ['search_card_by_name', 'get_exact_rulings', 'get_relevant_rulings', 'rerank_rulings',
+          'analyze_card_mechanics', 'get_card_mechanics']
+
+
+class StubCrossEncoder:
+    # Stands in for cross-encoder/ms-marco-MiniLM-L-6-v2: scores a pair by word overlap and spends
+    # per_pair_ms per pair, so batching behaves like the real model without loading it
+    def __init__(self, per_pair_ms: float = 0.0):
+        self.per_pair_ms = per_pair_ms
+
+    def predict(self, pairs, batch_size: int = 32):
+        if self.per_pair_ms:
+            time.sleep(self.per_pair_ms * len(pairs) / 1000.0)
+        scores = []
+        for question, text in pairs:
+            question_words = set(question.lower().split())
+            scores.append(len(question_words & set(text.lower().split())) / (len(question_words) or 1))
+        return scores
+
+
+def import_search(stub: StubCrossEncoder):
+    # search.py loads its cross-encoder through sentence_transformers.CrossEncoder; hand it the stub instead
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    import sentence_transformers
+    sentence_transformers.CrossEncoder = lambda *args, **kwargs: stub
+    import search
+    return search
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float, rss_before: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'throughput_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - rss_before,
+    }
+
+
+def run_stage(calls: List[Callable[[], Any]], warmup: int) -> Dict[str, Any]:
+    # Module prints inside the stages would dominate short calls on a terminal; they go to a buffer
+    with contextlib.redirect_stdout(io.StringIO()):
+        for call in calls[:warmup]:
+            call()
+        rss_before = peak_rss_mb()
+        latencies = []
+        start = time.perf_counter()
+        for call in calls:
+            call_start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, elapsed, rss_before)
+
+
+def run_async_stage(calls: List[Callable[[], Any]], warmup: int) -> Dict[str, Any]:
+    async def timed():
+        for call in calls[:warmup]:
+            await call()
+        rss_before = peak_rss_mb()
+        latencies = []
+        start = time.perf_counter()
+        for call in calls:
+            call_start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - call_start)
+        return summarize(latencies, time.perf_counter() - start, rss_before)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(timed())
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(db_path: str, queries: int, seed: int, warmup: int, rerank_ms_per_pair: float,
+                  stages: List[str]) -> Dict[str, Dict[str, Any]]:
+    stub = StubCrossEncoder(rerank_ms_per_pair)
+    search = import_search(stub)
+    from card_mechanics import analyze_card_text
+    from reranker import RerankerService
+
+    name_queries, questions = query_corpus(load_names(db_path), queries, seed)
+    cards = search.get_cards_by_names(sorted({name for _, names in questions for name in names}), db_path)
+    cards_by_name = {card['name']: search.Card(**{**card, 'def_': card['def'], 'card_images': []}) for card in cards}
+    mechanics_cards = [cards_by_name[names[0]] for _, names in questions if names[0] in cards_by_name]
+
+    results = {}
+    for stage in stages:
+        if stage == 'search_card_by_name':
+            results[stage] = run_stage([lambda q=q: search.search_card_by_name(q, db_path) for q in name_queries], warmup)
+        elif stage == 'get_exact_rulings':
+            results[stage] = run_stage([lambda n=names: search.get_exact_rulings(n, db_path) for _, names in questions], warmup)
+        elif stage == 'get_relevant_rulings':
+            results[stage] = run_stage([lambda n=names: search.get_relevant_rulings(n, db_path) for _, names in questions], warmup)
+        elif stage == 'rerank_rulings':
+            # Candidates are gathered up front so only the rerank itself is timed; a fresh service per run
+            # keeps the score cache from turning the replay into cache hits
+            with contextlib.redirect_stdout(io.StringIO()):
+                candidates = [(question, search.fuse_rulings([search.get_exact_rulings(names, db_path),
+                                                              search.get_relevant_rulings(names, db_path)]))
+                              for question, names in questions]
+            search.reranker = RerankerService(lambda: stub)
+            results[stage] = run_async_stage([lambda q=q, r=r: search.rerank_rulings(q, r) for q, r in candidates], warmup)
+        elif stage == 'analyze_card_mechanics':
+            # The analysis itself, without the memoization in front of it
+            results[stage] = run_stage([lambda c=card: analyze_card_text(c.desc) for card in mechanics_cards], warmup)
+        elif stage == 'get_card_mechanics':
+            results[stage] = run_stage([lambda c=card: search.get_card_mechanics(c, db_path) for card in mechanics_cards], warmup)
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+        summary = results[stage]
+        print(f"{stage:24} p50 {summary['p50_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms  "
+              f"{summary['throughput_per_s']:9.1f}/s  peak RSS {summary['peak_rss_mb']:.0f} MB")
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nAgainst {baseline['meta'].get('commit', '?')} ({baseline['meta'].get('timestamp', '?')}):")
+    for stage, summary in results['stages'].items():
+        before = baseline['stages'].get(stage)
+        if not before:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            ratio = summary[metric] / before[metric] if before[metric] else float('inf')
+            changes.append(f"{metric[:-3]} {ratio:5.2f}x")
+        print(f"{stage:24} " + '  '.join(changes))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the search and ruling retrieval hot paths on a synthetic database")
+    parser.add_argument('--cards', type=int, default=2000, help="cards in the fixture")
+    parser.add_argument('--rulings', type=int, default=5000, help="QA + FAQ rulings in the fixture")
+    parser.add_argument('--queries', type=int, default=200, help="queries replayed per stage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=10, help="untimed calls before each stage")
+    parser.add_argument('--rerank-ms-per-pair', type=float, default=0.0, help="time the stub cross-encoder spends per pair")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--db', help="fixture database (default: benchmarks/data/, built when missing)")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the fixture even if it exists")
+    parser.add_argument('--output', help="results JSON (default: benchmarks/results/search_<commit>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(BENCH_DIR, 'data', f'fixture_{args.cards}_{args.rulings}_s{args.seed}.db')
+    if args.rebuild or not os.path.exists(db_path):
+        build_fixture(db_path, args.cards, args.rulings, args.seed)
+
+    commit = git_commit()
+    stages = run_benchmark(db_path, args.queries, args.seed, args.warmup, args.rerank_ms_per_pair, args.stages)
+    results = {
+        'meta': {
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'db': os.path.abspath(db_path),
+            'cards': args.cards,
+            'rulings': args.rulings,
+            'queries': args.queries,
+            'seed': args.seed,
+            'rerank_ms_per_pair': args.rerank_ms_per_pair,
+        },
+        'stages': stages,
+    }
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'search_{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
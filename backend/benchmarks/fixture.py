@@ -0,0 +1,189 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'db_scripts'))
+from card_mechanics_table import build_card_mechanics_table
+from card_name_index import build_card_name_index
+from cardscraper import CARD_TABLE_SCHEMA
+from db_meta import bump_db_version
+from fix_rulings import create_ruling_tables
+
+'''
+Synthetic yugioh.db for the benchmarks.
+
+build_fixture writes a database of any size in the same schema the ETL produces (cards, the card
+name index, card_mechanics, qa_tl_fixed, qa_card_mentions, faq_tl_entries_fixed, db_meta), using
+the ETL's own table builders. Names, card text and rulings are generated from a seeded RNG, so the
+same (cards, rulings, seed) always gives the same database and the same query corpus.
+'''
+
+NAME_WORDS = [
+    'Dark', 'Magician', 'Blue-Eyes', 'White', 'Dragon', 'Ash', 'Blossom', 'Joyous', 'Spring', 'Elemental',
+    'HERO', 'Cyber', 'Shaddoll', 'Fusion', 'Sky', 'Striker', 'Tearlaments', 'Kashtira', 'Snake-Eye',
+    'Accesscode', 'Talker', 'Infinite', 'Impermanence', 'Called', 'Grave', 'Nibiru', 'Primal', 'Being',
+    'Maxx', 'Borreload', 'Savage', 'Knightmare', 'Unicorn', 'Crystal', 'Wing', 'Synchro', 'Galaxy-Eyes',
+    'Photon', 'Number', 'Utopia', 'Raigeki', 'Mirror', 'Force', 'Solemn', 'Judgment', 'Mystic', 'Typhoon',
+]
+CARD_TYPES = ['Effect Monster', 'Fusion Monster', 'Synchro Monster', 'Xyz Monster', 'Link Monster',
+              'Normal Spell', 'Quick-Play Spell', 'Continuous Trap', 'Counter Trap']
+RACES = ['Spellcaster', 'Dragon', 'Warrior', 'Fiend', 'Machine', 'Zombie', 'Fairy', 'Normal', 'Quick-Play', 'Counter']
+ATTRIBUTES = ['DARK', 'LIGHT', 'FIRE', 'WATER', 'EARTH', 'WIND']
+
+CONDITIONS = [
+    'If this card is Normal or Special Summoned', 'When your opponent activates a card or effect (Quick Effect)',
+    'If this card is sent to the GY', 'During the Main Phase (Quick Effect)', 'Once per turn',
+    'When a monster declares an attack', 'If this card is destroyed by battle or card effect',
+]
+COSTS = ['You can discard this card', 'You can target 1 monster on the field', 'You can Tribute this card',
+         'You can banish 1 card from your GY', 'You can detach 1 material from this card', 'You can pay 1000 LP']
+RESOLUTIONS = [
+    'destroy it', 'negate that effect', 'draw 1 card', 'Special Summon 1 "{name}" from your Deck',
+    'add 1 "{name}" from your Deck to your hand, then discard 1 card', 'banish it, and if you do, draw 1 card',
+    'send 1 monster from your Deck to the GY, also you cannot Special Summon for the rest of this turn',
+]
+CONTINUOUS = ['Cannot be destroyed by battle.', 'Must be Special Summoned by its own effect.',
+              'Gains 500 ATK for each card in your GY.', 'Your opponent cannot target this card with card effects.']
+QUESTIONS = [
+    'If {a} is activated, can I chain {b} in response?',
+    'Does {a} negate the effect of {b} if {b} was activated from the hand?',
+    'If I target {a} with {b}, and {a} leaves the field, does {b} still resolve?',
+    'Can {a} be Special Summoned while {b} is face-up on the field?',
+    'When {a} is sent to the GY by {b}, does its effect activate?',
+]
+ANSWERS = ['Yes.', 'No.', 'Yes, the effect resolves as normal.', 'No, the effect is negated.',
+           'Yes, but only once per turn.', 'No, it misses the timing.']
+
+
+def card_names(count, rng):
+    # Unique names of 2-4 words
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = ' '.join(rng.sample(NAME_WORDS, rng.randint(2, 4)))
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+def card_text(name, names, rng):
+    sentences = []
+    for _ in range(rng.randint(1, 3)):
+        if rng.random() < 0.25:
+            sentences.append(rng.choice(CONTINUOUS))
+            continue
+        resolution = rng.choice(RESOLUTIONS).format(name=rng.choice(names))
+        if rng.random() < 0.6:
+            sentences.append(f'{rng.choice(CONDITIONS)}: {rng.choice(COSTS)}; {resolution}.')
+        else:
+            sentences.append(f'{rng.choice(COSTS)}; {resolution}.')
+    if rng.random() < 0.5:
+        sentences.append(f'You can only use each effect of "{name}" once per turn.')
+    return ' '.join(sentences)
+
+def build_fixture(db_path, cards=2000, rulings=5000, seed=0):
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    names = card_names(cards, rng)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute(CARD_TABLE_SCHEMA)
+        conn.execute("CREATE UNIQUE INDEX idx_cards_ygoprodeck_id ON cards (ygoprodeckId)")
+        card_ids = list(range(10000000, 10000000 + cards))
+        id_names = list(zip(card_ids, names))
+        conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (card_id, name, rng.choice(CARD_TYPES), card_text(name, names, rng), rng.choice(RACES),
+             rng.randrange(0, 3100, 100), rng.randrange(0, 3100, 100), rng.choice(ATTRIBUTES),
+             json.dumps({'id': card_id}), rng.randint(1, 12))
+            for card_id, name in id_names
+        ])
+
+    # No card JSON or card store: only the English names from the cards table are indexed, so the
+    # fixture doesn't depend on which real card data happens to be next to it
+    missing_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'no_card_data')
+    build_card_name_index(conn, cards_dir=missing_dir, store_dir=missing_dir)
+
+    qa_count = rulings * 2 // 3
+    with conn:
+        create_ruling_tables(conn.cursor())
+        qa_rows, mention_rows = [], []
+        for qa_id in range(qa_count):
+            (a_id, a), (b_id, b) = rng.sample(id_names, 2)
+            question = rng.choice(QUESTIONS).format(a=a, b=b)
+            qa_rows.append((qa_id, 'en', f'{a} and {b}', question, rng.choice(ANSWERS), '2024-01-01', qa_id, 'bench', 'bench'))
+            mention_rows += [(qa_id, 'en', a_id, a), (qa_id, 'en', b_id, b)]
+        conn.executemany("INSERT INTO qa_tl_fixed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", qa_rows)
+        conn.executemany("INSERT OR IGNORE INTO qa_card_mentions VALUES (?, ?, ?, ?)", mention_rows)
+
+        faq_rows = []
+        for effect in range(rulings - qa_count):
+            card_id, name = rng.choice(id_names)
+            other = rng.choice(names)
+            faq_rows.append((card_id, 'en', effect, effect, f'If "{other}" is on the field, the effect of "{name}" {rng.choice(ANSWERS).lower()}', name))
+        conn.executemany("INSERT OR IGNORE INTO faq_tl_entries_fixed VALUES (?, ?, ?, ?, ?, ?)", faq_rows)
+        conn.executemany("INSERT INTO ruling_card_names VALUES (?, ?)", id_names)
+
+        build_card_mechanics_table(conn)
+        bump_db_version(conn, 'cards')
+        bump_db_version(conn, 'rulings')
+    conn.close()
+    print(f"Fixture {db_path}: {cards} cards, {rulings} rulings ({time.perf_counter() - start:.1f}s)")
+    return names
+
+def load_names(db_path):
+    # Card names of an existing fixture, in insertion order
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT name FROM cards ORDER BY ygoprodeckId")]
+    finally:
+        conn.close()
+
+def query_corpus(names, count, seed=0):
+    # Card name queries the way users type them (exact, lowercase, prefixes, substrings, typos)
+    # and ruling questions that mention one or two cards
+    rng = random.Random(seed + 1)
+    name_queries, questions = [], []
+    for _ in range(count):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.3:
+            query = name
+        elif kind < 0.5:
+            query = name.lower()
+        elif kind < 0.7:
+            query = name[:rng.randint(3, max(3, len(name) - 1))]
+        elif kind < 0.85:
+            words = name.split()
+            query = words[rng.randrange(len(words))]
+        else:
+            position = rng.randrange(len(name))
+            query = name[:position] + name[position + 1:]
+        name_queries.append(query)
+
+        cards = rng.sample(names, rng.randint(1, 2))
+        question = rng.choice(QUESTIONS).format(a=cards[0], b=cards[-1])
+        questions.append((question, cards))
+    return name_queries, questions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic yugioh.db for the benchmarks")
+    parser.add_argument('db_path')
+    parser.add_argument('--cards', type=int, default=2000)
+    parser.add_argument('--rulings', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    build_fixture(args.db_path, args.cards, args.rulings, args.seed)
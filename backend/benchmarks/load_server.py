@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import time
+import zlib
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from bench_search import StubCrossEncoder, import_search
+from prefork import memory_report, serve
+
+'''
+server.py as a load test target.
+
+Runs the unmodified FastAPI app from server.py against a fixture database, with the cross-encoder
+and the embedding model replaced by stubs and OpenAI calls going to OPENAI_BASE_URL (stub_llm.py),
+and adds what the load test reads from inside the process:
+
+- GET /bench/stats: open and peak WebSocket connections, current RSS and PSS, and the event-loop
+  lag measured by a probe task that sleeps LAG_PROBE_INTERVAL and records how late it wakes up.
+  ?reset=1 clears the lag samples and the connection peak.
+
+With --workers N the server is preforked (prefork.py). The counters and the lag histogram are in
+shared memory, so any worker answers /bench/stats for all of them, and memory is summed over the
+master and its workers: RSS counts the shared model and indexes once per process, PSS once in total.
+
+The server runs with its working directory in --workdir, where yugioh.db links to the fixture and
+the inquiry and semantic caches start empty. load_test.py starts it; on its own:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8101/v1 python benchmarks/load_server.py --db benchmarks/data/fixture_2000_5000_s0.db
+'''
+
+LAG_PROBE_INTERVAL = 0.01
+# Lag histogram resolution and range: 0.1 ms buckets up to 5 s
+LAG_BUCKET_MS = 0.1
+LAG_BUCKETS = 50000
+
+
+class StubEmbedder:
+    # Stands in for the sentence-transformers embedding model of the semantic cache: hashed bag of
+    # words, normalized, so identical questions still match and different ones don't
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def encode(self, texts: List[str], batch_size: int = 64, normalize_embeddings: bool = True, convert_to_numpy: bool = True):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode('utf-8')) % self.dimensions] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def process_group(master_pid: int) -> List[int]:
+    # The master and the workers it forked
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children', 'r') as f:
+            return [master_pid] + [int(pid) for pid in f.read().split()]
+    except OSError:
+        return [master_pid]
+
+
+def current_rss_mb() -> float:
+    # Resident set size now; /proc is Linux only, elsewhere the peak is the best available
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class ServerStats:
+    # Created before the fork, so every worker updates the same counters
+    def __init__(self, master_pid: int):
+        self.master_pid = master_pid
+        # open, peak and total connections
+        self.connections = multiprocessing.Array('q', 3)
+        self.lag_counts = multiprocessing.RawArray('q', LAG_BUCKETS)
+        self.lag_max = multiprocessing.RawValue('d', 0.0)
+
+    def connection_opened(self):
+        with self.connections.get_lock():
+            self.connections[0] += 1
+            self.connections[2] += 1
+            self.connections[1] = max(self.connections[1], self.connections[0])
+
+    def connection_closed(self):
+        with self.connections.get_lock():
+            self.connections[0] -= 1
+
+    def record_lag(self, seconds: float):
+        milliseconds = seconds * 1000
+        self.lag_counts[min(LAG_BUCKETS - 1, int(milliseconds / LAG_BUCKET_MS))] += 1
+        self.lag_max.value = max(self.lag_max.value, milliseconds)
+
+    def reset(self):
+        with self.connections.get_lock():
+            self.connections[1] = self.connections[0]
+        np.frombuffer(self.lag_counts, dtype=np.int64)[:] = 0
+        self.lag_max.value = 0.0
+
+    def lag_percentile(self, counts: np.ndarray, fraction: float) -> float:
+        # Upper edge of the bucket holding the percentile, in ms
+        total = int(counts.sum())
+        if not total:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(counts), fraction * total))
+        return (index + 1) * LAG_BUCKET_MS
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts = np.frombuffer(self.lag_counts, dtype=np.int64).copy()
+        report = memory_report(process_group(self.master_pid))
+        with self.connections.get_lock():
+            open_connections, peak_connections, total_connections = self.connections[:]
+        return {
+            'processes': max(1, len(report)),
+            'open_connections': open_connections,
+            'peak_connections': peak_connections,
+            'total_connections': total_connections,
+            'rss_mb': sum(values.get('rss_mb', 0.0) for values in report.values()) if report else current_rss_mb(),
+            'pss_mb': sum(values.get('pss_mb', 0.0) for values in report.values()) if report else current_rss_mb(),
+            'loop_lag_samples': int(counts.sum()),
+            'loop_lag_p50_ms': self.lag_percentile(counts, 0.50),
+            'loop_lag_p99_ms': self.lag_percentile(counts, 0.99),
+            'loop_lag_max_ms': self.lag_max.value,
+        }
+
+
+class ConnectionCounter:
+    # ASGI middleware counting the WebSocket sessions the endpoint is serving
+    def __init__(self, app, stats: ServerStats):
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            await self.app(scope, receive, send)
+            return
+        self.stats.connection_opened()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.stats.connection_closed()
+
+
+async def probe_loop_lag(stats: ServerStats, interval: float = LAG_PROBE_INTERVAL):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        stats.record_lag(max(0.0, time.perf_counter() - expected))
+
+
+def prepare_workdir(db_path: str, workdir: str):
+    # A fresh directory per run: the fixture as yugioh.db, no recorded inquiries or cached answers
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    target = os.path.join(workdir, 'yugioh.db')
+    try:
+        os.symlink(os.path.abspath(db_path), target)
+    except OSError:
+        shutil.copyfile(db_path, target)
+
+
+def create_app(db_path: str, workdir: str, rerank_ms_per_pair: float = 0.0, quiet: bool = True):
+    prepare_workdir(db_path, workdir)
+    os.chdir(workdir)
+    os.environ['INQUIRY_CACHE_PATH'] = os.path.join(workdir, 'inquiry_cache.db')
+    os.environ['SEMANTIC_CACHE_DIR'] = os.path.join(workdir, 'semantic_cache')
+    os.environ.setdefault('OPENAI_BASE_URL', 'http://127.0.0.1:8101/v1')
+
+    import_search(StubCrossEncoder(rerank_ms_per_pair))
+    import dense_index
+    dense_index.get_embedder = lambda: StubEmbedder()
+    import server
+    if quiet:
+        # server.log and the httpx request lines, both INFO
+        server.ENABLE_LOGGING = False
+        logging.disable(logging.INFO)
+
+    stats = ServerStats(os.getpid())
+    app = server.app
+
+    @app.get("/bench/stats")
+    async def bench_stats(reset: int = 0):
+        snapshot = stats.snapshot()
+        if reset:
+            stats.reset()
+        return snapshot
+
+    @app.on_event("startup")
+    async def start_lag_probe():
+        app.state.lag_probe = asyncio.get_event_loop().create_task(probe_loop_lag(stats))
+
+    return ConnectionCounter(app, stats), server.warm_up.run
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+
+    parser = argparse.ArgumentParser(description="Run server.py against a fixture database for load testing")
+    parser.add_argument('--db', required=True, help="fixture database (benchmarks/fixture.py)")
+    parser.add_argument('--workdir', help="working directory of the server (default: next to the fixture)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--rerank-ms-per-pair', type=float, default=0.0, help="time the stub cross-encoder spends per pair")
+    parser.add_argument('--workers', type=int, default=1, help="preforked server workers (prefork.py)")
+    parser.add_argument('--verbose', action='store_true', help="keep the server's logging and the agent's prints")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or os.path.join(os.path.dirname(os.path.abspath(args.db)), 'load_server'))
+    app, preload = create_app(args.db, workdir, args.rerank_ms_per_pair, quiet=not args.verbose)
+    # The agent prints every turn; under load that is most of what the process would write
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, 'w')):
+        serve(app, host=args.host, port=args.port, workers=args.workers, preload=preload,
+              log_level='info' if args.verbose else 'warning')
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from bench_search import git_commit, percentile
+from fixture import build_fixture, load_names, query_corpus
+
+'''
+Load test of the /ws endpoint of server.py.
+
+Starts the scripted OpenAI stand-in (stub_llm.py) and server.py on a fixture database
+(load_server.py), then for each client count opens that many concurrent WebSocket clients, each
+sending a seeded mix of card_search and inquiry messages. Questions get a unique suffix and the
+semantic cache threshold is out of reach, so the inquiry caches don't turn inquiries into replays
+(--cacheable sends repeatable questions and leaves the caches on).
+
+Reported per client count: connections opened and failed, connect time, card_search round trip,
+time to the first agent_delta and agent_response of an inquiry and to its final answer, the
+server's event-loop lag, and its memory (PSS) with every client connected, as memory per connection.
+The load generator shares the machine with the server; past a few hundred clients give it
+its own host and pass --server-url/--llm-url.
+
+    python benchmarks/load_test.py --clients 10 50 100 200 --messages 5 --first-token-ms 400
+'''
+
+DEFAULT_PORT = 8100
+DEFAULT_LLM_PORT = 8101
+
+
+def http_json(url: str, timeout: float = 5.0) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def wait_until_up(url: str, process: Optional[subprocess.Popen], timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            return http_json(url, timeout=1.0)
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} not up after {timeout:.0f}s")
+
+
+def load_inquiry_cards(db_path: str) -> Dict[str, Dict[str, Any]]:
+    # The card payload the frontend sends with an inquiry, by name
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute('SELECT name, humanReadableCardType, "desc", race, atk, def, attribute, level FROM cards').fetchall()
+    finally:
+        conn.close()
+    return {row['name']: {**{key: row[key] for key in row.keys() if key != 'def'}, 'def_': row['def']} for row in rows}
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    ordered = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+class ClientResults:
+    def __init__(self):
+        self.connect: List[float] = []
+        self.connect_failures = 0
+        self.card_search: List[float] = []
+        self.first_delta: List[float] = []
+        self.first_response: List[float] = []
+        self.inquiry_total: List[float] = []
+        self.inquiry_messages: List[int] = []
+        self.errors: List[str] = []
+
+
+async def run_client(url: str, client_id: int, messages: int, inquiry_ratio: float, think_ms: float,
+                     name_queries: List[str], questions: List[tuple], cards: Dict[str, Dict[str, Any]],
+                     cacheable: bool, seed: int, connected: asyncio.Event, all_connected: asyncio.Event,
+                     results: ClientResults, timeout: float):
+    rng = random.Random(seed * 100003 + client_id)
+    start = time.perf_counter()
+    try:
+        websocket = await websockets.connect(url, max_size=None, open_timeout=timeout)
+    except Exception as e:
+        results.connect_failures += 1
+        results.errors.append(f"connect: {e!r}")
+        connected.set()
+        return
+    results.connect.append(time.perf_counter() - start)
+    connected.set()
+
+    try:
+        # Every client holds its connection until all are open, so the memory reading sees all of them
+        await all_connected.wait()
+        for message in range(messages):
+            if think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000.0)
+            if rng.random() >= inquiry_ratio:
+                sent = time.perf_counter()
+                await websocket.send(json.dumps({'type': 'card_search', 'query': rng.choice(name_queries)}))
+                while json.loads(await asyncio.wait_for(websocket.recv(), timeout))['type'] != 'search_results':
+                    pass
+                results.card_search.append(time.perf_counter() - sent)
+                continue
+
+            question, names = rng.choice(questions)
+            if not cacheable:
+                question = f"{question} (client {client_id}, message {message})"
+            sent = time.perf_counter()
+            await websocket.send(json.dumps({'type': 'inquiry', 'question': question,
+                                             'cards': [cards[name] for name in names if name in cards]}))
+            first_delta = first_response = None
+            received = 0
+            while True:
+                reply = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+                received += 1
+                now = time.perf_counter()
+                if reply['type'] == 'agent_delta' and first_delta is None:
+                    first_delta = now - sent
+                elif reply['type'] == 'agent_response':
+                    if first_response is None:
+                        first_response = now - sent
+                    # The final answer (or the inconclusive one) is the last message of an inquiry
+                    if reply['data'].get('answer'):
+                        break
+            results.inquiry_total.append(time.perf_counter() - sent)
+            results.first_response.append(first_response)
+            if first_delta is not None:
+                results.first_delta.append(first_delta)
+            results.inquiry_messages.append(received)
+    except Exception as e:
+        results.errors.append(f"client {client_id}: {e!r}")
+    finally:
+        await websocket.close()
+
+
+async def run_level(url: str, stats_url: str, clients: int, args, name_queries, questions, cards) -> Dict[str, Any]:
+    # Idle server first, then the same server holding every connection, then after the traffic
+    baseline = http_json(stats_url + '?reset=1')
+    results = ClientResults()
+    all_connected = asyncio.Event()
+    connected_events = [asyncio.Event() for _ in range(clients)]
+    start = time.perf_counter()
+    tasks = []
+    for client_id in range(clients):
+        tasks.append(asyncio.ensure_future(run_client(
+            url, client_id, args.messages, args.inquiry_ratio, args.think_ms, name_queries, questions, cards,
+            args.cacheable, args.seed, connected_events[client_id], all_connected, results, args.timeout)))
+        if args.ramp_s:
+            await asyncio.sleep(args.ramp_s / clients)
+    await asyncio.gather(*(event.wait() for event in connected_events))
+    holding = http_json(stats_url)
+    all_connected.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    final = http_json(stats_url)
+
+    opened = len(results.connect)
+    # PSS: with preforked workers the shared model and indexes count once, not once per worker
+    memory_growth = holding['pss_mb'] - baseline['pss_mb']
+    return {
+        'clients': clients,
+        'connections_opened': opened,
+        'connections_failed': results.connect_failures,
+        'server_peak_connections': final['peak_connections'],
+        'connect': summarize(results.connect),
+        'card_search': summarize(results.card_search),
+        'first_agent_delta': summarize(results.first_delta),
+        'first_agent_response': summarize(results.first_response),
+        'inquiry_total': summarize(results.inquiry_total),
+        'inquiries_completed': len(results.inquiry_total),
+        'messages_per_inquiry': sum(results.inquiry_messages) / len(results.inquiry_messages) if results.inquiry_messages else 0.0,
+        'inquiries_per_s': len(results.inquiry_total) / elapsed if elapsed else 0.0,
+        'card_searches_per_s': len(results.card_search) / elapsed if elapsed else 0.0,
+        'loop_lag_p50_ms': final['loop_lag_p50_ms'],
+        'loop_lag_p99_ms': final['loop_lag_p99_ms'],
+        'loop_lag_max_ms': final['loop_lag_max_ms'],
+        'server_processes': final['processes'],
+        'rss_idle_mb': baseline['rss_mb'],
+        'rss_connected_mb': holding['rss_mb'],
+        'rss_end_mb': final['rss_mb'],
+        'pss_idle_mb': baseline['pss_mb'],
+        'pss_connected_mb': holding['pss_mb'],
+        'pss_end_mb': final['pss_mb'],
+        'memory_per_connection_kb': memory_growth * 1024 / opened if opened else 0.0,
+        'elapsed_s': elapsed,
+        'errors': results.errors[:20],
+        'error_count': len(results.errors),
+    }
+
+
+def print_level(level: Dict[str, Any]):
+    print(f"{level['clients']:5} clients: {level['connections_opened']} open / {level['connections_failed']} failed, "
+          f"card_search p50 {level['card_search']['p50_ms']:.1f} ms p99 {level['card_search']['p99_ms']:.1f} ms, "
+          f"first agent_response p50 {level['first_agent_response']['p50_ms']:.0f} ms, "
+          f"inquiry p50 {level['inquiry_total']['p50_ms']:.0f} ms p99 {level['inquiry_total']['p99_ms']:.0f} ms "
+          f"({level['inquiries_per_s']:.2f}/s), loop lag p99 {level['loop_lag_p99_ms']:.1f} ms max {level['loop_lag_max_ms']:.1f} ms, "
+          f"{level['memory_per_connection_kb']:.0f} KB/connection, PSS {level['pss_end_mb']:.0f} MB, {level['error_count']} errors")
+
+
+def start_process(args: List[str], log_path: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    log = open(log_path, 'w')
+    return subprocess.Popen([sys.executable] + args, stdout=log, stderr=subprocess.STDOUT, env=env)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the /ws endpoint of server.py with a scripted LLM")
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 50, 100], help="concurrent clients, one run per value")
+    parser.add_argument('--messages', type=int, default=5, help="messages each client sends")
+    parser.add_argument('--inquiry-ratio', type=float, default=0.2, help="share of messages that are inquiries")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="mean pause of a client between messages")
+    parser.add_argument('--ramp-s', type=float, default=0.0, help="spread the connection opens over this long")
+    parser.add_argument('--timeout', type=float, default=120.0, help="per-message timeout of a client")
+    parser.add_argument('--cacheable', action='store_true', help="repeat questions verbatim, so the inquiry caches can hit")
+    parser.add_argument('--first-token-ms', type=float, default=400.0, help="stub LLM delay before the first token")
+    parser.add_argument('--token-ms', type=float, default=15.0, help="stub LLM delay between tokens")
+    parser.add_argument('--script', help="reply templates for the stub LLM (see stub_llm.py)")
+    parser.add_argument('--rerank-ms-per-pair', type=float, default=0.0, help="time the stub cross-encoder spends per pair")
+    parser.add_argument('--workers', type=int, default=1, help="preforked server workers (prefork.py)")
+    parser.add_argument('--cards', type=int, default=2000, help="cards in the fixture")
+    parser.add_argument('--rulings', type=int, default=5000, help="QA + FAQ rulings in the fixture")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help="fixture database (default: benchmarks/data/, built when missing)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--llm-port', type=int, default=DEFAULT_LLM_PORT)
+    parser.add_argument('--server-url', help="test a server that is already running (ws://host:port) instead of starting one")
+    parser.add_argument('--llm-url', help="OpenAI-compatible base URL for the started server instead of stub_llm.py")
+    parser.add_argument('--output', help="results JSON (default: benchmarks/results/load_<commit>.json)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(BENCH_DIR, 'data', f'fixture_{args.cards}_{args.rulings}_s{args.seed}.db')
+    if not os.path.exists(db_path):
+        build_fixture(db_path, args.cards, args.rulings, args.seed)
+    data_dir = os.path.dirname(os.path.abspath(db_path))
+
+    processes = []
+    try:
+        if args.server_url:
+            base_url = args.server_url.rstrip('/')
+        else:
+            llm_url = args.llm_url
+            if not llm_url:
+                llm_args = [os.path.join(BENCH_DIR, 'stub_llm.py'), '--port', str(args.llm_port),
+                            '--first-token-ms', str(args.first_token_ms), '--token-ms', str(args.token_ms)]
+                if args.script:
+                    llm_args += ['--script', args.script]
+                processes.append(start_process(llm_args, os.path.join(data_dir, 'stub_llm.log')))
+                wait_until_up(f'http://127.0.0.1:{args.llm_port}/stats', processes[-1])
+                llm_url = f'http://127.0.0.1:{args.llm_port}/v1'
+            env = {**os.environ, 'OPENAI_BASE_URL': llm_url, 'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', 'load-test')}
+            if not args.cacheable:
+                # Cosine similarity never exceeds 1, so no reworded question is answered from the cache
+                env['SEMANTIC_CACHE_THRESHOLD'] = '2'
+            processes.append(start_process([os.path.join(BENCH_DIR, 'load_server.py'), '--db', os.path.abspath(db_path),
+                                            '--port', str(args.port), '--rerank-ms-per-pair', str(args.rerank_ms_per_pair),
+                                            '--workers', str(args.workers)],
+                                           os.path.join(data_dir, 'load_server.log'), env))
+            base_url = f'ws://127.0.0.1:{args.port}'
+        stats_url = base_url.replace('ws://', 'http://', 1).replace('wss://', 'https://', 1) + '/bench/stats'
+        wait_until_up(stats_url, processes[-1] if processes else None)
+
+        name_queries, questions = query_corpus(load_names(db_path), 1000, args.seed)
+        cards = load_inquiry_cards(db_path)
+        levels = []
+        for clients in args.clients:
+            level = asyncio.get_event_loop().run_until_complete(
+                run_level(base_url + '/ws', stats_url, clients, args, name_queries, questions, cards))
+            print_level(level)
+            levels.append(level)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    commit = git_commit()
+    results = {
+        'meta': {
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'db': os.path.abspath(db_path),
+            'server_url': args.server_url,
+            'messages': args.messages,
+            'inquiry_ratio': args.inquiry_ratio,
+            'think_ms': args.think_ms,
+            'cacheable': args.cacheable,
+            'first_token_ms': args.first_token_ms,
+            'token_ms': args.token_ms,
+            'rerank_ms_per_pair': args.rerank_ms_per_pair,
+            'workers': args.workers,
+            'seed': args.seed,
+        },
+        'levels': levels,
+    }
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'load_{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
@@ -0,0 +1,143 @@
+import ast
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+'''
+Local stand-in for the OpenAI chat completions API, for load tests of server.py.
+
+Serves POST /v1/chat/completions, streamed (server-sent events) and not, with a configurable time
+to first token and per-token delay. Replies are scripted rather than generated: the stub reads the
+agent's conversation and answers the way YuGiOhAgent expects, one action turn requesting every
+action, a Thought for each thinking turn, then the Answer/Ruling, so an inquiry runs the same
+number of completions and actions it does against the real model. Point the server at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/stub_llm.py --port 8101 --first-token-ms 400 --token-ms 15
+'''
+
+# Templates per kind of turn; {question} and {card} are filled in from the conversation
+SCRIPT = {
+    'act': ("Thought: I need the mechanics and rulings of {card} and the relevant rules before I can answer.\n"
+            "Action: analyze_mechanics: {card}\n"
+            "Action: search_rulings: {card}\n"
+            "Action: search_rulebook: {question}\n"
+            "PAUSE"),
+    'think': ("Thought: The rulings of {card} and the rulebook agree on how this resolves, so the effect "
+              "applies as written unless it is negated in response."),
+    'final': ("Answer: {card} resolves as written. The rulings found for it cover this situation and nothing in "
+              "the question changes the timing or the activation conditions.\n"
+              "Ruling: Yes, the effect resolves."),
+}
+
+FINAL_PROMPT = "You have gathered and analyzed all necessary information"
+_QUESTION = re.compile(r'^Question: (?P<question>.*)\nCards: (?P<cards>\[.*\])$', re.DOTALL)
+
+
+def turn_kind(messages: List[Dict[str, Any]]) -> str:
+    # The agent appends a system prompt before each thinking turn and before the final answer;
+    # action turns end in the user question or in an observation
+    last = messages[-1]
+    if last['role'] == 'system' and last['content'].startswith(FINAL_PROMPT):
+        return 'final'
+    if last['role'] == 'system' and not last['content'].startswith('Observation'):
+        return 'think'
+    return 'act'
+
+
+def scripted_reply(messages: List[Dict[str, Any]], script: Dict[str, str]) -> str:
+    question, card = '', 'this card'
+    for message in messages:
+        match = _QUESTION.match(message['content']) if message['role'] == 'user' else None
+        if match:
+            question = match.group('question')
+            try:
+                cards = ast.literal_eval(match.group('cards'))
+            except (ValueError, SyntaxError):
+                cards = []
+            card = cards[0] if cards else card
+            break
+    return script[turn_kind(messages)].format(question=question, card=card)
+
+
+def tokens(text: str) -> List[str]:
+    # Word-sized pieces, whitespace attached, like the deltas of a real stream
+    return re.findall(r'\S+\s*|\s+', text)
+
+
+def create_app(first_token_ms: float = 400.0, token_ms: float = 15.0, script: Dict[str, str] = SCRIPT) -> FastAPI:
+    app = FastAPI()
+    app.state.completions = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.completions += 1
+        reply = scripted_reply(body['messages'], script)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get('model', 'stub')
+
+        if not body.get('stream'):
+            pieces = tokens(reply)
+            await asyncio.sleep((first_token_ms + token_ms * max(0, len(pieces) - 1)) / 1000.0)
+            return JSONResponse({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(pieces), 'total_tokens': len(pieces)},
+            })
+
+        async def events():
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                return 'data: ' + json.dumps({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': created,
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                }) + '\n\n'
+
+            await asyncio.sleep(first_token_ms / 1000.0)
+            yield chunk({'role': 'assistant', 'content': ''})
+            for i, piece in enumerate(tokens(reply)):
+                if i and token_ms:
+                    await asyncio.sleep(token_ms / 1000.0)
+                yield chunk({'content': piece})
+            yield chunk({}, 'stop')
+            yield 'data: [DONE]\n\n'
+
+        return StreamingResponse(events(), media_type='text/event-stream')
+
+    @app.get("/stats")
+    async def stats():
+        return {'completions': app.state.completions}
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a scripted OpenAI-compatible chat completions API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8101)
+    parser.add_argument('--first-token-ms', type=float, default=400.0, help="delay before the first token of a reply")
+    parser.add_argument('--token-ms', type=float, default=15.0, help="delay between tokens")
+    parser.add_argument('--script', help="JSON file overriding the 'act', 'think' and 'final' reply templates")
+    args = parser.parse_args()
+
+    script = dict(SCRIPT)
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script.update(json.load(f))
+    uvicorn.run(create_app(args.first_token_ms, args.token_ms, script), host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Bump this whenever the on-disk layout or the scoring changes so stale files get rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# How often (in seconds) a loaded index re-checks the cards table for changes
+FINGERPRINT_CHECK_INTERVAL = 60.0
+
+
+# Okapi BM25 over a sparse term -> postings layout (CSR, one row per term).
+# Scores match rank_bm25.BM25Okapi for the same tokens and parameters, but a query only
+# touches the postings of its own terms instead of looping over every document.
+class BM25Index:
+    def __init__(self, terms: List[str], term_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, labels: Optional[List[str]] = None,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25, fingerprint: str = ''):
+        self.terms = terms
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.labels = labels or []
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.fingerprint = fingerprint
+
+        self.corpus_size = len(doc_lengths)
+        self.avgdl = float(doc_lengths.sum()) / self.corpus_size if self.corpus_size else 0.0
+
+        # Same idf as BM25Okapi: negative idfs are floored to epsilon * average idf
+        doc_freqs = np.diff(term_offsets).astype(np.float64)
+        idf = np.log(self.corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        average_idf = float(idf.mean()) if len(idf) else 0.0
+        idf[idf < 0] = epsilon * average_idf
+        self.idf = idf
+
+        # Per-document length normalisation, computed once instead of per query term
+        if self.corpus_size:
+            self.doc_norms = k1 * (1 - b + b * doc_lengths / self.avgdl)
+        else:
+            self.doc_norms = np.zeros(0, dtype=np.float64)
+
+    @classmethod
+    def build(cls, corpus: Sequence[List[str]], labels: Optional[List[str]] = None, **kwargs) -> 'BM25Index':
+        postings: Dict[str, List[tuple]] = {}
+        doc_lengths = np.zeros(len(corpus), dtype=np.int32)
+        for doc_id, tokens in enumerate(corpus):
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            term_offsets[i + 1] = term_offsets[i] + len(postings[term])
+
+        doc_ids = np.empty(term_offsets[-1], dtype=np.int32)
+        term_freqs = np.empty(term_offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            start, end = term_offsets[i], term_offsets[i + 1]
+            term_postings = postings[term]
+            doc_ids[start:end] = [doc_id for doc_id, _ in term_postings]
+            term_freqs[start:end] = [tf for _, tf in term_postings]
+
+        return cls(terms, term_offsets, doc_ids, term_freqs, doc_lengths, labels=labels, **kwargs)
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        # Repeated query terms count once per occurrence, like BM25Okapi
+        matched_docs = []
+        contributions = []
+        for term, count in Counter(query).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            weight = self.idf[term_id] * count
+            matched_docs.append(docs)
+            contributions.append(weight * (tf * (self.k1 + 1) / (tf + self.doc_norms[docs])))
+
+        if not matched_docs:
+            return np.zeros(self.corpus_size, dtype=np.float64)
+        return np.bincount(np.concatenate(matched_docs), weights=np.concatenate(contributions),
+                           minlength=self.corpus_size)
+
+    def top_n(self, query: List[str], n: int = 5) -> List[int]:
+        scores = self.get_scores(query)
+        return [int(i) for i in scores.argsort()[-n:][::-1]]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = {
+            'version': INDEX_FORMAT_VERSION,
+            'fingerprint': self.fingerprint,
+            'k1': self.k1,
+            'b': self.b,
+            'epsilon': self.epsilon,
+        }
+        # Write to a temp file first so a concurrent reader never sees a half-written index
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+            terms=np.frombuffer('\n'.join(self.terms).encode('utf-8'), dtype=np.uint8),
+            labels=np.frombuffer(json.dumps(self.labels).encode('utf-8'), dtype=np.uint8),
+            term_offsets=self.term_offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BM25Index']:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != INDEX_FORMAT_VERSION:
+                return None
+            terms_blob = data['terms'].tobytes().decode('utf-8')
+            return cls(
+                terms_blob.split('\n') if terms_blob else [],
+                data['term_offsets'],
+                data['doc_ids'],
+                data['term_freqs'],
+                data['doc_lengths'],
+                labels=json.loads(data['labels'].tobytes().decode('utf-8')),
+                k1=meta['k1'],
+                b=meta['b'],
+                epsilon=meta['epsilon'],
+                fingerprint=meta['fingerprint'],
+            )
+
+
+# Card description index
+
+def default_index_dir(db_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'indexes')
+
+def card_index_path(db_path: str) -> str:
+    return os.path.join(default_index_dir(db_path), 'card_desc_bm25.npz')
+
+def cards_fingerprint(conn: sqlite3.Connection) -> str:
+    # Cheap aggregate over the cards table; any insert, delete or text edit changes it.
+    # cards_version (bumped by the card ETL) also catches edits that keep every length the same.
+    cursor = conn.execute("SELECT COUNT(*), COALESCE(MAX(rowid), 0), TOTAL(LENGTH(name)), TOTAL(LENGTH(desc)) FROM cards")
+    parts = [str(value) for value in cursor.fetchone()]
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'cards_version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row:
+        parts.append(f"v{row[0]}")
+    return ':'.join(parts)
+
+def build_card_index(conn: sqlite3.Connection) -> BM25Index:
+    fingerprint = cards_fingerprint(conn)
+    all_cards = conn.execute("SELECT name, desc FROM cards").fetchall()
+    return BM25Index.build(
+        [(desc or '').split() for _, desc in all_cards],
+        labels=[name for name, _ in all_cards],
+        fingerprint=fingerprint,
+    )
+
+_card_indexes: Dict[str, BM25Index] = {}
+_card_index_checked: Dict[str, float] = {}
+_card_index_lock = threading.Lock()
+
+def get_card_index(db_path: str = 'yugioh.db', verbose: bool = False) -> BM25Index:
+    now = time.monotonic()
+    index = _card_indexes.get(db_path)
+    if index is not None and now - _card_index_checked.get(db_path, 0.0) < FINGERPRINT_CHECK_INTERVAL:
+        return index
+
+    with _card_index_lock:
+        index = _card_indexes.get(db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            fingerprint = cards_fingerprint(conn)
+            if index is None or index.fingerprint != fingerprint:
+                path = card_index_path(db_path)
+                index = BM25Index.load(path)
+                if index is None or index.fingerprint != fingerprint:
+                    if verbose:
+                        print(f"Building card description index at {path}")
+                    index = build_card_index(conn)
+                    index.save(path)
+                _card_indexes[db_path] = index
+            _card_index_checked[db_path] = time.monotonic()
+        finally:
+            conn.close()
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'yugioh.db'
+    start = time.perf_counter()
+    index = get_card_index(db_path, verbose=True)
+    print(f"Card index ready: {index.corpus_size} cards, {len(index.terms)} terms "
+          f"({time.perf_counter() - start:.2f}s)")
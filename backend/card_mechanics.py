@@ -1,14 +1,3 @@
-'''
-blogs used for this:
-https://yugiohblog.konami.com/articles/?p=2906
-https://yugiohblog.konami.com/articles/?p=2915
-https://yugiohblog.konami.com/articles/?p=2947
-https://yugiohblog.konami.com/articles/?p=2962
-https://yugiohblog.konami.com/articles/?p=3111
-https://yugiohblog.konami.com/articles/?p=3140
-https://yugiohblog.konami.com/articles/?p=4514
-'''
-
 '''
 Summary of important Yu-Gi-Oh! card mechanics:
 
@@ -28,8 +17,24 @@ Summary of important Yu-Gi-Oh! card mechanics:
 10. Chains resolve in reverse order, with each effect resolving separately.
 '''
 
-from typing import List, Dict, Any
+import json
+import os
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple
 from pydantic import BaseModel
+from psct import CardEffect, parse_effects
+
+# Konami blog articles on Problem-Solving Card Text this is based on (rulebook_index.py --psct indexes them too)
+PSCT_ARTICLES = [
+    'https://yugiohblog.konami.com/articles/?p=2906',
+    'https://yugiohblog.konami.com/articles/?p=2915',
+    'https://yugiohblog.konami.com/articles/?p=2947',
+    'https://yugiohblog.konami.com/articles/?p=2962',
+    'https://yugiohblog.konami.com/articles/?p=3111',
+    'https://yugiohblog.konami.com/articles/?p=3140',
+    'https://yugiohblog.konami.com/articles/?p=4514',
+]
 
 class Card(BaseModel):
     name: str
@@ -53,35 +58,82 @@ class CardMechanic(BaseModel):
     once_per_turn: bool
     hard_once_per_turn: bool
     once_per_duel: bool
+    # Per-effect breakdown from the PSCT parser (psct.py); the fields above describe the whole text
+    effects: List[CardEffect] = []
 
-def analyze_card_mechanics(card: Card) -> CardMechanic:
-    # Analyze the card text and extract mechanics
-    card_text = card.desc
-    
-    effect_type = determine_effect_type(card_text)
-    activation_condition = extract_activation_condition(card_text)
-    cost = extract_cost(card_text)
-    resolution = extract_resolution(card_text)
-    timing = determine_timing(card_text)
-    targeting = 'target' in card_text.lower()
-    once_per_chain = 'once per chain' in card_text.lower()
-    once_per_turn = 'once per turn' in card_text.lower()
-    hard_once_per_turn = 'you can only use this effect of' in card_text.lower()
-    once_per_duel = 'once per duel' in card_text.lower()
+# Mechanics are a pure function of the card text. The ETL stores them for every card in the card_mechanics
+# table (db_scripts/card_mechanics_table.py), so the agent normally reads one row; texts that aren't in the
+# table are analyzed here and memoized. Each text is lowercased once and scanned once: the lookahead pattern
+# reports every keyword starting at every position, overlapping ones included, like the `in` checks it replaces.
+MECHANICS_CACHE_SIZE = int(os.getenv("MECHANICS_CACHE_SIZE", "4096"))
+
+_KEYWORDS = ["during either player's", "during your opponent's", 'during', 'quick effect', 'when', 'if', 'target',
+             'once per chain', 'once per turn', 'once per duel', 'you can only use this effect of']
+# Longest first, so a phrase that starts with a shorter keyword is reported as the phrase
+_KEYWORD_PATTERN = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in sorted(_KEYWORDS, key=len, reverse=True)) + '))')
+_IMPLIED_KEYWORDS = {"during either player's": {'during'}, "during your opponent's": {'during'}}
+
+MECHANIC_FIELDS = list(CardMechanic.model_fields)
+
+def scan_keywords(lowered_text: str) -> Set[str]:
+    found = set()
+    for match in _KEYWORD_PATTERN.finditer(lowered_text):
+        keyword = match.group(1)
+        found.add(keyword)
+        found |= _IMPLIED_KEYWORDS.get(keyword, set())
+    return found
+
+def analyze_card_text(card_text: str, effects: Optional[List[CardEffect]] = None) -> CardMechanic:
+    # effects: the text's parse when the caller already has it (psct.parse_card_texts over a batch)
+    keywords = scan_keywords(card_text.lower())
+
+    if ':' in card_text:
+        effect_type = 'Trigger' if 'when' in keywords or 'if' in keywords else 'Ignition'
+    elif ';' in card_text:
+        effect_type = 'Quick' if 'during' in keywords or 'quick effect' in keywords else 'Ignition'
+    else:
+        effect_type = 'Continuous'
+
+    if 'quick effect' in keywords:
+        timing = 'Quick Effect'
+    elif "during either player's" in keywords:
+        timing = 'Either Player\'s Turn'
+    elif "during your opponent's" in keywords:
+        timing = 'Opponent\'s Turn'
+    else:
+        timing = 'Your Turn'
 
     return CardMechanic(
         effect_type=effect_type,
-        activation_condition=activation_condition,
-        cost=cost,
-        resolution=resolution,
+        activation_condition=extract_activation_condition(card_text),
+        cost=extract_cost(card_text),
+        resolution=extract_resolution(card_text),
         timing=timing,
-        targeting=targeting,
-        once_per_chain=once_per_chain,
-        once_per_turn=once_per_turn,
-        hard_once_per_turn=hard_once_per_turn,
-        once_per_duel=once_per_duel
+        targeting='target' in keywords,
+        once_per_chain='once per chain' in keywords,
+        once_per_turn='once per turn' in keywords,
+        hard_once_per_turn='you can only use this effect of' in keywords,
+        once_per_duel='once per duel' in keywords,
+        effects=parse_effects(card_text) if effects is None else effects
     )
 
+_memoized_card_text = lru_cache(maxsize=MECHANICS_CACHE_SIZE)(analyze_card_text)
+
+def analyze_card_mechanics(card: Card) -> CardMechanic:
+    # A deep copy (effects included), so callers can't change the memoized result
+    return _memoized_card_text(card.desc).model_copy(deep=True)
+
+def mechanic_row(mechanic: CardMechanic) -> Tuple[Any, ...]:
+    # Values in MECHANIC_FIELDS order, as stored in the card_mechanics table (effects as a JSON array)
+    values = mechanic.model_dump()
+    values['effects'] = json.dumps(values['effects'], ensure_ascii=False)
+    return tuple(values[field] for field in MECHANIC_FIELDS)
+
+def mechanic_from_row(row: Tuple[Any, ...]) -> CardMechanic:
+    values = dict(zip(MECHANIC_FIELDS, row))
+    values['effects'] = json.loads(values['effects'])
+    return CardMechanic(**values)
+
 def determine_effect_type(card_text: str) -> str:
     if ':' in card_text:
         return 'Trigger' if 'when' in card_text.lower() or 'if' in card_text.lower() else 'Ignition'
@@ -0,0 +1,183 @@
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from db import get_connection, get_db_version
+
+try:
+    import ahocorasick  # pyahocorasick: same automaton implemented in C
+except ImportError:
+    ahocorasick = None
+
+# Card mention extraction with one Aho-Corasick automaton over every card name and card id.
+# A single left-to-right pass over a text reports every occurrence of every pattern, so the cost
+# is linear in the text length however many cards there are. fix_rulings.py uses it to turn the
+# card id tokens of the QA dump into names and tag each ruling with the cards it mentions;
+# the agent uses it to find cards named in a question that the user didn't select.
+# pyahocorasick is used when it is installed; the pure Python AhoCorasick below is the fallback.
+
+MIN_NAME_LENGTH = 3
+MAX_MENTIONED_CARDS = 5
+
+class AhoCorasick:
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.patterns: List[str] = []
+        self.values: List[Any] = []
+
+    def add(self, pattern: str, value: Any):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = self._goto[state][ch] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(len(self.patterns))
+        self.patterns.append(pattern)
+        self.values.append(value)
+
+    def build(self) -> 'AhoCorasick':
+        # Breadth-first, so the failure state of every parent is final before its children need it
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0) if state else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+        return self
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        # (start, end, value) of every occurrence, in order of end position
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in out[state]:
+                yield i + 1 - len(self.patterns[pattern]), i + 1, self.values[pattern]
+
+
+class NativeAhoCorasick:
+    # Same interface as AhoCorasick on top of pyahocorasick
+    def __init__(self):
+        self._automaton = ahocorasick.Automaton()
+
+    def add(self, pattern: str, value: Any):
+        # A repeated pattern keeps its first value
+        if pattern not in self._automaton:
+            self._automaton.add_word(pattern, (len(pattern), value))
+
+    def build(self) -> 'NativeAhoCorasick':
+        self._automaton.make_automaton()
+        return self
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        if len(self._automaton) == 0:
+            return
+        for last, (length, value) in self._automaton.iter(text):
+            yield last + 1 - length, last + 1, value
+
+def new_automaton():
+    return NativeAhoCorasick() if ahocorasick is not None else AhoCorasick()
+
+
+class Mention(NamedTuple):
+    start: int
+    end: int
+    card_id: Optional[int]
+    name: str
+    kind: str  # 'name' or 'id'
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+class CardMentionMatcher:
+    def __init__(self, cards: Iterable[Tuple[Optional[int], str]], match_names: bool = True, match_ids: bool = True):
+        self.names_by_id: Dict[int, str] = {}
+        self.automaton = new_automaton()
+        for card_id, name in cards:
+            if card_id is not None:
+                self.names_by_id[card_id] = name
+                if match_ids:
+                    self.automaton.add(str(card_id), (card_id, name, 'id'))
+            if match_names and len(name) >= MIN_NAME_LENGTH:
+                self.automaton.add(name.lower(), (card_id, name, 'name'))
+        self.automaton.build()
+
+    def find(self, text: str) -> List[Mention]:
+        # Leftmost-longest, non-overlapping: "Dark Magician Girl" wins over the "Dark Magician" inside it
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+        candidates = []
+        for start, end, (card_id, name, kind) in self.automaton.iter(lowered):
+            # Whole tokens only, like the old \b(\d+)\b regex for ids
+            if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                continue
+            if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                continue
+            # One-word names ("Reload", "Jinzo") must keep their capitalization to count as a card
+            if kind == 'name' and ' ' not in name and text[start:end] != name:
+                continue
+            candidates.append(Mention(start, end, card_id, name, kind))
+
+        mentions = []
+        last_end = 0
+        for mention in sorted(candidates, key=lambda m: (m.start, m.start - m.end)):
+            if mention.start >= last_end:
+                mentions.append(mention)
+                last_end = mention.end
+        return mentions
+
+    def replace_ids(self, text: str, mentioned_ids: Optional[Set[int]] = None) -> str:
+        # Swap every card id token for the card name, collecting the ids that were found
+        pieces = []
+        position = 0
+        for mention in self.find(text):
+            if mention.kind != 'id':
+                continue
+            pieces.append(text[position:mention.start])
+            pieces.append(mention.name)
+            position = mention.end
+            if mentioned_ids is not None:
+                mentioned_ids.add(mention.card_id)
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+    def mentioned_names(self, text: str) -> List[str]:
+        return list(dict.fromkeys(mention.name for mention in self.find(text)))
+
+
+_matchers: Dict[str, Tuple[str, CardMentionMatcher]] = {}
+_matcher_lock = threading.Lock()
+
+def get_card_mention_matcher(db_path: str = 'yugioh.db') -> CardMentionMatcher:
+    # Names of the `cards` table only, so every mention maps to a full card row.
+    # Rebuilt when the database version changes, e.g. after cardscraper.py adds or removes cards
+    version = get_db_version(db_path)
+    cached = _matchers.get(db_path)
+    if cached is None or cached[0] != version:
+        with _matcher_lock:
+            cached = _matchers.get(db_path)
+            if cached is None or cached[0] != version:
+                cursor = get_connection(db_path).cursor()
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'card_names'")
+                if cursor.fetchone():
+                    cursor.execute("SELECT card_id, name FROM card_names WHERE locale = 'en'")
+                else:
+                    cursor.execute("SELECT NULL, name FROM cards")
+                cached = _matchers[db_path] = (version, CardMentionMatcher(cursor.fetchall(), match_ids=False))
+    return cached[1]
+
+def find_card_mentions(text: str, db_path: str = 'yugioh.db') -> List[str]:
+    return get_card_mention_matcher(db_path).mentioned_names(text)
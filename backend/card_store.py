@@ -0,0 +1,282 @@
+import json
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Consolidated, memory-mappable store for the backend/cards/<locale>/<id>.json files.
+# `python card_store.py [cards_dir] [store_dir]` packs every locale into one directory:
+#   records.npy  one fixed-size row per (locale, card), sorted by (locale, id), so the row of a card is a
+#                binary search on the id column of its locale's slice
+#   strings.bin  UTF-8 text (names, effect text, ...); records hold (offset, length) into it
+#   lists.npy    interned ids for list fields (properties, linkArrows); records hold (offset, count)
+#   meta.json    format version, locales and their row ranges, and the interned string table
+# Text comes back as a memoryview over the mmap (no copy) or decoded on demand.
+# With --workers N the JSON files are read and parsed by N processes, each locale directory split into
+# shards of CARD_SHARD_SIZE files; the packing itself stays in the calling process.
+
+STORE_FORMAT_VERSION = 1
+LOCALES = ['en', 'ja', 'de', 'fr', 'it', 'es', 'pt', 'ko', 'cn', 'ae']
+
+INT_FIELDS = ['id', 'level', 'rank', 'linkRating', 'pendScale', 'atk', 'def']
+TEXT_FIELDS = ['name', 'nameRuby', 'effectText', 'pendEffect', 'oldName', 'notes']
+INTERNED_FIELDS = ['type', 'englishAttribute', 'localizedAttribute', 'englishProperty', 'localizedProperty']
+LIST_FIELDS = ['properties', 'linkArrows']
+# Output order of get(), same as the source JSON
+FIELD_ORDER = ['id', 'type', 'name', 'nameRuby', 'englishAttribute', 'localizedAttribute', 'englishProperty',
+               'localizedProperty', 'effectText', 'pendEffect', 'pendScale', 'level', 'rank', 'linkRating',
+               'linkArrows', 'atk', 'def', 'properties', 'oldName', 'notes']
+
+CARD_SHARD_SIZE = 500
+
+MISSING_INT = np.iinfo(np.int32).min
+MISSING_OFFSET = np.iinfo(np.uint32).max
+MISSING_INTERNED = np.iinfo(np.uint16).max
+
+RECORD_DTYPE = np.dtype(
+    [('locale', np.uint8)]
+    + [(field, np.int32) for field in INT_FIELDS]
+    + [(f'{field}_off', np.uint32) for field in TEXT_FIELDS]
+    + [(f'{field}_len', np.uint32) for field in TEXT_FIELDS]
+    + [(field, np.uint16) for field in INTERNED_FIELDS]
+    + [(f'{field}_off', np.uint32) for field in LIST_FIELDS]
+    + [(f'{field}_len', np.uint16) for field in LIST_FIELDS]
+)
+
+
+class CardStore:
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.records = np.load(os.path.join(store_dir, 'records.npy'), mmap_mode='r')
+        self.lists = np.load(os.path.join(store_dir, 'lists.npy'), mmap_mode='r')
+        self.interned: List[str] = self.meta['interned']
+        self.locale_ranges: Dict[str, Tuple[int, int]] = {locale: tuple(bounds) for locale, bounds in self.meta['locales'].items()}
+
+        strings_path = os.path.join(store_dir, 'strings.bin')
+        with open(strings_path, 'rb') as f:
+            self._strings = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(strings_path) else b''
+        self._strings_view = memoryview(self._strings)
+
+    @classmethod
+    def load(cls, store_dir: str = 'card_store') -> Optional['CardStore']:
+        meta_path = os.path.join(store_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('version') != STORE_FORMAT_VERSION:
+                return None
+        return cls(store_dir)
+
+    def row(self, card_id: int, locale: str = 'en') -> Optional[int]:
+        if locale not in self.locale_ranges:
+            return None
+        start, end = self.locale_ranges[locale]
+        ids = self.records['id'][start:end]
+        i = int(np.searchsorted(ids, card_id))
+        if i < len(ids) and ids[i] == card_id:
+            return start + i
+        return None
+
+    def text(self, row: int, field: str) -> Optional[memoryview]:
+        # Zero-copy view of the UTF-8 bytes
+        record = self.records[row]
+        offset = int(record[f'{field}_off'])
+        if offset == MISSING_OFFSET:
+            return None
+        return self._strings_view[offset:offset + int(record[f'{field}_len'])]
+
+    def text_str(self, row: int, field: str) -> Optional[str]:
+        view = self.text(row, field)
+        return None if view is None else str(view, 'utf-8')
+
+    def name(self, card_id: int, locale: str = 'en') -> Optional[str]:
+        row = self.row(card_id, locale)
+        return None if row is None else self.text_str(row, 'name')
+
+    def get(self, card_id: int, locale: str = 'en') -> Optional[Dict[str, Any]]:
+        row = self.row(card_id, locale)
+        if row is None:
+            return None
+        record = self.records[row]
+        card: Dict[str, Any] = {}
+        for field in FIELD_ORDER:
+            if field in INT_FIELDS:
+                value = int(record[field])
+                if value != MISSING_INT:
+                    card[field] = value
+            elif field in TEXT_FIELDS:
+                value = self.text_str(row, field)
+                if value is not None:
+                    card[field] = value
+            elif field in INTERNED_FIELDS:
+                value = int(record[field])
+                if value != MISSING_INTERNED:
+                    card[field] = self.interned[value]
+            else:
+                offset = int(record[f'{field}_off'])
+                if offset != MISSING_OFFSET:
+                    count = int(record[f'{field}_len'])
+                    card[field] = [self.interned[int(i)] for i in self.lists[offset:offset + count]]
+        return card
+
+    def ids(self, locale: str = 'en') -> np.ndarray:
+        start, end = self.locale_ranges.get(locale, (0, 0))
+        return self.records['id'][start:end]
+
+    def texts(self, locale: str = 'en', field: str = 'name') -> Dict[int, str]:
+        # {card_id: text} for one text field of every card in a locale; cards without the field are left out
+        start, end = self.locale_ranges.get(locale, (0, 0))
+        rows = self.records[start:end]
+        strings = self._strings
+        return {
+            card_id: str(strings[offset:offset + length], 'utf-8')
+            for card_id, offset, length in zip(rows['id'].tolist(), rows[f'{field}_off'].tolist(), rows[f'{field}_len'].tolist())
+            if offset != MISSING_OFFSET
+        }
+
+    def names(self, locale: str = 'en') -> Dict[int, str]:
+        return self.texts(locale, 'name')
+
+    def iter_cards(self, locale: str = 'en') -> Iterator[Dict[str, Any]]:
+        for card_id in self.ids(locale):
+            yield self.get(int(card_id), locale)
+
+
+_card_stores: Dict[str, Optional[CardStore]] = {}
+_card_store_lock = threading.Lock()
+
+def get_card_store(store_dir: str = 'card_store') -> Optional[CardStore]:
+    if store_dir not in _card_stores:
+        with _card_store_lock:
+            if store_dir not in _card_stores:
+                _card_stores[store_dir] = CardStore.load(store_dir)
+    return _card_stores[store_dir]
+
+
+# Build
+
+def load_card_files(paths: List[str]) -> List[Dict[str, Any]]:
+    cards = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            cards.append(json.load(f))
+    return cards
+
+def iter_locale_cards(cards_dir: str, locale: str, executor: Optional[ProcessPoolExecutor] = None) -> Iterator[Dict[str, Any]]:
+    locale_dir = os.path.join(cards_dir, locale)
+    paths = [os.path.join(locale_dir, filename) for filename in os.listdir(locale_dir) if filename.endswith('.json')]
+    if executor is None:
+        yield from load_card_files(paths)
+        return
+    shards = [paths[i:i + CARD_SHARD_SIZE] for i in range(0, len(paths), CARD_SHARD_SIZE)]
+    for cards in executor.map(load_card_files, shards):
+        yield from cards
+
+class CardStoreWriter:
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self._strings = open(os.path.join(store_dir, 'strings.bin.tmp'), 'wb')
+        self._string_offsets: Dict[str, int] = {}
+        self._strings_size = 0
+        self._interned: Dict[str, int] = {}
+        self._lists: List[int] = []
+        self._records: List[np.ndarray] = []
+        self._locales: Dict[str, Tuple[int, int]] = {}
+        self._count = 0
+
+    def _intern(self, value: str) -> int:
+        if value not in self._interned:
+            self._interned[value] = len(self._interned)
+        return self._interned[value]
+
+    def _add_string(self, value: str) -> Tuple[int, int]:
+        # Identical texts (shared across printings and locales) are stored once
+        data = value.encode('utf-8')
+        if value not in self._string_offsets:
+            self._string_offsets[value] = self._strings_size
+            self._strings.write(data)
+            self._strings_size += len(data)
+        return self._string_offsets[value], len(data)
+
+    def add_locale(self, locale: str, cards: List[Dict[str, Any]]):
+        cards = sorted(cards, key=lambda card: card['id'])
+        records = np.zeros(len(cards), dtype=RECORD_DTYPE)
+        for i, card in enumerate(cards):
+            record = records[i]
+            record['locale'] = LOCALES.index(locale)
+            for field in INT_FIELDS:
+                value = card.get(field)
+                record[field] = value if isinstance(value, int) else MISSING_INT
+            for field in TEXT_FIELDS:
+                if isinstance(card.get(field), str):
+                    record[f'{field}_off'], record[f'{field}_len'] = self._add_string(card[field])
+                else:
+                    record[f'{field}_off'] = MISSING_OFFSET
+            for field in INTERNED_FIELDS:
+                record[field] = self._intern(card[field]) if isinstance(card.get(field), str) else MISSING_INTERNED
+            for field in LIST_FIELDS:
+                if isinstance(card.get(field), list):
+                    record[f'{field}_off'] = len(self._lists)
+                    record[f'{field}_len'] = len(card[field])
+                    self._lists.extend(self._intern(str(item)) for item in card[field])
+                else:
+                    record[f'{field}_off'] = MISSING_OFFSET
+        self._records.append(records)
+        self._locales[locale] = (self._count, self._count + len(records))
+        self._count += len(records)
+
+    def close(self):
+        self._strings.close()
+        records = np.concatenate(self._records) if self._records else np.zeros(0, dtype=RECORD_DTYPE)
+        np.save(os.path.join(self.store_dir, 'records.npy'), records)
+        np.save(os.path.join(self.store_dir, 'lists.npy'), np.array(self._lists, dtype=np.uint16))
+        os.replace(os.path.join(self.store_dir, 'strings.bin.tmp'), os.path.join(self.store_dir, 'strings.bin'))
+        meta = {
+            'version': STORE_FORMAT_VERSION,
+            'count': self._count,
+            'locales': self._locales,
+            'interned': sorted(self._interned, key=self._interned.get),
+        }
+        # meta.json last: a store is only visible to CardStore.load once it is complete
+        with open(os.path.join(self.store_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+def build_card_store(cards_dir: str = 'cards', store_dir: str = 'card_store', workers: int = 1):
+    start = time.perf_counter()
+    meta_path = os.path.join(store_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    writer = CardStoreWriter(store_dir)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for locale in LOCALES:
+            if os.path.isdir(os.path.join(cards_dir, locale)):
+                locale_start = time.perf_counter()
+                cards = list(iter_locale_cards(cards_dir, locale, executor))
+                writer.add_locale(locale, cards)
+                elapsed = max(time.perf_counter() - locale_start, 1e-9)
+                print(f"Packed {len(cards)} {locale} cards ({len(cards) / elapsed:.0f} cards/s)")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    writer.close()
+    _card_stores.pop(store_dir, None)
+    print(f"Card store written to {store_dir} ({writer._count} records, {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack the per-locale card JSON files into a memory-mapped store")
+    parser.add_argument('cards_dir', nargs='?', default='cards')
+    parser.add_argument('store_dir', nargs='?', default='card_store')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes parsing the JSON files (1: no pool)")
+    args = parser.parse_args()
+    build_card_store(args.cards_dir, args.store_dir, args.workers)
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from metrics import span
+
+# Read-only SQLite access for the search path.
+# Each worker thread keeps one connection per database open for the life of the process, so the
+# sqlite3 statement cache (prepared statements) survives between calls. Async callers go through
+# run_in_db, which runs the query function on a small dedicated thread pool instead of the event loop,
+# timed as the `db.<function>` stage and with the caller's context (and so its inquiry trace).
+
+DB_WORKERS = int(os.getenv("DB_WORKERS", "4"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHED_STATEMENTS = 256
+# immutable=1 skips all locking and change detection; only safe when nothing writes to the file while serving
+DB_IMMUTABLE = os.getenv("DB_IMMUTABLE", "0") == "1"
+
+# Tables whose contents define the "database version" that caches are keyed on
+VERSIONED_TABLES = ['cards', 'qa_tl_fixed', 'faq_tl_entries_fixed']
+DB_VERSION_TTL = 30.0
+
+_local = threading.local()
+_db_versions: Dict[str, Tuple[float, str]] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _connect_read_only(db_path: str) -> sqlite3.Connection:
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+    if DB_IMMUTABLE:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, cached_statements=DB_CACHED_STATEMENTS)
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+def get_connection(db_path: str = 'yugioh.db') -> sqlite3.Connection:
+    # One cached connection per (thread, database); never close it, the next call reuses it
+    connections: Dict[str, sqlite3.Connection] = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = _connect_read_only(db_path)
+    return conn
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='sqlite')
+    return _executor
+
+def _timed(func: Callable[..., Any], *args, **kwargs) -> Any:
+    with span(f"db.{getattr(func, '__qualname__', 'query')}"):
+        return func(*args, **kwargs)
+
+async def run_in_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, _timed, func, *args, **kwargs))
+
+def _reset_after_fork():
+    # A forked server worker (prefork.py) starts with no connections and no pool: SQLite connections
+    # must not cross a fork, and the parent's pool threads don't exist in the child
+    global _local, _executor, _executor_lock
+    _local = threading.local()
+    _executor = None
+    _executor_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_db_version(db_path: str = 'yugioh.db') -> str:
+    # Changes whenever rows are added to or removed from the card or ruling tables; re-read at most every DB_VERSION_TTL seconds
+    now = time.monotonic()
+    cached = _db_versions.get(db_path)
+    if cached and now - cached[0] < DB_VERSION_TTL:
+        return cached[1]
+
+    cursor = get_connection(db_path).cursor()
+    try:
+        # Version recorded by the ETL scripts (db_scripts/db_meta.py) in the same transaction as their changes
+        cursor.execute("SELECT value FROM db_meta WHERE key = 'version'")
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row:
+        version = f"v{row[0]}"
+        _db_versions[db_path] = (now, version)
+        return version
+
+    # Databases built before db_meta: fingerprint the tables instead
+    parts = []
+    for table in VERSIONED_TABLES:
+        try:
+            cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {table}")
+            parts.append('{}.{}'.format(*cursor.fetchone()))
+        except sqlite3.OperationalError:
+            parts.append('-')
+    version = ':'.join(parts)
+    _db_versions[db_path] = (now, version)
+    return version
@@ -0,0 +1,84 @@
+import sqlite3
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from card_mechanics import MECHANIC_FIELDS, analyze_card_text, mechanic_row
+from psct import parse_card_texts
+from etl import ETL_CHUNK_SIZE, iter_row_chunks
+
+'''
+Precomputed card mechanics, one row per card.
+
+card_mechanics holds card_mechanics.analyze_card_text of every card's `desc`, with its PSCT effects
+(psct.py) as a JSON array in `effects`, keyed by ygoprodeckId with an index on the card name, so
+search.get_card_mechanics answers an analyze_mechanics action with one lookup. build_card_mechanics_table fills it from the cards table; incremental card updates call
+refresh_card_mechanics for the cards they added, changed or removed.
+'''
+
+# Stored as the CardMechanic field types; the booleans become INTEGER 0/1 and effects a JSON TEXT
+FIELD_TYPES = {
+    'targeting': 'INTEGER',
+    'once_per_chain': 'INTEGER',
+    'once_per_turn': 'INTEGER',
+    'hard_once_per_turn': 'INTEGER',
+    'once_per_duel': 'INTEGER',
+}
+
+def create_card_mechanics_table(conn):
+    columns = ',\n        '.join(f'{field} {FIELD_TYPES.get(field, "TEXT")} NOT NULL' for field in MECHANIC_FIELDS)
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS card_mechanics (
+        card_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        {columns}
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_card_mechanics_name ON card_mechanics (name)")
+
+def has_card_mechanics_table(conn):
+    # False too for a table written before a CardMechanic field was added, so it gets rebuilt
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(card_mechanics)")]
+    return columns == ['card_id', 'name'] + MECHANIC_FIELDS
+
+def insert_card_mechanics(conn, cards):
+    # cards: (ygoprodeckId, name, desc) rows
+    placeholders = ', '.join('?' for _ in range(len(MECHANIC_FIELDS) + 2))
+    descs = [desc or '' for _, _, desc in cards]
+    rows = [(card_id, name) + mechanic_row(analyze_card_text(desc, effects))
+            for (card_id, name, _), desc, effects in zip(cards, descs, parse_card_texts(descs))]
+    conn.executemany(f"INSERT OR REPLACE INTO card_mechanics (card_id, name, {', '.join(MECHANIC_FIELDS)}) VALUES ({placeholders})", rows)
+    return len(rows)
+
+def build_card_mechanics_table(conn, chunk_size=ETL_CHUNK_SIZE):
+    # Full rebuild from the cards table; call inside the transaction that wrote the cards
+    start = time.perf_counter()
+    conn.execute("DROP TABLE IF EXISTS card_mechanics")
+    create_card_mechanics_table(conn)
+    count = 0
+    # A cursor of its own: the reads stream while the inserts go to a different table
+    for rows in iter_row_chunks(conn.cursor(), 'SELECT ygoprodeckId, name, "desc" FROM cards', chunk_size=chunk_size):
+        count += insert_card_mechanics(conn, rows)
+    print(f"Card mechanics built: {count} cards ({time.perf_counter() - start:.1f}s)")
+
+def refresh_card_mechanics(conn, card_ids):
+    # In-place update after cards were added, changed or removed
+    if not has_card_mechanics_table(conn):
+        build_card_mechanics_table(conn)
+        return
+    card_ids = sorted(set(card_ids))
+    for i in range(0, len(card_ids), 500):
+        batch = card_ids[i:i + 500]
+        placeholders = ', '.join('?' for _ in batch)
+        conn.execute(f"DELETE FROM card_mechanics WHERE card_id IN ({placeholders})", batch)
+        cards = conn.execute(f'SELECT ygoprodeckId, name, "desc" FROM cards WHERE ygoprodeckId IN ({placeholders})', batch).fetchall()
+        insert_card_mechanics(conn, cards)
+
+
+if __name__ == "__main__":
+    db_name = sys.argv[1] if len(sys.argv) > 1 else 'yugioh.db'
+    conn = sqlite3.connect(db_name)
+    with conn:
+        build_card_mechanics_table(conn)
+    conn.close()
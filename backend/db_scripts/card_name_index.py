@@ -0,0 +1,265 @@
+import sqlite3
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from card_store import get_card_store
+from locale_text import CJK_LOCALES, name_ngrams, normalize_name
+
+'''
+Name index over every locale, used for autocomplete.
+
+card_names holds one row per (card, locale); en_name is the name used by the `cards` table, so any
+localized match can be mapped back to a full card row. A NOCASE index on card_names answers prefix
+lookups and the external-content FTS5 table card_names_fts (trigram tokenizer) answers substring
+and fuzzy lookups. English rows are kept in sync with `cards` by triggers; localized rows come from
+the packed card store (card_store.py), or the backend/cards/<locale>/<id>.json files if it isn't built.
+
+card_name_keys holds the normalized lookup key (locale_text.normalize_name) of every name, plus
+the kana reading (nameRuby) of every Japanese name, each mapped to the card id and English name,
+so a localized, full-width, accent-free or kana-only query resolves with one range scan on
+idx_card_name_keys_key. card_name_grams indexes the keys of ja/cn/ko names by character n-grams
+for substring queries of one or two characters, which the trigram tokenizer can't answer.
+Both are written by build_card_name_index; the triggers don't maintain them, so incremental card
+updates call refresh_card_name_keys for the cards they touched.
+'''
+
+LOCALES = ['en', 'ja', 'de', 'fr', 'it', 'es', 'pt', 'ko', 'cn', 'ae']
+
+def create_card_name_index(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card_names (
+        name TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        card_id INTEGER,
+        en_name TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_names_name ON card_names (name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_names_en_name ON card_names (en_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_name ON cards (name)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card_name_keys (
+        key TEXT NOT NULL,
+        name TEXT NOT NULL,
+        locale TEXT NOT NULL,
+        card_id INTEGER,
+        en_name TEXT NOT NULL,
+        kind TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_name_keys_key ON card_name_keys (key, locale)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_name_keys_en_name ON card_name_keys (en_name)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card_name_grams (
+        gram TEXT NOT NULL,
+        key_id INTEGER NOT NULL,
+        PRIMARY KEY (gram, key_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS card_names_fts USING fts5(
+        name,
+        content = 'card_names',
+        content_rowid = 'rowid',
+        tokenize = 'trigram'
+    )
+    ''')
+
+def create_card_name_triggers(conn):
+    cursor = conn.cursor()
+    # card_names -> card_names_fts
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS card_names_ai AFTER INSERT ON card_names BEGIN
+        INSERT INTO card_names_fts (rowid, name) VALUES (new.rowid, new.name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS card_names_ad AFTER DELETE ON card_names BEGIN
+        INSERT INTO card_names_fts (card_names_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS card_names_au AFTER UPDATE ON card_names BEGIN
+        INSERT INTO card_names_fts (card_names_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+        INSERT INTO card_names_fts (rowid, name) VALUES (new.rowid, new.name);
+    END
+    ''')
+
+    # cards -> card_names (English rows)
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS cards_names_ai AFTER INSERT ON cards BEGIN
+        INSERT INTO card_names (name, locale, card_id, en_name) VALUES (new.name, 'en', NULL, new.name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS cards_names_ad AFTER DELETE ON cards BEGIN
+        DELETE FROM card_names WHERE en_name = old.name;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS cards_names_au AFTER UPDATE OF name ON cards BEGIN
+        UPDATE card_names SET en_name = new.name WHERE en_name = old.name;
+        UPDATE card_names SET name = new.name WHERE en_name = new.name AND locale = 'en';
+    END
+    ''')
+
+def load_localized_names(cards_dir='cards', store_dir='card_store'):
+    # {locale: {card_id: name}} for every locale directory that exists
+    store = get_card_store(store_dir)
+    if store is not None:
+        return {locale: {card_id: name for card_id, name in store.names(locale).items() if name}
+                for locale in LOCALES if locale in store.locale_ranges}
+
+    names = {}
+    for locale in LOCALES:
+        locale_dir = os.path.join(cards_dir, locale)
+        if not os.path.isdir(locale_dir):
+            continue
+        names[locale] = {}
+        for filename in os.listdir(locale_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(locale_dir, filename), 'r', encoding='utf-8') as f:
+                card_data = json.load(f)
+            if card_data.get('name'):
+                names[locale][int(filename[:-5])] = card_data['name']
+    return names
+
+def load_name_readings(cards_dir='cards', store_dir='card_store'):
+    # {card_id: kana reading} of the Japanese names
+    store = get_card_store(store_dir)
+    if store is not None:
+        return store.texts('ja', 'nameRuby') if 'ja' in store.locale_ranges else {}
+
+    readings = {}
+    locale_dir = os.path.join(cards_dir, 'ja')
+    if os.path.isdir(locale_dir):
+        for filename in os.listdir(locale_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(locale_dir, filename), 'r', encoding='utf-8') as f:
+                card_data = json.load(f)
+            if card_data.get('nameRuby'):
+                readings[int(filename[:-5])] = card_data['nameRuby']
+    return readings
+
+def build_name_keys(conn, readings, en_names=None):
+    # Key rows (and CJK n-grams) for every card_names row, or only for the cards in en_names
+    cursor = conn.cursor()
+    name_filter, filter_params = "", []
+    if en_names is not None:
+        name_filter = f"AND en_name IN ({', '.join('?' for _ in en_names)})"
+        filter_params = list(en_names)
+
+    cursor.execute(f"SELECT name, locale, card_id, en_name FROM card_names WHERE 1 {name_filter}", filter_params)
+    rows = [(normalize_name(name), name, locale, card_id, en_name, 'name') for name, locale, card_id, en_name in cursor.fetchall()]
+
+    cursor.execute(f"SELECT card_id, name, en_name FROM card_names WHERE locale = 'ja' {name_filter}", filter_params)
+    for card_id, name, en_name in cursor.fetchall():
+        if readings.get(card_id):
+            rows.append((normalize_name(readings[card_id]), name, 'ja', card_id, en_name, 'ruby'))
+    rows = [row for row in rows if row[0]]
+    if not rows:
+        return
+
+    cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM card_name_keys")
+    first_new_rowid = cursor.fetchone()[0] + 1
+    cursor.executemany("INSERT INTO card_name_keys (key, name, locale, card_id, en_name, kind) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    placeholders = ', '.join('?' for _ in CJK_LOCALES)
+    cursor.execute(f"SELECT rowid, key FROM card_name_keys WHERE rowid >= ? AND locale IN ({placeholders})",
+                   [first_new_rowid] + sorted(CJK_LOCALES))
+    cursor.executemany("INSERT OR IGNORE INTO card_name_grams (gram, key_id) VALUES (?, ?)",
+                       [(gram, key_id) for key_id, key in cursor.fetchall() for gram in name_ngrams(key)])
+
+def refresh_card_name_keys(conn, en_names, cards_dir='cards', store_dir='card_store'):
+    # In-place update after cards were added, renamed or removed: the triggers have already fixed card_names,
+    # so drop the key rows of those cards and derive them again from card_names
+    en_names = sorted(set(en_names))
+    if not en_names:
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'card_name_grams'")
+    if cursor.fetchone() is None:
+        return
+    for i in range(0, len(en_names), 500):
+        batch = en_names[i:i + 500]
+        placeholders = ', '.join('?' for _ in batch)
+        cursor.execute(f"DELETE FROM card_name_grams WHERE key_id IN (SELECT rowid FROM card_name_keys WHERE en_name IN ({placeholders}))", batch)
+        cursor.execute(f"DELETE FROM card_name_keys WHERE en_name IN ({placeholders})", batch)
+
+    # The insert trigger only adds the English row of a new card; add its localized names too
+    localized_names = load_localized_names(cards_dir, store_dir)
+    english_ids = {name: card_id for card_id, name in localized_names.get('en', {}).items()}
+    for en_name in en_names:
+        card_id = english_ids.get(en_name)
+        cursor.execute("SELECT COUNT(*), SUM(locale != 'en') FROM card_names WHERE en_name = ?", (en_name,))
+        count, localized_count = cursor.fetchone()
+        if card_id is None or not count or localized_count:
+            continue
+        cursor.execute("UPDATE card_names SET card_id = ? WHERE en_name = ? AND locale = 'en'", (card_id, en_name))
+        cursor.executemany(
+            "INSERT INTO card_names (name, locale, card_id, en_name) VALUES (?, ?, ?, ?)",
+            [(names[card_id], locale, card_id, en_name) for locale, names in localized_names.items()
+             if locale != 'en' and card_id in names]
+        )
+
+    readings = load_name_readings(cards_dir, store_dir)
+    for i in range(0, len(en_names), 500):
+        build_name_keys(conn, readings, en_names[i:i + 500])
+
+def build_card_name_index(conn, cards_dir='cards', store_dir='card_store'):
+    cursor = conn.cursor()
+    # Start from scratch; the triggers are created after the bulk load and the FTS rebuild
+    cursor.execute("DROP TABLE IF EXISTS card_names_fts")
+    cursor.execute("DROP TABLE IF EXISTS card_names")
+    cursor.execute("DROP TABLE IF EXISTS card_name_keys")
+    cursor.execute("DROP TABLE IF EXISTS card_name_grams")
+    for trigger in ('cards_names_ai', 'cards_names_ad', 'cards_names_au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    create_card_name_index(conn)
+
+    localized_names = load_localized_names(cards_dir, store_dir)
+    english_names = localized_names.get('en', {})
+    english_ids = {name: card_id for card_id, name in english_names.items()}
+
+    # English rows come from the cards table itself so every hit has a full card row
+    cursor.execute("SELECT name FROM cards")
+    card_names = [row[0] for row in cursor.fetchall()]
+    known_names = set(card_names)
+    cursor.executemany(
+        "INSERT INTO card_names (name, locale, card_id, en_name) VALUES (?, 'en', ?, ?)",
+        [(name, english_ids.get(name), name) for name in card_names]
+    )
+
+    # Localized rows, linked to the English name through the shared card id
+    for locale, names in localized_names.items():
+        if locale == 'en':
+            continue
+        rows = [
+            (name, locale, card_id, english_names[card_id])
+            for card_id, name in names.items()
+            if english_names.get(card_id) in known_names
+        ]
+        cursor.executemany("INSERT INTO card_names (name, locale, card_id, en_name) VALUES (?, ?, ?, ?)", rows)
+
+    build_name_keys(conn, load_name_readings(cards_dir, store_dir))
+
+    cursor.execute("INSERT INTO card_names_fts (card_names_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO card_names_fts (card_names_fts) VALUES ('optimize')")
+    create_card_name_triggers(conn)
+    conn.commit()
+
+    cursor.execute("SELECT locale, COUNT(*) FROM card_names GROUP BY locale")
+    print(f"Card name index built: {dict(cursor.fetchall())}")
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'yugioh.db'
+    conn = sqlite3.connect(db_path)
+    build_card_name_index(conn)
+    conn.close()
@@ -1,10 +1,15 @@
 import requests
-import pandas as pd
 import random
 from tabulate import tabulate
 from sqlalchemy import create_engine, text
 import sqlite3
 import json
+import argparse
+import time
+from card_name_index import build_card_name_index, refresh_card_name_keys
+from card_mechanics_table import build_card_mechanics_table, has_card_mechanics_table, refresh_card_mechanics
+from db_meta import bump_db_version
+from etl import ETL_CHUNK_SIZE, READ_SIZE, batched, decode_byte_chunks, iter_json_array, read_text_chunks
 
 
 '''
@@ -21,70 +26,191 @@ rank
 card_images
 '''
 
-def create_card_dataframe(api_response):
-    # Extract card data from the response
-    cards_data = api_response['data']
-    
-    # List to store processed card data
-    processed_cards = []
-    
-    for card in cards_data:
-        # Extract required fields, using get() to handle missing keys
-        processed_card = {
-            'name': card.get('name', ''),
-            #'id': card.get('id', ''), #problem: ygoorg and ygoprodeck use different ids
-            'humanReadableCardType': card.get('humanReadableCardType', ''),
-            'desc': card.get('desc', ''),
-            'race': card.get('race', ''),
-            'atk': card.get('atk', None),
-            'def': card.get('def', None),
-            'attribute': card.get('attribute', ''),
-            'card_images': card.get('card_images', [{}])[0]  # Store first image dict
-        }
-        
-        # Handle level/rank/linkval
-        processed_card['level'] = card.get('level') or card.get('rank') or card.get('linkval')
-        
-        processed_cards.append(processed_card)
-    
-    # Create DataFrame
-    df = pd.DataFrame(processed_cards)
-    
-    # Print 5 random rows
-    # print("Sample of 5 random cards:")
-    # print(tabulate(df.sample(n=5, random_state=42), headers='keys', tablefmt='psql', showindex=False))
-    
-    return df
+API_URL = "https://db.ygoprodeck.com/api/v7/cardinfo.php"
+
+CARD_TABLE_COLUMNS = ['ygoprodeckId', 'name', 'humanReadableCardType', 'desc', 'race', 'atk', 'def', 'attribute', 'card_images', 'level']
+
+# Same column types pandas' to_sql used to create, except atk/def/level stay INTEGER instead of becoming REAL
+CARD_TABLE_SCHEMA = '''
+CREATE TABLE cards (
+    ygoprodeckId INTEGER,
+    name TEXT,
+    humanReadableCardType TEXT,
+    "desc" TEXT,
+    race TEXT,
+    atk INTEGER,
+    def INTEGER,
+    attribute TEXT,
+    card_images TEXT,
+    level INTEGER
+)
+'''
 
-def create_sqlite_database(df, db_name='cards.db'): #master db is yugioh.db, don't overwrite it
-    # Convert card_images column to JSON string
-    df['card_images'] = df['card_images'].apply(json.dumps)
+def process_card(card):
+    # Extract required fields, using get() to handle missing keys
+    processed_card = {
+        # ygoprodeck's own id: only used to match rows between refreshes (ygoorg and ygoprodeck use different ids)
+        'ygoprodeckId': card.get('id'),
+        'name': card.get('name', ''),
+        'humanReadableCardType': card.get('humanReadableCardType', ''),
+        'desc': card.get('desc', ''),
+        'race': card.get('race', ''),
+        'atk': card.get('atk', None),
+        'def': card.get('def', None),
+        'attribute': card.get('attribute', ''),
+        'card_images': card.get('card_images', [{}])[0]  # Store first image dict
+    }
     
+    # Handle level/rank/linkval
+    processed_card['level'] = card.get('level') or card.get('rank') or card.get('linkval')
+    return processed_card
+
+def card_row(card):
+    # One row of the cards table, in CARD_TABLE_COLUMNS order
+    processed_card = process_card(card)
+    processed_card['card_images'] = json.dumps(processed_card['card_images'])
+    return tuple(processed_card[column] for column in CARD_TABLE_COLUMNS)
+
+def iter_cards(api_url=API_URL, fixture=None):
+    # Cards of the API response (or of a saved copy of it) one at a time, parsed as the bytes arrive,
+    # so neither the multi-megabyte response nor its parsed form is ever held in memory whole
+    if fixture:
+        print(f"Reading cards from {fixture}")
+        return iter_json_array(read_text_chunks(fixture), 'data')
+    response = requests.get(api_url, stream=True)
+    if response.status_code != 200:
+        print(f"Failed to retrieve data: {response.status_code}")
+        return None
+    print("Retrieved data successfully")
+    return iter_json_array(decode_byte_chunks(response.iter_content(chunk_size=READ_SIZE)), 'data')
+
+def create_sqlite_database(cards, db_name='cards.db', chunk_size=ETL_CHUNK_SIZE, cards_dir='cards', store_dir='card_store'): #master db is yugioh.db, don't overwrite it
     # Create a connection to the SQLite database
     conn = sqlite3.connect(db_name)
-    
-    # Write the DataFrame to SQLite
-    df.to_sql('cards', conn, if_exists='replace', index=False)
-    
-    print(f"Database '{db_name}' created successfully.")
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    # Write the cards in batches of chunk_size, all in one transaction
+    quoted_columns = ', '.join(f'"{column}"' for column in CARD_TABLE_COLUMNS)
+    placeholders = ', '.join('?' for _ in CARD_TABLE_COLUMNS)
+    count = 0
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS cards")
+        conn.execute(CARD_TABLE_SCHEMA)
+        # Before the inserts, so a card the API lists twice is written once
+        conn.execute("CREATE UNIQUE INDEX idx_cards_ygoprodeck_id ON cards (ygoprodeckId)")
+        for rows in batched(map(card_row, cards), chunk_size):
+            conn.executemany(f"INSERT OR IGNORE INTO cards ({quoted_columns}) VALUES ({placeholders})", rows)
+            count += len(rows)
+
+    print(f"Database '{db_name}' created successfully ({count} cards).")
+
+    # Rebuild the trigram name index used for autocomplete (dropping the table dropped its triggers)
+    build_card_name_index(conn, cards_dir, store_dir)
+    with conn:
+        build_card_mechanics_table(conn, chunk_size)
+        bump_db_version(conn, 'cards')
     
     # Verify the data by querying the database
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM cards LIMIT 5")
     result = cursor.fetchall()
     print("\nSample data from the database:")
-    print(tabulate(result, headers=df.columns, tablefmt='psql'))
+    print(tabulate(result, headers=CARD_TABLE_COLUMNS, tablefmt='psql'))
     
     # Close the connection
     conn.close()
 
 
+def has_card_ids(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(cards)")]
+    return 'ygoprodeckId' in columns
+
+def update_sqlite_database(cards, db_name='cards.db', chunk_size=ETL_CHUNK_SIZE, cards_dir='cards', store_dir='card_store'):
+    # Incremental refresh: diff the API cards against the table on ygoprodeckId and only write what changed,
+    # in one transaction; the name triggers follow the cards table and the lookup keys are refreshed in place.
+    # Cards are compared a batch at a time against just the stored rows with the same ids, so only the
+    # ids seen so far are kept across batches.
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if not has_card_ids(conn):
+        # First run, or a table written before ygoprodeckId existed: one full rebuild
+        conn.close()
+        create_sqlite_database(cards, db_name, chunk_size)
+        return
+
+    columns = CARD_TABLE_COLUMNS[1:]
+    quoted_columns = ', '.join(f'"{column}"' for column in CARD_TABLE_COLUMNS)
+    placeholders = ', '.join('?' for _ in CARD_TABLE_COLUMNS)
+    assignments = ', '.join(f'"{column}" = ?' for column in columns)
+    seen = set()
+    added = changed = 0
+    # Names whose lookup keys have to be rebuilt: new and removed cards, and both names of renamed ones
+    affected_names = []
+    # Cards whose precomputed mechanics have to be recomputed or dropped
+    affected_ids = []
+
+    with conn:
+        for rows in batched(map(card_row, cards), chunk_size):
+            existing = {}
+            # Stay under SQLite's 999 bound parameters per statement
+            for ids in batched([row[0] for row in rows], 500):
+                query = f"SELECT {quoted_columns} FROM cards WHERE ygoprodeckId IN ({', '.join('?' for _ in ids)})"
+                existing.update((row[0], tuple(row[1:])) for row in conn.execute(query, ids))
+
+            inserts, updates = [], []
+            for row in rows:
+                card_id = row[0]
+                if card_id in seen:
+                    continue
+                seen.add(card_id)
+                stored = existing.get(card_id)
+                if stored is None:
+                    inserts.append(row)
+                    affected_names.append(row[1])
+                elif stored != row[1:]:
+                    updates.append(row[1:] + (card_id,))
+                    if stored[0] != row[1]:
+                        affected_names += [stored[0], row[1]]
+            affected_ids += [row[0] for row in inserts] + [row[-1] for row in updates]
+            conn.executemany(f"UPDATE cards SET {assignments} WHERE ygoprodeckId = ?", updates)
+            conn.executemany(f"INSERT INTO cards ({quoted_columns}) VALUES ({placeholders})", inserts)
+            added += len(inserts)
+            changed += len(updates)
+
+        removed = [(card_id, name) for card_id, name in conn.execute("SELECT ygoprodeckId, name FROM cards") if card_id not in seen]
+        conn.executemany("DELETE FROM cards WHERE ygoprodeckId = ?", [(card_id,) for card_id, _ in removed])
+        affected_names += [name for _, name in removed]
+        affected_ids += [card_id for card_id, _ in removed]
+
+        if added or removed or changed:
+            refresh_card_name_keys(conn, affected_names, cards_dir, store_dir)
+            refresh_card_mechanics(conn, affected_ids)
+            version = bump_db_version(conn, 'cards')
+        elif not has_card_mechanics_table(conn):
+            # Same mechanics analyze_mechanics computed before, so the cached answers stay valid
+            build_card_mechanics_table(conn, chunk_size)
+    if added or removed or changed:
+        print(f"Database '{db_name}' updated to version {version}")
+    conn.close()
+    print(f"{added} added, {changed} changed, {len(removed)} removed, "
+          f"{len(seen) - added - changed} unchanged ({time.perf_counter() - start:.1f}s)")
+
+
 # Main
-api_url = "https://db.ygoprodeck.com/api/v7/cardinfo.php"
-response = requests.get(api_url)
-if response.status_code == 200:
-    print("Retrieved data successfully")
-    card_df = create_card_dataframe(response.json())
-    create_sqlite_database(card_df)
-else:
-    print(f"Failed to retrieve data: {response.status_code}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the ygoprodeck card set into SQLite")
+    parser.add_argument('db_name', nargs='?', default='cards.db')
+    parser.add_argument('--full', action='store_true', help="replace the whole table instead of applying only the changes")
+    parser.add_argument('--fixture', help="read the cards from a saved API response (JSON file) instead of the API")
+    parser.add_argument('--chunk-size', type=int, default=ETL_CHUNK_SIZE, help="cards parsed and written per batch")
+    parser.add_argument('--cards-dir', default='cards', help="per-locale card JSON for the localized names")
+    parser.add_argument('--store-dir', default='card_store', help="packed card store, used instead of --cards-dir when it exists")
+    args = parser.parse_args()
+
+    cards = iter_cards(API_URL, args.fixture)
+    if cards is not None:
+        if args.full:
+            create_sqlite_database(cards, args.db_name, args.chunk_size, args.cards_dir, args.store_dir)
+        else:
+            update_sqlite_database(cards, args.db_name, args.chunk_size, args.cards_dir, args.store_dir)
@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+'''
+Version bookkeeping shared by the ETL scripts.
+
+db_meta is a small key/value table. Every ETL run that changes rows bumps `version` (and the
+version of the part it touched, e.g. `cards_version` or `rulings_version`) inside the same
+transaction as the row changes, so readers never see new rows with an old version. The server
+keys its caches on `version` (db.get_db_version) and the BM25 card index on `cards_version`.
+'''
+
+def create_db_meta(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+
+def get_meta(conn, key, default=None):
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    return row[0] if row else default
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT INTO db_meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                 (key, str(value)))
+
+def bump_db_version(conn, part):
+    # Call inside the transaction that changed the rows
+    create_db_meta(conn)
+    version = int(get_meta(conn, 'version', 0)) + 1
+    set_meta(conn, 'version', version)
+    set_meta(conn, f'{part}_version', int(get_meta(conn, f'{part}_version', 0)) + 1)
+    set_meta(conn, 'updated_at', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+    return version
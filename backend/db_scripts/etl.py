@@ -0,0 +1,145 @@
+import codecs
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+'''
+Streaming helpers for the ETL scripts.
+
+Source rows and API payloads are consumed in bounded chunks instead of fetchall()/response.json(),
+so peak memory depends on ETL_CHUNK_SIZE and not on how big the source tables or the card set get.
+
+parallel_map fans chunks out to a process pool and hands the results back in order to the calling
+process, which stays the only one holding a write connection; ETL_WORKERS (default: one per core)
+sets the pool size, and 1 runs everything in-process.
+'''
+
+ETL_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "2000"))
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", str(os.cpu_count() or 1)))
+READ_SIZE = 1 << 16
+
+def iter_row_chunks(cursor, query, params=(), chunk_size=ETL_CHUNK_SIZE):
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def batched(items, size=ETL_CHUNK_SIZE):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            break
+        yield batch
+
+def read_text_chunks(path, size=READ_SIZE):
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+def decode_byte_chunks(byte_chunks, encoding='utf-8'):
+    # Multi-byte characters can be split across chunks; the incremental decoder carries the partial bytes over
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def iter_json_array(text_chunks, key='data'):
+    # Yields the items of the array under `key` in a JSON object one at a time, e.g. the cards of
+    # {"data": [{...}, {...}], ...}; only the current item and one read chunk are held in memory
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'[\s,]*')
+    header = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    number_end = re.compile(r'[\s,\]]')
+    chunks = iter(text_chunks)
+    buffer = ''
+
+    def read_more():
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError(f"JSON ended inside the '{key}' array")
+        return chunk
+
+    match = header.search(buffer)
+    while match is None:
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError(f"No '{key}' array in the JSON")
+        # Keep a short tail in case the header is split across two chunks
+        buffer = buffer[-(len(key) + 16):] + chunk
+        match = header.search(buffer)
+    buffer = buffer[match.end():]
+
+    while True:
+        position = whitespace.match(buffer).end()
+        if position == len(buffer):
+            buffer = read_more()
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The item is cut off at the end of the buffer
+            buffer = buffer[position:] + read_more()
+            continue
+        if isinstance(item, (int, float)) and not isinstance(item, bool) and not number_end.match(buffer, end):
+            # A number is only complete once a delimiter follows it: at the end of the buffer it can
+            # still go on in the next chunk (12|345, -1500|.0, 1|e3)
+            chunk = next(chunks, None)
+            if chunk is not None:
+                buffer = buffer[position:] + chunk
+                continue
+        yield item
+        buffer = buffer[end:]
+
+def parallel_map(func, chunks, workers=ETL_WORKERS, initializer=None, initargs=()):
+    # func(chunk) for every chunk, in order. At most two chunks per worker are in flight, so a slow
+    # writer holds back the reader instead of letting queued chunks pile up in memory.
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class Progress:
+    # Running count and throughput of one ETL stage, printed at most every `interval` seconds
+    def __init__(self, label, total=None, interval=5.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.start = self.last_report = time.perf_counter()
+
+    def add(self, count):
+        self.count += count
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        done = f"{self.count}/{self.total}" if self.total else f"{self.count}"
+        print(f"{self.label}: {done} rows, {self.count / elapsed:.0f} rows/s ({elapsed:.1f}s)")
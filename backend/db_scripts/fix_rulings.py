@@ -1,7 +1,14 @@
 import sqlite3
 import json
 import os
-import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from card_store import get_card_store
+from card_mentions import CardMentionMatcher
+from db_meta import bump_db_version
+from etl import ETL_CHUNK_SIZE, ETL_WORKERS, Progress, iter_row_chunks, parallel_map
 
 def get_card_name(card_id):
     try:
@@ -11,32 +18,26 @@ def get_card_name(card_id):
     except FileNotFoundError:
         return None
 
-def replace_card_ids_with_names(text, card_id_to_name):
-    def replace_id(match):
-        card_id = match.group(1)
-        return card_id_to_name.get(card_id, card_id)
-    
-    return re.sub(r'\b(\d+)\b', replace_id, text)
-
-def fix_rulings(input_db, output_db):
-    # Connect to the input database
-    conn = sqlite3.connect(input_db)
-    cursor = conn.cursor()
+def card_id_matcher(card_id_to_name):
+    # One automaton over every card id token; a pass over a text replaces all of them at once
+    return CardMentionMatcher(((int(card_id), name) for card_id, name in card_id_to_name.items()), match_names=False)
 
-    # Connect to the output database (yugioh.db)
-    new_conn = sqlite3.connect(output_db)
-    new_cursor = new_conn.cursor()
+def load_card_id_to_name(cards_dir='cards', store_dir='card_store'):
+    # The packed card store (`python card_store.py`) answers this in milliseconds; walking the JSON files is the fallback
+    store = get_card_store(store_dir)
+    if store is not None:
+        return {str(card_id): name for card_id, name in store.names('en').items() if name}
 
-    # Create card_id to card_name mapping
     card_id_to_name = {}
-    for filename in os.listdir('cards/en'):
+    for filename in os.listdir(os.path.join(cards_dir, 'en')):
         if filename.endswith('.json'):
             card_id = filename[:-5]
             card_name = get_card_name(card_id)
             if card_name:
                 card_id_to_name[card_id] = card_name
+    return card_id_to_name
 
-    # Process qa_tl table
+def create_ruling_tables(new_cursor):
     new_cursor.execute('''
     CREATE TABLE IF NOT EXISTS qa_tl_fixed (
         qaId INTEGER NOT NULL,
@@ -52,18 +53,17 @@ def fix_rulings(input_db, output_db):
     )
     ''')
 
-    cursor.execute("SELECT * FROM qa_tl")
-    for row in cursor.fetchall():
-        qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor = row
-        title = replace_card_ids_with_names(title, card_id_to_name)
-        question = replace_card_ids_with_names(question, card_id_to_name)
-        answer = replace_card_ids_with_names(answer, card_id_to_name)
-        new_cursor.execute(
-            "INSERT OR REPLACE INTO qa_tl_fixed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor)
-        )
+    # Card -> QA mapping, recorded while the card IDs in each question are resolved to names
+    new_cursor.execute('''
+    CREATE TABLE IF NOT EXISTS qa_card_mentions (
+        qaId INTEGER NOT NULL,
+        locale TEXT NOT NULL,
+        cardId INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (qaId, locale, cardId)
+    )
+    ''')
 
-    # Process faq_tl_entries table
     new_cursor.execute('''
     CREATE TABLE IF NOT EXISTS faq_tl_entries_fixed (
         cardId INTEGER NOT NULL,
@@ -75,24 +75,186 @@ def fix_rulings(input_db, output_db):
     )
     ''')
 
-    cursor.execute("SELECT * FROM faq_tl_entries")
-    for row in cursor.fetchall():
-        cardId, locale, effect, sourceHash, content = row
-        card_name = card_id_to_name.get(str(cardId), "Unknown Card")
-        content = replace_card_ids_with_names(content, card_id_to_name)
-        new_cursor.execute(
-            "INSERT OR REPLACE INTO faq_tl_entries_fixed VALUES (?, ?, ?, ?, ?, ?)",
-            (cardId, locale, effect, sourceHash, content, card_name)
+    # The card names the stored rows were written with, to find rows to rewrite when a name changes
+    new_cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ruling_card_names (
+        cardId INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    )
+    ''')
+
+    # Older runs could insert the same FAQ entry twice; keep the newest before making the key unique
+    new_cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_faq_tl_entries_fixed_key'")
+    if new_cursor.fetchone() is None:
+        new_cursor.execute('''
+        DELETE FROM faq_tl_entries_fixed WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM faq_tl_entries_fixed GROUP BY cardId, locale, effect
         )
+        ''')
+        new_cursor.execute("CREATE UNIQUE INDEX idx_faq_tl_entries_fixed_key ON faq_tl_entries_fixed (cardId, locale, effect)")
+
+    # Indexes for the lookups in search.get_exact_rulings
+    new_cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_card_mentions_name ON qa_card_mentions (name)")
+    new_cursor.execute("CREATE INDEX IF NOT EXISTS idx_faq_tl_entries_fixed_name ON faq_tl_entries_fixed (name)")
+    new_cursor.execute("CREATE INDEX IF NOT EXISTS idx_faq_tl_entries_fixed_card_id ON faq_tl_entries_fixed (cardId)")
+
+def fix_qa_row(row, id_matcher):
+    # (qa_tl_fixed row, qa_card_mentions rows) for one qa_tl row
+    qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor = row
+    # Only the question counts as a mention, same as the old `question LIKE '%name%'` lookup
+    mentioned_ids = set()
+    title = id_matcher.replace_ids(title)
+    question = id_matcher.replace_ids(question, mentioned_ids)
+    answer = id_matcher.replace_ids(answer)
+    mentions = [(qaId, locale, card_id, id_matcher.names_by_id[card_id]) for card_id in sorted(mentioned_ids)]
+    return (qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor), mentions
+
+def fix_faq_row(row, id_matcher):
+    cardId, locale, effect, sourceHash, content = row
+    card_name = id_matcher.names_by_id.get(cardId, "Unknown Card")
+    content = id_matcher.replace_ids(content)
+    return (cardId, locale, effect, sourceHash, content, card_name)
 
-    # Commit changes and close connections
+# Per-process state of the rewrite workers, set once by init_rewrite_worker so the automata are
+# built in each worker instead of being pickled with every chunk
+_rewrite_state = {}
+
+def init_rewrite_worker(card_id_to_name, renamed_ids, full):
+    _rewrite_state['id_matcher'] = card_id_matcher(card_id_to_name)
+    _rewrite_state['renamed_ids'] = renamed_ids
+    _rewrite_state['renamed_matcher'] = card_id_matcher({card_id: card_id_to_name.get(card_id, str(card_id)) for card_id in renamed_ids})
+    _rewrite_state['full'] = full
+
+def is_stale(stored_hash, source_hash, *texts):
+    if _rewrite_state['full'] or stored_hash is None or stored_hash != source_hash:
+        return True
+    return bool(_rewrite_state['renamed_ids']) and any(_rewrite_state['renamed_matcher'].find(text) for text in texts)
+
+def fix_qa_chunk(chunk):
+    # chunk: [(qa_tl row, stored sourceHash)] -> (qa_tl_fixed rows, qa_card_mentions rows) of the stale ones,
+    # and the number of rows read
+    qa_rows, mention_rows = [], []
+    for row, stored_hash in chunk:
+        if is_stale(stored_hash, row[6], row[2], row[3], row[4]):
+            fixed_row, mentions = fix_qa_row(row, _rewrite_state['id_matcher'])
+            qa_rows.append(fixed_row)
+            mention_rows.extend(mentions)
+    return qa_rows, mention_rows, len(chunk)
+
+def fix_faq_chunk(chunk):
+    # chunk: [(faq_tl_entries row, stored sourceHash)] -> faq_tl_entries_fixed rows of the stale ones, and the number of rows read
+    faq_rows = [fix_faq_row(row, _rewrite_state['id_matcher']) for row, stored_hash in chunk
+                if row[0] in _rewrite_state['renamed_ids'] or is_stale(stored_hash, row[3], row[4])]
+    return faq_rows, len(chunk)
+
+def with_stored_hashes(row_chunks, stored, key_length, seen):
+    # Pairs every source row with the sourceHash it was last written with, recording its key in seen
+    for rows in row_chunks:
+        chunk = []
+        for row in rows:
+            key = tuple(row[:key_length])
+            seen.add(key)
+            chunk.append((row, stored.get(key)))
+        yield chunk
+
+def fix_rulings(input_db, output_db, full=False, chunk_size=ETL_CHUNK_SIZE, workers=ETL_WORKERS):
+    # Incremental: a source row is rewritten only when it is new, its sourceHash changed, or it mentions a card
+    # whose name changed since the last run; rows gone from the source are deleted. Source rows are streamed in
+    # chunks of chunk_size and rewritten by a pool of `workers` processes (etl.parallel_map); this process is
+    # the only writer, applying each chunk as executemany batches inside one transaction that also bumps the
+    # database version (db_meta).
+    start = time.perf_counter()
+
+    # Connect to the input database
+    conn = sqlite3.connect(input_db)
+    cursor = conn.cursor()
+
+    # Connect to the output database (yugioh.db)
+    new_conn = sqlite3.connect(output_db)
+    # WAL lets the server's read-only connections keep reading while this script writes
+    new_conn.execute("PRAGMA journal_mode=WAL")
+    new_cursor = new_conn.cursor()
+    create_ruling_tables(new_cursor)
     new_conn.commit()
+
+    card_id_to_name = {int(card_id): name for card_id, name in load_card_id_to_name().items()}
+
+    new_cursor.execute("SELECT cardId, name FROM ruling_card_names")
+    previous_names = dict(new_cursor.fetchall())
+    # Without the names of the last run there is no telling which stored rows are stale
+    full = full or not previous_names
+    renamed_ids = {card_id for card_id in set(card_id_to_name) | set(previous_names)
+                   if card_id_to_name.get(card_id) != previous_names.get(card_id)}
+    worker_args = (card_id_to_name, renamed_ids, full)
+
+    # The stored keys and hashes are the only per-row state kept in memory; source rows are read and
+    # written back one chunk at a time, so memory stays flat however large qa_tl/faq_tl_entries get
+    new_cursor.execute("SELECT qaId, locale, sourceHash FROM qa_tl_fixed")
+    stored_qa = {(qaId, locale): sourceHash for qaId, locale, sourceHash in new_cursor.fetchall()}
+    new_cursor.execute("SELECT cardId, locale, effect, sourceHash FROM faq_tl_entries_fixed")
+    stored_faq = {(cardId, locale, effect): sourceHash for cardId, locale, effect, sourceHash in new_cursor.fetchall()}
+    seen_qa, seen_faq = set(), set()
+    qa_written = faq_written = 0
+
+    with new_conn:
+        # Process qa_tl table
+        cursor.execute("SELECT COUNT(*) FROM qa_tl")
+        progress = Progress("QA", cursor.fetchone()[0])
+        qa_chunks = with_stored_hashes(iter_row_chunks(cursor, "SELECT * FROM qa_tl", chunk_size=chunk_size), stored_qa, 2, seen_qa)
+        for qa_rows, mention_rows, read in parallel_map(fix_qa_chunk, qa_chunks, workers, init_rewrite_worker, worker_args):
+            new_cursor.executemany("DELETE FROM qa_card_mentions WHERE qaId = ? AND locale = ?", [row[:2] for row in qa_rows])
+            new_cursor.executemany("INSERT OR REPLACE INTO qa_tl_fixed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", qa_rows)
+            new_cursor.executemany("INSERT OR REPLACE INTO qa_card_mentions VALUES (?, ?, ?, ?)", mention_rows)
+            qa_written += len(qa_rows)
+            progress.add(read)
+        progress.report()
+        removed_qa = [key for key in stored_qa if key not in seen_qa]
+        new_cursor.executemany("DELETE FROM qa_card_mentions WHERE qaId = ? AND locale = ?", removed_qa)
+        new_cursor.executemany("DELETE FROM qa_tl_fixed WHERE qaId = ? AND locale = ?", removed_qa)
+
+        # Process faq_tl_entries table
+        cursor.execute("SELECT COUNT(*) FROM faq_tl_entries")
+        progress = Progress("FAQ", cursor.fetchone()[0])
+        faq_chunks = with_stored_hashes(iter_row_chunks(cursor, "SELECT * FROM faq_tl_entries", chunk_size=chunk_size), stored_faq, 3, seen_faq)
+        for faq_rows, read in parallel_map(fix_faq_chunk, faq_chunks, workers, init_rewrite_worker, worker_args):
+            new_cursor.executemany("INSERT OR REPLACE INTO faq_tl_entries_fixed VALUES (?, ?, ?, ?, ?, ?)", faq_rows)
+            faq_written += len(faq_rows)
+            progress.add(read)
+        progress.report()
+        removed_faq = [key for key in stored_faq if key not in seen_faq]
+        new_cursor.executemany("DELETE FROM faq_tl_entries_fixed WHERE cardId = ? AND locale = ? AND effect = ?", removed_faq)
+
+        new_cursor.executemany("DELETE FROM ruling_card_names WHERE cardId = ?",
+                               [(card_id,) for card_id in renamed_ids if card_id not in card_id_to_name])
+        new_cursor.executemany("INSERT OR REPLACE INTO ruling_card_names VALUES (?, ?)",
+                               [(card_id, card_id_to_name[card_id]) for card_id in renamed_ids if card_id in card_id_to_name])
+        changed = qa_written or removed_qa or faq_written or removed_faq
+        if changed:
+            version = bump_db_version(new_conn, 'rulings')
+
+    # Close connections
     conn.close()
     new_conn.close()
 
-    print(f"Database conversion complete. New tables added to {output_db}")
+    print(f"QA: {qa_written} written, {len(removed_qa)} removed, {len(seen_qa) - qa_written} unchanged; "
+          f"FAQ: {faq_written} written, {len(removed_faq)} removed, {len(seen_faq) - faq_written} unchanged "
+          f"({time.perf_counter() - start:.1f}s)")
+    if changed:
+        print(f"Database conversion complete. {output_db} is now at version {version}")
+    return bool(changed)
 
 if __name__ == "__main__":
-    input_db = "translations.db"
-    output_db = "yugioh.db"
-    fix_rulings(input_db, output_db)
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resolve card ids in the translated rulings and copy them into yugioh.db")
+    parser.add_argument('input_db', nargs='?', default='translations.db')
+    parser.add_argument('output_db', nargs='?', default='yugioh.db')
+    parser.add_argument('--full', action='store_true', help="rewrite every row instead of only the changed ones")
+    parser.add_argument('--chunk-size', type=int, default=ETL_CHUNK_SIZE, help="source rows read and written per batch")
+    parser.add_argument('--workers', type=int, default=ETL_WORKERS, help="processes rewriting the rows (1: no pool)")
+    parser.add_argument('--update-embeddings', action='store_true',
+                        help="bring the dense ruling index (dense_index.py) up to date after the changes")
+    args = parser.parse_args()
+    if fix_rulings(args.input_db, args.output_db, args.full, args.chunk_size, args.workers) and args.update_embeddings:
+        from dense_index import update_ruling_embeddings
+        update_ruling_embeddings(args.output_db)
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bm25_index import FINGERPRINT_CHECK_INTERVAL, default_index_dir
+
+# Dense retrieval over every ruling row.
+# An offline job (`python dense_index.py [db_path]`) embeds each row of qa_tl_fixed and
+# faq_tl_entries_fixed with a small bi-encoder and stores the normalised vectors as a float16 .npy
+# that is memory-mapped at query time. With --ivf-lists N it also clusters the vectors (k-means) into
+# an inverted file so a query only scans the n_probe closest lists instead of the whole matrix.
+# A hash of each row's text is stored next to its vector, so `python dense_index.py --update`
+# (or `fix_rulings.py --update-embeddings`) only embeds rows that are new or changed.
+
+INDEX_FORMAT_VERSION = 2
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DENSE_TOP_K = int(os.getenv("DENSE_TOP_K", "20"))
+IVF_N_PROBE = int(os.getenv("IVF_N_PROBE", "8"))
+
+# Position in RULING_SOURCES is the source code stored next to each vector
+RULING_SOURCES = ['qa_tl_fixed', 'faq_tl_entries_fixed']
+RULING_TEXT_SQL = {
+    'qa_tl_fixed': "SELECT rowid, question || ' ' || answer FROM qa_tl_fixed",
+    'faq_tl_entries_fixed': "SELECT rowid, content FROM faq_tl_entries_fixed",
+}
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(EMBEDDING_MODEL)
+    return _embedder
+
+def embed_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    embeddings = get_embedder().encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+    return np.asarray(embeddings, dtype=np.float32)
+
+def index_paths(db_path: str) -> Dict[str, str]:
+    index_dir = default_index_dir(db_path)
+    return {
+        'meta': os.path.join(index_dir, 'ruling_embeddings.json'),
+        'vectors': os.path.join(index_dir, 'ruling_embeddings.f16.npy'),
+        'ids': os.path.join(index_dir, 'ruling_embeddings_ids.npy'),
+        'hashes': os.path.join(index_dir, 'ruling_embeddings_hashes.npy'),
+        'centroids': os.path.join(index_dir, 'ruling_ivf_centroids.npy'),
+        'list_offsets': os.path.join(index_dir, 'ruling_ivf_offsets.npy'),
+    }
+
+def rulings_fingerprint(conn: sqlite3.Connection) -> str:
+    parts = []
+    for table in RULING_SOURCES:
+        row = conn.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {table}").fetchone()
+        parts.extend(str(value) for value in row)
+    try:
+        # Bumped by every fix_rulings.py run that changed rows
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'rulings_version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row:
+        parts.append(f"v{row[0]}")
+    return ':'.join(parts)
+
+def text_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class DenseRulingIndex:
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, meta: Dict,
+                 centroids: Optional[np.ndarray] = None, list_offsets: Optional[np.ndarray] = None,
+                 hashes: Optional[np.ndarray] = None):
+        self.vectors = vectors  # (n, dim) float16, memory-mapped
+        self.ids = ids  # (n, 2) int64: source code, rowid
+        self.hashes = hashes  # (n,) uint64: text_hash of each row's text
+        self.meta = meta
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional['DenseRulingIndex']:
+        paths = index_paths(db_path)
+        if not os.path.exists(paths['meta']):
+            return None
+        with open(paths['meta'], 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_FORMAT_VERSION:
+            return None
+        centroids = list_offsets = None
+        if meta.get('ivf_lists'):
+            centroids = np.load(paths['centroids'])
+            list_offsets = np.load(paths['list_offsets'])
+        return cls(np.load(paths['vectors'], mmap_mode='r'), np.load(paths['ids'], mmap_mode='r'),
+                   meta, centroids, list_offsets, np.load(paths['hashes'], mmap_mode='r'))
+
+    def search(self, query_vector: np.ndarray, k: int = DENSE_TOP_K, n_probe: int = IVF_N_PROBE) -> List[Tuple[str, int, float]]:
+        query_vector = query_vector.astype(np.float32).ravel()
+        if self.centroids is not None:
+            # Only scan the rows of the n_probe lists whose centroids are closest to the query
+            closest_lists = np.argsort(self.centroids @ query_vector)[::-1][:n_probe]
+            candidates = np.concatenate([
+                np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in closest_lists
+            ])
+        else:
+            candidates = np.arange(len(self.ids))
+        if len(candidates) == 0:
+            return []
+
+        scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query_vector
+        k = min(k, len(candidates))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [
+            (RULING_SOURCES[int(self.ids[candidates[i]][0])], int(self.ids[candidates[i]][1]), float(scores[i]))
+            for i in top
+        ]
+
+
+_dense_indexes: Dict[str, Optional[DenseRulingIndex]] = {}
+# When the fingerprint was last checked, and the mtime of the meta file the cached index was loaded from
+_dense_index_checked: Dict[str, float] = {}
+_dense_index_mtimes: Dict[str, Optional[float]] = {}
+_dense_index_lock = threading.Lock()
+
+def _meta_mtime(db_path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(index_paths(db_path)['meta'])
+    except OSError:
+        return None
+
+def get_dense_index(db_path: str = 'yugioh.db') -> Optional[DenseRulingIndex]:
+    # Like get_card_index, re-checked every FINGERPRINT_CHECK_INTERVAL: a fix_rulings.py run shifts rowids
+    # (the index is skipped until it is rebuilt) and a rebuild replaces the files (the new ones are loaded)
+    if db_path in _dense_indexes and time.monotonic() - _dense_index_checked.get(db_path, 0.0) < FINGERPRINT_CHECK_INTERVAL:
+        return _dense_indexes[db_path]
+
+    with _dense_index_lock:
+        if db_path in _dense_indexes and time.monotonic() - _dense_index_checked.get(db_path, 0.0) < FINGERPRINT_CHECK_INTERVAL:
+            return _dense_indexes[db_path]
+        conn = sqlite3.connect(db_path)
+        try:
+            fingerprint = rulings_fingerprint(conn)
+        finally:
+            conn.close()
+        index = _dense_indexes.get(db_path)
+        mtime = _meta_mtime(db_path)
+        if index is None or index.meta.get('fingerprint') != fingerprint or _dense_index_mtimes.get(db_path) != mtime:
+            was_usable = index is not None or db_path not in _dense_indexes
+            index = DenseRulingIndex.load(db_path)
+            if index is not None and index.meta.get('fingerprint') != fingerprint:
+                # Row ids no longer line up with the tables; skip the stage until the job reruns
+                if was_usable:
+                    print("Ruling embeddings are stale, run `python dense_index.py --update` to refresh them")
+                index = None
+            _dense_indexes[db_path] = index
+            _dense_index_mtimes[db_path] = mtime
+        _dense_index_checked[db_path] = time.monotonic()
+    return _dense_indexes[db_path]
+
+
+# Offline build
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    # Spherical k-means on a sample; good enough to partition normalised embeddings
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), n_lists * 256), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = sample[assignments == i]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    return centroids
+
+def build_ruling_embeddings(db_path: str = 'yugioh.db', ivf_lists: int = 0, chunk_size: int = 1024, verbose: bool = True,
+                            previous: Optional[DenseRulingIndex] = None):
+    # With a previous index, rows whose (source, rowid) and text hash are unchanged reuse their stored vector
+    paths = index_paths(db_path)
+    os.makedirs(os.path.dirname(paths['meta']), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    fingerprint = rulings_fingerprint(conn)
+    total = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in RULING_SOURCES)
+    dim = get_embedder().get_sentence_embedding_dimension()
+
+    reusable: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    if previous is not None and previous.hashes is not None and previous.meta.get('dim') == dim \
+            and previous.meta.get('model') == EMBEDDING_MODEL:
+        reusable = {
+            (int(source_code), int(rowid)): (int(row_hash), position)
+            for position, ((source_code, rowid), row_hash) in enumerate(zip(previous.ids.tolist(), previous.hashes.tolist()))
+        }
+
+    vectors = np.lib.format.open_memmap(paths['vectors'] + '.tmp', mode='w+', dtype=np.float16, shape=(total, dim))
+    ids = np.zeros((total, 2), dtype=np.int64)
+    hashes = np.zeros(total, dtype=np.uint64)
+    start = time.perf_counter()
+    position = 0
+    embedded = 0
+    for source_code, table in enumerate(RULING_SOURCES):
+        cursor = conn.execute(RULING_TEXT_SQL[table])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            texts = [text or '' for _, text in rows]
+            row_hashes = [text_hash(text) for text in texts]
+            to_embed = []
+            for i, ((rowid, _), row_hash) in enumerate(zip(rows, row_hashes)):
+                stored = reusable.get((source_code, rowid))
+                if stored is not None and stored[0] == row_hash:
+                    vectors[position + i] = previous.vectors[stored[1]]
+                else:
+                    to_embed.append(i)
+            if to_embed:
+                vectors[[position + i for i in to_embed]] = embed_texts([texts[i] for i in to_embed]).astype(np.float16)
+                embedded += len(to_embed)
+            ids[position:position + len(rows), 0] = source_code
+            ids[position:position + len(rows), 1] = [rowid for rowid, _ in rows]
+            hashes[position:position + len(rows)] = row_hashes
+            position += len(rows)
+            if verbose:
+                print(f"Processed {position}/{total} rulings, {embedded} embedded ({position / (time.perf_counter() - start):.0f}/s)")
+    conn.close()
+
+    meta = {'version': INDEX_FORMAT_VERSION, 'model': EMBEDDING_MODEL, 'dim': dim, 'count': position,
+            'fingerprint': fingerprint, 'ivf_lists': 0}
+    if ivf_lists and position > ivf_lists:
+        # Reorder rows so each inverted list is a contiguous slice of the matrix
+        dense = np.asarray(vectors[:position], dtype=np.float32)
+        centroids = _kmeans(dense, ivf_lists)
+        assignments = np.argmax(dense @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        vectors[:position] = vectors[:position][order]
+        ids[:position] = ids[:position][order]
+        hashes[:position] = hashes[:position][order]
+        list_offsets = np.zeros(ivf_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=ivf_lists))
+        np.save(paths['centroids'], centroids.astype(np.float32))
+        np.save(paths['list_offsets'], list_offsets)
+        meta['ivf_lists'] = ivf_lists
+
+    vectors.flush()
+    del vectors
+    if previous is not None:
+        # Drop the old memory maps before their files are replaced
+        previous.vectors = previous.ids = previous.hashes = None
+    os.replace(paths['vectors'] + '.tmp', paths['vectors'])
+    np.save(paths['ids'], ids[:position])
+    np.save(paths['hashes'], hashes[:position])
+    with open(paths['meta'], 'w') as f:
+        json.dump(meta, f)
+    _dense_indexes.pop(db_path, None)
+    print(f"Ruling embeddings written: {position} rows ({embedded} embedded), dim {dim}, {meta['ivf_lists']} IVF lists")
+
+def update_ruling_embeddings(db_path: str = 'yugioh.db', chunk_size: int = 1024, verbose: bool = True):
+    # Keeps the IVF setting of the existing index; a full build when there is none to update
+    previous = DenseRulingIndex.load(db_path)
+    ivf_lists = previous.meta.get('ivf_lists', 0) if previous is not None else 0
+    build_ruling_embeddings(db_path, ivf_lists, chunk_size, verbose, previous=previous)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embed every ruling row for dense retrieval")
+    parser.add_argument('db_path', nargs='?', default='yugioh.db')
+    parser.add_argument('--ivf-lists', type=int, default=0, help="cluster into N inverted lists (0 = exact search)")
+    parser.add_argument('--update', action='store_true', help="only embed rows that are new or changed since the last build")
+    args = parser.parse_args()
+    if args.update:
+        update_ruling_embeddings(args.db_path)
+    else:
+        build_ruling_embeddings(args.db_path, args.ivf_lists)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from db import get_db_version
+
+# Persistent cache of complete inquiries.
+# Keyed by the normalised question, the sorted card names and the database version, and holds the
+# recorded AgentResponse stream so a hit can be replayed without running the agent. Entries expire
+# after INQUIRY_CACHE_TTL seconds, the least recently used ones are evicted past INQUIRY_CACHE_MAX_ENTRIES,
+# and entries recorded against an older database version are dropped on the next write.
+
+INQUIRY_CACHE_PATH = os.getenv("INQUIRY_CACHE_PATH", "inquiry_cache.db")
+INQUIRY_CACHE_TTL = float(os.getenv("INQUIRY_CACHE_TTL", str(7 * 24 * 3600)))
+INQUIRY_CACHE_MAX_ENTRIES = int(os.getenv("INQUIRY_CACHE_MAX_ENTRIES", "5000"))
+
+def normalize_question(question: str) -> str:
+    question = unicodedata.normalize('NFKC', question).casefold()
+    question = re.sub(r'\s+', ' ', question).strip()
+    return question.rstrip('?!. ')
+
+def cache_key(question: str, card_names: List[str], db_version: str) -> str:
+    payload = json.dumps([normalize_question(question), sorted(card_names), db_version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class InquiryCache:
+    def __init__(self, path: str = INQUIRY_CACHE_PATH, db_path: str = 'yugioh.db',
+                 ttl: float = INQUIRY_CACHE_TTL, max_entries: int = INQUIRY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS inquiry_cache (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                cards TEXT NOT NULL,
+                db_version TEXT NOT NULL,
+                responses TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_inquiry_cache_last_access ON inquiry_cache (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, question: str, card_names: List[str]) -> Optional[List[Dict[str, Any]]]:
+        key = cache_key(question, card_names, get_db_version(self.db_path))
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT responses, created FROM inquiry_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE inquiry_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, question: str, card_names: List[str], responses: List[Dict[str, Any]]):
+        db_version = get_db_version(self.db_path)
+        key = cache_key(question, card_names, db_version)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO inquiry_cache VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, question, json.dumps(sorted(card_names)), db_version, json.dumps(responses), now, now)
+            )
+            self._evict(conn, db_version, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, db_version: str, now: float):
+        # Rulings changed, expired, or over capacity (least recently used first)
+        conn.execute("DELETE FROM inquiry_cache WHERE db_version != ? OR created < ?", (db_version, now - self.ttl))
+        conn.execute('''
+        DELETE FROM inquiry_cache WHERE key IN (
+            SELECT key FROM inquiry_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+        )
+        ''', (self.max_entries,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM inquiry_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries,
+        }
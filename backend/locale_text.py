@@ -0,0 +1,47 @@
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+# Per-locale text normalization shared by the name index build (db_scripts/card_name_index.py)
+# and the search path, so both sides agree on what a lookup key looks like.
+# A key is NFKC-folded (full-width -> ASCII, half-width kana -> full-width), case-folded, with
+# katakana folded to hiragana, Latin accents and Arabic letter variants folded, and every
+# character that isn't a letter or digit dropped: "Ｂｌｕｅ－Ｅｙｅｓ" and "blue eyes" share the key
+# "blueeyes", "ブラック・マジシャン" and "ぶらっくまじしゃん" share "ぶらっくまじしゃん".
+
+CJK_LOCALES = {'ja', 'cn', 'ko'}
+NGRAM_SIZE = 2
+
+# Arabic letters that are written interchangeably; tatweel (kashida) is decorative
+ARABIC_FOLDS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,
+})
+
+def katakana_to_hiragana(text: str) -> str:
+    return ''.join(chr(ord(ch) - 0x60) if 'ァ' <= ch <= 'ヶ' else ch for ch in text)
+
+@lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    # Only Latin letters lose their accents; decomposing kana or hangul would change the word
+    if ch < 'ɐ':
+        return ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+    return ch
+
+def is_cjk(text: str) -> bool:
+    for ch in text:
+        if ('぀' <= ch <= 'ヿ' or '㐀' <= ch <= '鿿' or '가' <= ch <= '힯'
+                or 'ᄀ' <= ch <= 'ᇿ' or '豈' <= ch <= '﫿' or 'ｦ' <= ch <= 'ﾟ'):
+            return True
+    return False
+
+def normalize_name(text: str) -> str:
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = katakana_to_hiragana(text).translate(ARABIC_FOLDS)
+    return ''.join(_fold_char(ch) for ch in text if ch.isalnum())
+
+def name_ngrams(key: str, n: int = NGRAM_SIZE) -> List[str]:
+    # Overlapping n-grams plus the shorter tails of the key, so every character of the key starts at
+    # least one gram and a 1-character query finds it at any position, also in keys of n characters or fewer
+    return [key[i:i + n] for i in range(len(key))]
@@ -0,0 +1,151 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Process-wide latency histograms and counters, plus per-inquiry timing breakdowns.
+# span(stage) times a block into the yugioh_stage_seconds histogram and, while an inquiry is being
+# answered, into its InquiryTrace as well. The trace lives in a context variable, so it follows the
+# inquiry into the tasks of concurrent actions and, through db.run_in_db, into the SQLite threads.
+# Stages nest (an action contains its queries and its rerank) and concurrent actions overlap, so a
+# breakdown's stage totals add up to more than the inquiry's wall time.
+# render() writes everything in the Prometheus text exposition format; server.py serves it at /metrics.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_text(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), trace_key: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Also counted in the current inquiry's breakdown under this key
+        self.trace_key = trace_key
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        trace = _current_trace.get()
+        if trace is not None and self.trace_key:
+            trace.count(self.trace_key, amount)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labelnames, key)} {value:g}')
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (the last one is +Inf), sum, count
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, totals) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = 'le="{}"'.format('+Inf' if bound == float('inf') else f'{bound:g}')
+                    lines.append(f'{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_label_text(self.labelnames, key)} {totals[0]:.6f}')
+                lines.append(f'{self.name}_count{_label_text(self.labelnames, key)} {cumulative}')
+        return lines
+
+class InquiryTrace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}
+        self.counts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, key: str, amount: float = 1.0):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0.0) + amount
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def breakdown(self) -> Dict[str, Any]:
+        # Attached to the final message of an inquiry
+        with self._lock:
+            return {
+                'total_ms': round(self.elapsed() * 1000, 1),
+                'stages': {stage: {'count': int(count), 'total_ms': round(seconds * 1000, 1)}
+                           for stage, (count, seconds) in sorted(self.stages.items(), key=lambda item: -item[1][1])},
+                'counts': {key: int(value) for key, value in sorted(self.counts.items())},
+            }
+
+_current_trace: contextvars.ContextVar[Optional[InquiryTrace]] = contextvars.ContextVar('inquiry_trace', default=None)
+
+STAGE_SECONDS = Histogram('yugioh_stage_seconds', 'Duration of each instrumented stage (LLM calls, actions, SQLite jobs, BM25, reranking).', ['stage'])
+INQUIRY_SECONDS = Histogram('yugioh_inquiry_seconds', 'Wall time of an inquiry, from receipt to its final message.', ['source'])
+INQUIRIES = Counter('yugioh_inquiries_total', 'Inquiries answered, by where the answer came from.', ['source'])
+AGENT_TURNS = Counter('yugioh_agent_turns_total', 'Model completions of the agent loop, by kind of turn.', ['kind'], trace_key='turns')
+AGENT_ACTIONS = Counter('yugioh_agent_actions_total', 'Actions performed by the agent.', ['action'], trace_key='actions')
+DUPLICATE_ACTIONS = Counter('yugioh_agent_duplicate_actions_total', 'Actions skipped because they were already performed.', ['action'],
+                            trace_key='duplicate_actions')
+REGISTRY = [STAGE_SECONDS, INQUIRY_SECONDS, INQUIRIES, AGENT_TURNS, AGENT_ACTIONS, DUPLICATE_ACTIONS]
+
+def current_trace() -> Optional[InquiryTrace]:
+    return _current_trace.get()
+
+def record_stage(stage: str, seconds: float, traced: bool = True):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get() if traced else None
+    if trace is not None:
+        trace.record(stage, seconds)
+
+@contextmanager
+def span(stage: str, traced: bool = True) -> Iterator[None]:
+    # traced=False for work shared between inquiries (a rerank batch), which only goes to the histogram
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, traced)
+
+@contextmanager
+def trace_inquiry() -> Iterator[InquiryTrace]:
+    trace = InquiryTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,145 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import uvicorn
+
+# Preforking multi-worker server.
+# The master process imports the app, runs `preload` (the cross-encoder, the embedding model and the
+# read-only indexes, see server.warm_up), binds the listening socket and then forks
+# SERVER_WORKERS workers that each run their own uvicorn event loop on that socket; the kernel spreads
+# WebSocket connections over them. Everything loaded before the fork is shared copy-on-write: model
+# weights, numpy posting arrays and the Aho-Corasick automaton are only read, and gc.freeze() keeps the
+# collector from writing to the pages of the preloaded objects, so workers add their per-session state,
+# not another copy of the model. Memory-mapped files (dense ruling index, card store) are shared
+# through the page cache either way. Modules with process-local resources (db.py connections and
+# thread pool, reranker.py executors) reset them in the child with os.register_at_fork.
+# POSIX only; the master restarts workers that die and forwards SIGINT/SIGTERM to them.
+
+logger = logging.getLogger(__name__)
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+WORKER_RESTART_DELAY = 1.0
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def torch_threads_per_worker(workers: int) -> int:
+    # The workers share the cores; one intra-op pool per core in total
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def memory_report(pids: List[int]) -> Dict[int, Dict[str, float]]:
+    # RSS counts shared pages in every process that maps them; PSS divides them between those processes,
+    # so the PSS total is what the whole server really uses. Linux only (/proc/<pid>/smaps_rollup)
+    report = {}
+    for pid in pids:
+        values = {}
+        try:
+            with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if parts[0] in ('Rss:', 'Pss:', 'Shared_Clean:', 'Shared_Dirty:'):
+                        values[parts[0][:-1].lower() + '_mb'] = int(parts[1]) / 1024
+        except OSError:
+            continue
+        report[pid] = values
+    return report
+
+def log_memory_report(master_pid: int, worker_pids: List[int]):
+    report = memory_report([master_pid] + worker_pids)
+    if not report:
+        return
+    for pid, values in report.items():
+        role = 'master' if pid == master_pid else 'worker'
+        logger.info(f"{role} {pid}: RSS {values.get('rss_mb', 0):.0f} MB, PSS {values.get('pss_mb', 0):.0f} MB")
+    logger.info(f"Total: RSS {sum(v.get('rss_mb', 0) for v in report.values()):.0f} MB, "
+                f"PSS {sum(v.get('pss_mb', 0) for v in report.values()):.0f} MB")
+
+def _run_worker(app: Any, sock: socket.socket, workers: int, uvicorn_kwargs: Dict[str, Any]):
+    # In the forked child: default signal handling for uvicorn to install its own, a collector again,
+    # and a share of the cores for torch
+    for signum in (signal.SIGINT, signal.SIGTERM, getattr(signal, 'SIGUSR1', None)):
+        if signum is not None:
+            signal.signal(signum, signal.SIG_DFL)
+    gc.enable()
+    try:
+        import torch
+        torch.set_num_threads(torch_threads_per_worker(workers))
+    except ImportError:
+        pass
+    server = uvicorn.Server(uvicorn.Config(app, **uvicorn_kwargs))
+    server.run(sockets=[sock])
+
+def _fork_worker(app: Any, sock: socket.socket, workers: int, uvicorn_kwargs: Dict[str, Any]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock, workers, uvicorn_kwargs)
+        except BaseException:
+            logger.exception("Worker failed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def serve(app: Any, host: str = '0.0.0.0', port: int = 8000, workers: int = SERVER_WORKERS,
+          preload: Optional[Callable[[], None]] = None, **uvicorn_kwargs):
+    if workers <= 1 or not hasattr(os, 'fork'):
+        # A single process warms up in the background after startup (server.warm_up)
+        uvicorn.run(app, host=host, port=port, **uvicorn_kwargs)
+        return
+
+    start = time.perf_counter()
+    if preload is not None:
+        preload()
+    # Everything allocated so far is permanent; the collector won't touch (and un-share) those pages
+    gc.disable()
+    gc.freeze()
+    sock = bind_socket(host, port)
+    uvicorn_kwargs = {'host': host, 'port': port, **uvicorn_kwargs}
+    logger.info(f"Preloaded in {time.perf_counter() - start:.1f}s, starting {workers} workers on {host}:{port}")
+
+    pids = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGUSR1'):
+        # kill -USR1 <master> logs the RSS/PSS of every process
+        signal.signal(signal.SIGUSR1, lambda signum, frame: log_memory_report(os.getpid(), sorted(pids)))
+
+    for _ in range(workers):
+        pids.add(_fork_worker(app, sock, workers, uvicorn_kwargs))
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        pids.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(WORKER_RESTART_DELAY)
+            pids.add(_fork_worker(app, sock, workers, uvicorn_kwargs))
+    sock.close()
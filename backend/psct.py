@@ -0,0 +1,229 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel
+
+# Problem-Solving Card Text parser: splits a card's text into its effects and each effect into
+# activation condition (before ':'), cost (between ':' and ';') and resolution (after ';').
+# One compiled tokenizer walks the text once; card names in quotes ("Number 39: Utopia") and
+# parentheticals are single tokens, so their ':' and ';' are never mistaken for PSCT punctuation.
+# Effects start at a (1)/(2) label or, on unlabeled text, at every sentence that doesn't carry on the
+# resolution of the activated effect before it.
+# "You can only use ..." sentences aren't effects; they mark the effects they name as hard once per turn.
+# parse_card_texts runs the parser over a whole card pool (the ETL uses it for card_mechanics.effects).
+
+class CardEffect(BaseModel):
+    number: Optional[int] = None
+    text: str
+    effect_type: str
+    condition: str = ''
+    cost: str = ''
+    resolution: str = ''
+    conjunctions: List[str] = []
+    targeting: bool = False
+    usage_limit: Optional[str] = None
+    hard_once_per_turn: bool = False
+
+_TOKEN = re.compile(r'''
+    (?P<label>\((?P<number>\d+)\)\s*:)
+  | (?P<quoted>"[^"\n]*")
+  | (?P<paren>\([^()\n]*\))
+  | (?P<colon>:)
+  | (?P<semicolon>;)
+  | (?P<period>\.(?=\s|$))
+  | (?P<newline>\n+)
+  | (?P<text>[^"():;.\n]+|.)
+''', re.VERBOSE)
+
+_CONJUNCTION = re.compile(r'\b(and if you do|then|also)\b')
+_TARGET = re.compile(r'\btarget\b')
+_TRIGGER = re.compile(r'\b(if|when)\b')
+_USAGE_LIMIT = re.compile(r'\bonce per (turn|chain|duel)\b')
+_OPPONENTS_TURN = re.compile(r"\bduring (either player's|your opponent's) turn\b")
+_RESTRICTION = re.compile(r'^you can only (use|activate)\b')
+_RESTRICTED_NUMBERS = re.compile(r'\((\d+)\)')
+_FOLLOWING = re.compile(r'\bthe following effects?\b')
+_BULLETS = ('●', '•')
+_BULLET_CHARS = '●• '
+# The label's colon is consumed with it, so "(1): You can draw 1 card." is activated without a colon of its own
+_OPTIONAL_ACTIVATION = re.compile(r'^you can\b')
+# Sentences that carry on the resolution before them ("Special Summon it. It cannot attack this turn.")
+# rather than start an effect of their own ("... This card gains 500 ATK.")
+_CONTINUATION = re.compile(r'^(it|its|they|their|them|that|those|these|also|then|otherwise|until|for the rest|during the end phase)\b')
+
+
+class _Sentence:
+    __slots__ = ('text', 'colon', 'semicolon', 'open_ended')
+
+    def __init__(self):
+        self.text = ''
+        # Offsets of the first top-level ':' and of the first top-level ';' after it
+        self.colon: Optional[int] = None
+        self.semicolon: Optional[int] = None
+        # Ended by a line break without a period, like the material line of Extra Deck monsters
+        self.open_ended = False
+
+    def add(self, token: str, kind: str):
+        if kind == 'colon' and self.colon is None and self.semicolon is None:
+            self.colon = len(self.text)
+        elif kind == 'semicolon' and self.semicolon is None:
+            self.semicolon = len(self.text)
+        self.text += token
+
+    @property
+    def activates(self) -> bool:
+        return self.colon is not None or self.semicolon is not None
+
+
+def tokenize(text: str) -> Iterable[Tuple[str, str, Optional[str]]]:
+    # (kind, token, label number)
+    for match in _TOKEN.finditer(text):
+        yield match.lastgroup, match.group(), match.group('number')
+
+
+def _sentences(text: str) -> List[Tuple[Optional[int], _Sentence]]:
+    # Sentences with the effect label they open (None for the ones that don't open a labeled effect)
+    sentences = []
+    label, sentence = None, _Sentence()
+
+    def flush():
+        nonlocal label, sentence
+        if sentence.text.strip():
+            sentences.append((label, sentence))
+            label = None
+        sentence = _Sentence()
+
+    for kind, token, number in tokenize(text):
+        if kind == 'label':
+            flush()
+            label = int(number)
+        elif kind == 'period' or (kind == 'paren' and token.endswith('.)')):
+            # A parenthetical sentence, "(This card is always treated as ...)", ends with its own period
+            sentence.add(token, kind)
+            flush()
+        elif kind == 'newline':
+            sentence.open_ended = True
+            flush()
+        else:
+            sentence.add(token, kind)
+    flush()
+    return sentences
+
+
+def _build_effect(number: Optional[int], sentences: List[_Sentence], first_line: bool = False) -> CardEffect:
+    first = sentences[0]
+    rest = ' '.join(sentence.text.strip() for sentence in sentences[1:])
+    condition = cost = ''
+    if first.colon is not None:
+        condition = first.text[:first.colon].strip()
+    if first.semicolon is not None:
+        cost = first.text[(first.colon + 1 if first.colon is not None else 0):first.semicolon].strip()
+        resolution = first.text[first.semicolon + 1:]
+    elif first.colon is not None:
+        resolution = first.text[first.colon + 1:]
+    else:
+        resolution = first.text
+    # A bullet that is an effect of its own ("You can only use each of the following effects ... ● If ...")
+    condition = condition.lstrip(_BULLET_CHARS)
+    cost = cost.lstrip(_BULLET_CHARS)
+    resolution = (resolution.strip().lstrip(_BULLET_CHARS) + ' ' + rest).strip()
+    text = ' '.join(sentence.text.strip() for sentence in sentences).lstrip(_BULLET_CHARS)
+
+    # Targets are declared at activation, so only the part before the resolution counts. A modal effect
+    # ("Activate 1 of these effects. ● Target 1 monster; destroy it.") activates through its bullets
+    bullets = [sentence for sentence in sentences[1:] if sentence.text.strip().startswith(_BULLETS)]
+    activates = (first.activates or any(bullet.activates for bullet in bullets)
+                 or (number is not None and bool(_OPTIONAL_ACTIVATION.match(first.text.strip().lower()))))
+    activation = f'{condition} {cost}'.lower() + ''.join(
+        ' ' + bullet.text[:bullet.semicolon].lower() for bullet in bullets if bullet.semicolon is not None)
+    lowered_resolution = resolution.lower()
+    if first_line and number is None and first.open_ended and not first.activates and len(sentences) == 1:
+        effect_type = 'Materials'
+    elif not activates:
+        effect_type = 'Continuous'
+    elif '(quick effect)' in activation or _OPPONENTS_TURN.search(activation):
+        effect_type = 'Quick'
+    elif _TRIGGER.search(condition.lower()):
+        effect_type = 'Trigger'
+    else:
+        effect_type = 'Ignition'
+    usage_limit = _USAGE_LIMIT.search(activation if activates else text.lower())
+
+    return CardEffect(
+        number=number,
+        text=text,
+        effect_type=effect_type,
+        condition=condition,
+        cost=cost,
+        resolution=resolution,
+        conjunctions=list(dict.fromkeys(_CONJUNCTION.findall(lowered_resolution))),
+        targeting=bool(_TARGET.search(activation)),
+        usage_limit=f'once per {usage_limit.group(1)}' if usage_limit else None,
+    )
+
+
+def _apply_restriction(sentence: str, effects: List[CardEffect], previous: Optional[int]):
+    lowered = sentence.lower()
+    numbers = {int(number) for number in _RESTRICTED_NUMBERS.findall(sentence)}
+    if numbers:
+        restricted = [effect for effect in effects if effect.number in numbers]
+    elif _FOLLOWING.search(lowered):
+        # "You can only use each of the following effects of "X" once per turn": the effects after it
+        restricted = effects[previous + 1 if previous is not None else 0:]
+    elif 'each effect' in lowered:
+        restricted = effects
+    elif lowered.startswith('you can only activate'):
+        # "You can only activate 1 "X" per turn": every activation of the card counts, or the card itself
+        # when its text has no activated effect (a Normal Spell/Trap)
+        restricted = [effect for effect in effects if effect.effect_type not in ('Continuous', 'Materials')] or effects
+    else:
+        # "You can only use this effect of "X" once per turn": the effect just before it
+        restricted = [effects[previous]] if previous is not None else []
+    for effect in restricted:
+        effect.hard_once_per_turn = True
+
+
+def parse_effects(card_text: str) -> List[CardEffect]:
+    groups: List[Tuple[Optional[int], List[_Sentence]]] = []
+    restrictions: List[Tuple[str, Optional[int]]] = []
+    # Bullets after "the following effects" are effects of their own, not the list of the effect before
+    bullets_are_effects = False
+    for label, sentence in _sentences(card_text):
+        stripped = sentence.text.strip()
+        if _RESTRICTION.match(stripped.lower()):
+            restrictions.append((stripped, len(groups) - 1 if groups else None))
+            bullets_are_effects = bool(_FOLLOWING.search(stripped.lower()))
+            continue
+        is_bullet = stripped.startswith(_BULLETS)
+        if label is not None or not groups or (is_bullet and bullets_are_effects):
+            groups.append((label, [sentence]))
+        elif is_bullet:
+            # A ● list spells out the effect that introduces it ("... includes any of these effects"), so
+            # the bullets are part of that effect and a following "this effect" restriction points at it
+            groups[-1][1].append(sentence)
+        elif groups[-1][0] is not None:
+            # Everything up to the next label belongs to the labeled effect
+            groups[-1][1].append(sentence)
+        elif stripped.startswith('(') and not sentence.activates:
+            # Reminder text belongs to the effect it explains
+            groups[-1][1].append(sentence)
+        elif groups[-1][1][0].activates and not sentence.activates and _CONTINUATION.match(stripped.lower()):
+            groups[-1][1].append(sentence)
+        else:
+            groups.append((None, [sentence]))
+
+    effects = [_build_effect(number, sentences, i == 0) for i, (number, sentences) in enumerate(groups)]
+    for sentence, previous in restrictions:
+        _apply_restriction(sentence, effects, previous)
+    return effects
+
+
+def parse_card_texts(card_texts: Iterable[str]) -> List[List[CardEffect]]:
+    # Whole-pool parse; identical texts (reprints, shared locales) are parsed once
+    parsed: Dict[str, List[CardEffect]] = {}
+    results = []
+    for card_text in card_texts:
+        card_text = card_text or ''
+        if card_text not in parsed:
+            parsed[card_text] = parse_effects(card_text)
+        results.append(parsed[card_text])
+    return results
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import os
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import span
+
+# Cross-encoder reranking shared by every connected client.
+# Pairs from concurrent inquiries are queued and scored together: a batch is sent to the model as
+# soon as it reaches max_batch_size pairs or max_wait_ms after its first pair arrived, whichever
+# comes first. Inference runs on a dedicated single-thread executor so the event loop stays free,
+# and scores are kept in an LRU cache keyed by a hash of (question, ruling text).
+
+RERANK_MAX_BATCH = int(os.getenv("RERANK_MAX_BATCH", "64"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+def pair_key(question: str, text: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(question.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+_services: 'weakref.WeakSet[RerankerService]' = weakref.WeakSet()
+
+class RerankerService:
+    def __init__(self, model_loader: Callable[[], Any], max_batch_size: int = RERANK_MAX_BATCH,
+                 max_wait_ms: float = RERANK_MAX_WAIT_MS, cache_size: int = RERANK_CACHE_SIZE):
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reranker')
+        self._cache: 'OrderedDict[str, float]' = OrderedDict()
+        self._pending: List[Tuple[str, Tuple[str, str]]] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        _services.add(self)
+
+    def _reset_after_fork(self):
+        # A forked server worker (prefork.py) keeps the model and the score cache but gets its own
+        # executor; batches in flight in the parent belong to the parent's event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reranker')
+        self._pending = []
+        self._inflight = {}
+        self._flush_handle = None
+
+    async def score(self, question: str, texts: List[str]) -> List[float]:
+        loop = asyncio.get_running_loop()
+        scores: List[Optional[float]] = [None] * len(texts)
+        waiting = []
+
+        for i, text in enumerate(texts):
+            key = pair_key(question, text)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                scores[i] = self._cache[key]
+                self.hits += 1
+                continue
+
+            self.misses += 1
+            future = self._inflight.get(key)
+            if future is None:
+                # Identical pairs already queued by another inquiry share one future
+                future = self._inflight[key] = loop.create_future()
+                self._pending.append((key, (question, text)))
+            waiting.append((i, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        for i, future in waiting:
+            scores[i] = await future
+        return scores
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, Tuple[str, str]]]):
+        loop = asyncio.get_running_loop()
+        pairs = [pair for _, pair in batch]
+        self.batches += 1
+        try:
+            scores = await loop.run_in_executor(self._executor, self._predict, pairs)
+        except Exception as e:
+            for key, _ in batch:
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for (key, _), score in zip(batch, scores):
+            self._remember(key, float(score))
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(float(score))
+
+    def _predict(self, pairs: List[Tuple[str, str]]):
+        # A batch can hold pairs of several inquiries, so it is timed for the histogram only
+        with span('rerank.inference', traced=False):
+            return self.model_loader().predict(pairs, batch_size=len(pairs))
+
+    def _remember(self, key: str, score: float):
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'batches': self.batches,
+            'cached_pairs': len(self._cache),
+        }
+
+def _reset_services_after_fork():
+    for service in list(_services):
+        service._reset_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_services_after_fork)
@@ -0,0 +1,367 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bm25_index import FINGERPRINT_CHECK_INTERVAL, BM25Index, default_index_dir
+from dense_index import EMBEDDING_MODEL, embed_texts
+
+# Local retrieval over the rulebook for the agent's search_rulebook action.
+# An offline job (`python rulebook_index.py [db_path] [--source rulebook.pdf] [--psct]`) splits the
+# rulebook, and optionally the PSCT articles listed in card_mechanics.PSCT_ARTICLES, into sections of
+# at most MAX_SECTION_WORDS words under their nearest heading, and writes next to the other indexes:
+# the sections as JSON, a BM25 index over them and their embeddings as a float16 .npy (same
+# bi-encoder as dense_index.py) that is memory-mapped at query time. A question is answered with the
+# reciprocal-rank fusion of the BM25 and the dense top lists: a lookup of a few milliseconds, with no
+# PDF parsing, vectorizer fitting or LLM call on the inquiry path.
+
+INDEX_FORMAT_VERSION = 1
+RULEBOOK_TOP_K = int(os.getenv("RULEBOOK_TOP_K", "3"))
+# Each ranked list contributes this many sections to the fusion
+RULEBOOK_CANDIDATES = 20
+RRF_K = 60
+MAX_SECTION_WORDS = 200
+# A section with less text than this runs on through the next heading instead of ending there
+MIN_SECTION_WORDS = 25
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+def index_paths(db_path: str) -> Dict[str, str]:
+    index_dir = default_index_dir(db_path)
+    return {
+        'sections': os.path.join(index_dir, 'rulebook_sections.json'),
+        'bm25': os.path.join(index_dir, 'rulebook_bm25.npz'),
+        'vectors': os.path.join(index_dir, 'rulebook_embeddings.f16.npy'),
+    }
+
+
+# Ingestion: every source becomes (page, kind, text) blocks, kind being 'heading' or 'text'
+
+Block = Tuple[Optional[int], str, str]
+
+def _is_heading(line: str) -> bool:
+    # Rulebook headings are short capitalized lines without closing punctuation ("Chain Links", "SUMMONING")
+    words = line.split()
+    if not 0 < len(words) <= 8 or len(line) > 60 or not line[0].isupper() or line[-1] in '.,;:!?)"':
+        return False
+    capitalized = sum(1 for word in words if word[0].isupper() or not word[0].isalpha())
+    return capitalized * 2 >= len(words)
+
+def text_blocks(text: str, page: Optional[int] = None) -> List[Block]:
+    # Wrapped lines are joined into paragraphs (hyphenated line breaks undone); page numbers are dropped
+    blocks = []
+    paragraph = ''
+    for line in (line.strip() for line in text.splitlines()):
+        if not line or line.isdigit():
+            if paragraph:
+                blocks.append((page, 'text', paragraph))
+                paragraph = ''
+            continue
+        if not paragraph and (line.startswith('#') or _is_heading(line)):
+            blocks.append((page, 'heading', line.lstrip('#').strip()))
+            continue
+        if paragraph.endswith('-') and line[0].islower():
+            paragraph = paragraph[:-1] + line
+        else:
+            paragraph = f"{paragraph} {line}" if paragraph else line
+        if paragraph[-1] in '.!?':
+            blocks.append((page, 'text', paragraph))
+            paragraph = ''
+    if paragraph:
+        blocks.append((page, 'text', paragraph))
+    return blocks
+
+def pdf_blocks(path: str) -> List[Block]:
+    # PyPDF2 (requirements.txt): PdfReader/extract_text in 2.x and later, PdfFileReader/extractText in 1.x
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path) if hasattr(PyPDF2, 'PdfReader') else PyPDF2.PdfFileReader(path)
+    blocks = []
+    for page_number, page in enumerate(reader.pages, 1):
+        text = page.extract_text() if hasattr(page, 'extract_text') else page.extractText()
+        blocks.extend(text_blocks(text or '', page_number))
+    return blocks
+
+class _ArticleParser(HTMLParser):
+    # Headings, paragraphs and list items of a blog article; navigation, scripts and sidebars are skipped
+    BLOCK_TAGS = {'p', 'li', 'blockquote', 'h1', 'h2', 'h3', 'h4'}
+    SKIP_TAGS = {'script', 'style', 'nav', 'header', 'footer', 'aside', 'form', 'noscript'}
+
+    def __init__(self):
+        super().__init__()
+        self.title = ''
+        self.blocks: List[Block] = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._block_tag: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in self.BLOCK_TAGS and not self._skip_depth:
+            self._flush()
+            self._block_tag = tag
+        elif tag == 'br':
+            self._text.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'title':
+            self._in_title = False
+        elif tag == self._block_tag:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._block_tag and not self._skip_depth:
+            self._text.append(data)
+
+    def _flush(self):
+        text = ' '.join(''.join(self._text).split())
+        if self._block_tag and text:
+            self.blocks.append((None, 'heading' if self._block_tag[0] == 'h' else 'text', text))
+        self._block_tag = None
+        self._text = []
+
+def html_blocks(html: str) -> Tuple[str, List[Block]]:
+    parser = _ArticleParser()
+    parser.feed(html)
+    parser.close()
+    parser._flush()
+    return ' '.join(parser.title.split()), parser.blocks
+
+def fetch_article(url: str, timeout: float = 30.0) -> str:
+    import urllib.request
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0 (rulebook_index.py)'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode(response.headers.get_content_charset() or 'utf-8', errors='replace')
+
+def split_sections(blocks: Iterable[Block], source: str, document: str,
+                   max_words: int = MAX_SECTION_WORDS, min_words: int = MIN_SECTION_WORDS) -> List[Dict[str, Any]]:
+    # One section per heading; long ones are cut at paragraph boundaries, and paragraphs longer
+    # than max_words on their own are cut every max_words words
+    sections = []
+    title = document
+    page = None
+    words: List[str] = []
+
+    def flush():
+        if words:
+            sections.append({'source': source, 'document': document, 'title': title, 'page': page, 'text': ' '.join(words)})
+            words.clear()
+
+    for block_page, kind, text in blocks:
+        if kind == 'heading':
+            if words and len(words) < min_words:
+                # Too short to stand alone: the next heading and its text continue this section
+                words.extend(text.split())
+                continue
+            flush()
+            title = text
+            page = block_page
+            continue
+        block_words = text.split()
+        if words and len(words) + len(block_words) > max_words:
+            flush()
+        if not words:
+            page = block_page
+        for start in range(0, len(block_words), max_words):
+            words.extend(block_words[start:start + max_words])
+            if len(words) >= max_words:
+                flush()
+                page = block_page
+    flush()
+    return sections
+
+def load_source(path: str) -> List[Dict[str, Any]]:
+    document = os.path.splitext(os.path.basename(path))[0].replace('_', ' ').title()
+    if path.lower().endswith('.pdf'):
+        return split_sections(pdf_blocks(path), os.path.basename(path), document)
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if path.lower().endswith(('.html', '.htm')):
+        title, blocks = html_blocks(content)
+        return split_sections(blocks, os.path.basename(path), title or document)
+    return split_sections(text_blocks(content), os.path.basename(path), document)
+
+
+class RulebookIndex:
+    def __init__(self, sections: List[Dict[str, Any]], bm25: BM25Index, vectors: Optional[np.ndarray], meta: Dict[str, Any]):
+        self.sections = sections
+        self.bm25 = bm25
+        self.vectors = vectors  # (n, dim) float16, memory-mapped; None for a BM25-only index
+        self.meta = meta
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional['RulebookIndex']:
+        paths = index_paths(db_path)
+        if not os.path.exists(paths['sections']):
+            return None
+        with open(paths['sections'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        meta = data.get('meta', {})
+        bm25 = BM25Index.load(paths['bm25'])
+        if meta.get('version') != INDEX_FORMAT_VERSION or bm25 is None:
+            return None
+        vectors = None
+        if meta.get('dim') and os.path.exists(paths['vectors']):
+            vectors = np.load(paths['vectors'], mmap_mode='r')
+        return cls(data['sections'], bm25, vectors, meta)
+
+    def search(self, query: str, k: int = RULEBOOK_TOP_K) -> List[Dict[str, Any]]:
+        ranked_lists = []
+        scores = self.bm25.get_scores(tokenize(query))
+        top = np.argsort(scores)[::-1][:RULEBOOK_CANDIDATES]
+        ranked_lists.append([int(i) for i in top if scores[i] > 0])
+        if self.vectors is not None and len(self.sections):
+            similarities = np.asarray(self.vectors, dtype=np.float32) @ embed_texts([query])[0]
+            ranked_lists.append([int(i) for i in np.argsort(similarities)[::-1][:RULEBOOK_CANDIDATES]])
+
+        # Reciprocal-rank fusion, as for the ruling candidates in search.fuse_rulings
+        fused: Dict[int, float] = {}
+        for ranked in ranked_lists:
+            for rank, i in enumerate(ranked, 1):
+                fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank)
+        return [self.sections[i] for i in sorted(fused, key=lambda i: fused[i], reverse=True)[:k]]
+
+
+_rulebook_indexes: Dict[str, Optional[RulebookIndex]] = {}
+# When the sections file was last checked, and its mtime when the cached index was loaded
+_rulebook_index_checked: Dict[str, float] = {}
+_rulebook_index_mtimes: Dict[str, Optional[float]] = {}
+_rulebook_index_lock = threading.Lock()
+
+def _sections_mtime(db_path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(index_paths(db_path)['sections'])
+    except OSError:
+        return None
+
+def get_rulebook_index(db_path: str = 'yugioh.db') -> Optional[RulebookIndex]:
+    # Like get_dense_index, re-checked every FINGERPRINT_CHECK_INTERVAL: an index built (or rebuilt)
+    # while the server runs is picked up without a restart
+    if db_path in _rulebook_indexes and time.monotonic() - _rulebook_index_checked.get(db_path, 0.0) < FINGERPRINT_CHECK_INTERVAL:
+        return _rulebook_indexes[db_path]
+
+    with _rulebook_index_lock:
+        if db_path in _rulebook_indexes and time.monotonic() - _rulebook_index_checked.get(db_path, 0.0) < FINGERPRINT_CHECK_INTERVAL:
+            return _rulebook_indexes[db_path]
+        mtime = _sections_mtime(db_path)
+        if db_path not in _rulebook_indexes or _rulebook_index_mtimes.get(db_path) != mtime:
+            was_usable = _rulebook_indexes.get(db_path) is not None or db_path not in _rulebook_indexes
+            index = RulebookIndex.load(db_path)
+            if index is None and was_usable:
+                logger.warning("No rulebook index, run `python rulebook_index.py` to build it")
+            _rulebook_indexes[db_path] = index
+            _rulebook_index_mtimes[db_path] = mtime
+        _rulebook_index_checked[db_path] = time.monotonic()
+    return _rulebook_indexes[db_path]
+
+def format_section(section: Dict[str, Any]) -> str:
+    location = section['document'] + (f", page {section['page']}" if section.get('page') else '')
+    heading = f" - {section['title']}" if section['title'] != section['document'] else ''
+    return f"[{location}{heading}]\n{section['text']}"
+
+def search_rulebook(query: str, db_path: str = 'yugioh.db', k: int = RULEBOOK_TOP_K) -> str:
+    index = get_rulebook_index(db_path)
+    sections = index.search(query, k) if index is not None else []
+    if not sections:
+        return "no relevant context found"
+    return "Relevant information from the Yu-Gi-Oh! rulebook:\n\n" + "\n\n".join(format_section(section) for section in sections)
+
+
+# Offline build
+
+def build_rulebook_index(db_path: str = 'yugioh.db', sources: Optional[List[str]] = None, psct: bool = False,
+                         embeddings: bool = True, verbose: bool = True):
+    start = time.perf_counter()
+    sections = []
+    built_from = []
+    for path in sources if sources is not None else ['rulebook.pdf']:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found")
+            continue
+        source_sections = load_source(path)
+        with open(path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        built_from.append({'source': os.path.basename(path), 'hash': digest, 'sections': len(source_sections)})
+        sections.extend(source_sections)
+        if verbose:
+            print(f"{path}: {len(source_sections)} sections")
+
+    if psct:
+        from card_mechanics import PSCT_ARTICLES
+        for url in PSCT_ARTICLES:
+            try:
+                html = fetch_article(url)
+            except OSError as e:
+                print(f"Skipping {url}: {e}")
+                continue
+            title, blocks = html_blocks(html)
+            article_sections = split_sections(blocks, url, title or url)
+            built_from.append({'source': url, 'hash': hashlib.blake2b(html.encode('utf-8'), digest_size=8).hexdigest(),
+                               'sections': len(article_sections)})
+            sections.extend(article_sections)
+            if verbose:
+                print(f"{url}: {len(article_sections)} sections")
+
+    if not sections:
+        print("Nothing to index")
+        return
+
+    paths = index_paths(db_path)
+    os.makedirs(os.path.dirname(paths['sections']), exist_ok=True)
+    documents = [f"{section['title']} {section['text']}" for section in sections]
+    BM25Index.build([tokenize(document) for document in documents]).save(paths['bm25'])
+
+    meta = {'version': INDEX_FORMAT_VERSION, 'count': len(sections), 'sources': built_from, 'model': None, 'dim': 0}
+    if embeddings:
+        vectors = embed_texts(documents).astype(np.float16)
+        np.save(paths['vectors'] + '.tmp.npy', vectors)
+        os.replace(paths['vectors'] + '.tmp.npy', paths['vectors'])
+        meta.update(model=EMBEDDING_MODEL, dim=int(vectors.shape[1]))
+    elif os.path.exists(paths['vectors']):
+        os.remove(paths['vectors'])
+
+    # The sections file goes last: load() only picks up an index once it is complete
+    with open(paths['sections'] + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'sections': sections}, f)
+    os.replace(paths['sections'] + '.tmp', paths['sections'])
+    _rulebook_indexes.pop(db_path, None)
+    print(f"Rulebook index written: {len(sections)} sections from {len(built_from)} sources, "
+          f"{'dim ' + str(meta['dim']) + ' embeddings' if meta['dim'] else 'BM25 only'} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split the rulebook into sections and build its BM25 and dense indexes")
+    parser.add_argument('db_path', nargs='?', default='yugioh.db', help="the indexes go next to this database")
+    parser.add_argument('--source', action='append', dest='sources',
+                        help="rulebook file to index (.pdf, .html or plain text); repeatable, default rulebook.pdf")
+    parser.add_argument('--psct', action='store_true', help="also fetch and index the PSCT articles in card_mechanics.PSCT_ARTICLES")
+    parser.add_argument('--no-embeddings', action='store_true', help="BM25 only, without loading the embedding model")
+    parser.add_argument('--query', help="search the built index and print the result")
+    args = parser.parse_args()
+    if args.query:
+        start = time.perf_counter()
+        print(search_rulebook(args.query, args.db_path))
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    else:
+        build_rulebook_index(args.db_path, args.sources, args.psct, not args.no_embeddings)
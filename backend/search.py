@@ -1,27 +1,42 @@
 import sqlite3
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel, Field, field_validator
-from rank_bm25 import BM25Okapi
 import os
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import math
-import instructor
 from enum import Enum
+from difflib import SequenceMatcher
 import numpy as np
-from sentence_transformers import CrossEncoder
-import torch
-from card_mechanics import analyze_card_mechanics, CardMechanic
+import threading
+from card_mechanics import MECHANIC_FIELDS, analyze_card_mechanics, mechanic_from_row, CardMechanic
+from bm25_index import BM25Index, get_card_index
+from db import get_connection, run_in_db
+from metrics import span
+from reranker import RerankerService
+from dense_index import DENSE_TOP_K, RULING_SOURCES, embed_texts, get_dense_index
+from locale_text import is_cjk, name_ngrams, normalize_name
 
 # Load environment variables
 load_dotenv()
 
-# Set up OpenAI API client with instructor
-client = instructor.patch(AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+# The cross-encoder (and torch with it) loads on first use or in the server's warm-up, not at import
+CROSS_ENCODER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
 
-# Load the cross-encoder model (do this outside the function for efficiency)
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+def get_cross_encoder():
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _cross_encoder_lock:
+            if _cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+                _cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL)
+    return _cross_encoder
+
+# Batched, cached scoring shared by all inquiries
+reranker = RerankerService(get_cross_encoder)
 
 class Card(BaseModel):
     name: str
@@ -58,88 +73,285 @@ class RankingResult(BaseModel):
         return v
 
 # Cards Search 
-def search_card_by_name(card_name: str, db_path: str = 'yugioh.db') -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+CARD_COLUMNS = ['name', 'humanReadableCardType', 'desc', 'race', 'atk', 'def', 'attribute', 'card_images', 'level']
+FUZZY_MIN_RATIO = 0.75
+FUZZY_MAX_RESULTS = 3  # only fall back to fuzzy matching when fewer substring hits than this (and no prefix hit)
+FUZZY_MAX_TRIGRAMS = 8  # query trigrams in the fuzzy OR query, spread over the query
+FUZZY_MAX_CANDIDATES = 20  # trigram candidates re-ranked by string similarity
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+def _has_card_name_index(cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'card_names_fts'")
+    return cursor.fetchone() is not None
+
+def _has_name_keys(cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'card_name_grams'")
+    return cursor.fetchone() is not None
+
+def _key_range(key: str) -> Tuple[str, str]:
+    # Bounds of every key starting with `key` in binary collation, for a range scan on the key index
+    return key, key + '\U0010ffff'
+
+def _fuzzy_score(query: str, name: str) -> float:
+    # Best similarity between the query and the whole name or any word-aligned window of it
+    best = SequenceMatcher(None, query, name).ratio()
+    for i in range(len(name)):
+        if i == 0 or name[i - 1] == ' ':
+            best = max(best, SequenceMatcher(None, query, name[i:i + len(query)]).ratio())
+    return best
+
+def match_card_names(cursor, query: str, locale: Optional[str] = None, limit: int = 10) -> List[tuple]:
+    # Returns (en_name, matched_name, locale) ranked exact > prefix > substring > fuzzy
+    locale_clause = "AND locale = ?" if locale else ""
+    locale_params = [locale] if locale else []
+    lowered = query.lower()
+
+    # Exact and prefix matches: a range scan on the NOCASE name index
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    cursor.execute(f"""
+    SELECT en_name, name, locale FROM card_names
+    WHERE name LIKE ? ESCAPE '\\' {locale_clause}
+    LIMIT ?
+    """, [escaped + '%'] + locale_params + [limit * 3])
+    matches = sorted(cursor.fetchall(), key=lambda row: (row[1].lower() != lowered, len(row[1])))
+
+    key = normalize_name(query)
+    has_name_keys = key and _has_name_keys(cursor)
+    if has_name_keys and len(matches) < limit:
+        # Normalized prefix matches: full-width, accent-free, punctuation-free or kana (ja reading) queries
+        low, high = _key_range(key)
+        cursor.execute(f"""
+        SELECT en_name, name, locale, key FROM card_name_keys
+        WHERE key >= ? AND key < ? {locale_clause}
+        LIMIT ?
+        """, [low, high] + locale_params + [limit * 3])
+        matches += [row[:3] for row in sorted(cursor.fetchall(), key=lambda row: (row[3] != key, len(row[3]), row[2] != 'en'))]
+    # The query is (the start of) a real name: no typo to tolerate, and the fuzzy stage is the slow one
+    has_prefix_match = bool(matches)
+
+    if has_name_keys and is_cjk(key) and len(matches) < limit:
+        # CJK substring matches (works for 1-2 characters too): scan the postings of the query's rarest n-gram
+        if len(key) == 1:
+            gram_clause, gram_params = "gram >= ? AND gram < ?", list(_key_range(key))
+        else:
+            grams = sorted(set(name_ngrams(key)[:-1] if len(key) > 2 else [key]))
+            cursor.execute(f"""
+            SELECT gram, COUNT(*) FROM card_name_grams
+            WHERE gram IN ({', '.join('?' for _ in grams)})
+            GROUP BY gram
+            """, grams)
+            counts = dict(cursor.fetchall())
+            rarest = min(grams, key=lambda gram: counts.get(gram, 0))
+            gram_clause, gram_params = "gram = ?", [rarest]
+        cursor.execute(f"""
+        SELECT en_name, name, locale, key FROM card_name_keys
+        WHERE rowid IN (SELECT key_id FROM card_name_grams WHERE {gram_clause}) {locale_clause}
+        """, gram_params + locale_params)
+        substring_rows = [row for row in cursor.fetchall() if key in row[3]]
+        matches += [row[:3] for row in sorted(substring_rows, key=lambda row: (row[3].find(key), len(row[3])))[:limit * 3]]
+    elif len(query) >= 3 and len(matches) < limit:
+        # Substring matches: a trigram phrase query; earliest and shortest match first
+        cursor.execute(f"""
+        SELECT en_name, card_names.name, locale FROM card_names_fts
+        JOIN card_names ON card_names.rowid = card_names_fts.rowid
+        WHERE card_names_fts MATCH ? {locale_clause}
+        LIMIT ?
+        """, [_fts_phrase(query)] + locale_params + [limit * 3])
+        matches += sorted(cursor.fetchall(), key=lambda row: (row[1].lower().find(lowered), len(row[1])))
+
+    if not has_prefix_match and len({en_name for en_name, _, _ in matches}) < FUZZY_MAX_RESULTS and len(query) >= 4:
+        # Typo tolerance: any shared trigram makes a candidate, best string similarity first. A long query
+        # only contributes FUZZY_MAX_TRIGRAMS of its trigrams, so FTS ranks fewer postings
+        trigrams = list(dict.fromkeys(query[i:i + 3] for i in range(len(query) - 2)))
+        if len(trigrams) > FUZZY_MAX_TRIGRAMS:
+            step = (len(trigrams) - 1) / (FUZZY_MAX_TRIGRAMS - 1)
+            trigrams = [trigrams[round(i * step)] for i in range(FUZZY_MAX_TRIGRAMS)]
+        cursor.execute(f"""
+        SELECT en_name, card_names.name, locale FROM card_names_fts
+        JOIN card_names ON card_names.rowid = card_names_fts.rowid
+        WHERE card_names_fts MATCH ? {locale_clause}
+        ORDER BY rank
+        LIMIT ?
+        """, [' OR '.join(_fts_phrase(trigram) for trigram in trigrams)] + locale_params + [FUZZY_MAX_CANDIDATES])
+        fuzzy = [(_fuzzy_score(lowered, row[1].lower()), row) for row in cursor.fetchall()]
+        matches += [row for score, row in sorted(fuzzy, key=lambda x: x[0], reverse=True) if score >= FUZZY_MIN_RATIO]
+
+    ranked = []
+    seen = set()
+    for en_name, name, match_locale in matches:
+        if en_name not in seen:
+            seen.add(en_name)
+            ranked.append((en_name, name, match_locale))
+    return ranked[:limit]
+
+def resolve_card(cursor, name: str, locale: Optional[str] = None) -> Optional[Tuple[Optional[int], str]]:
+    # (card id, English name) for a name or kana reading in any locale; one lookup on the key index
+    key = normalize_name(name)
+    if not key or not _has_name_keys(cursor):
+        return None
+    cursor.execute("SELECT card_id, en_name FROM card_name_keys WHERE key = ? ORDER BY locale != ?, kind != 'name' LIMIT 1",
+                   (key, locale or 'en'))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else None
+
+def resolve_card_names(cursor, card_names: List[str], locale: Optional[str] = None) -> List[str]:
+    # Names of the `cards` table are kept as they are; anything else is mapped to its English name if it resolves
+    placeholders = ', '.join('?' for _ in card_names)
+    cursor.execute(f"SELECT name FROM cards WHERE name IN ({placeholders})", card_names)
+    known = {row[0] for row in cursor.fetchall()}
+    resolved = []
+    for name in card_names:
+        match = None if name in known else resolve_card(cursor, name, locale)
+        resolved.append(match[1] if match else name)
+    return resolved
+
+def search_card_by_name(card_name: str, db_path: str = 'yugioh.db', locale: Optional[str] = None) -> List[Dict[str, Any]]:
+    conn = get_connection(db_path)
     cursor = conn.cursor()
-    
-    query = """
-    SELECT name, humanReadableCardType, desc, race, atk, def, attribute, card_images, level
-    FROM cards
-    WHERE name LIKE ?
-    LIMIT 10
-    """
-    
-    cursor.execute(query, (f"%{card_name}%",))
-    results = cursor.fetchall()
-    
-    columns = ['name', 'humanReadableCardType', 'desc', 'race', 'atk', 'def', 'attribute', 'card_images', 'level']
+    card_name = card_name.strip()
+
+    if not card_name:
+        return []
+
+    if _has_card_name_index(cursor):
+        matches = match_card_names(cursor, card_name, locale)
+        placeholders = ', '.join('?' for _ in matches)
+        cursor.execute(f"""
+        SELECT {', '.join(CARD_COLUMNS)}
+        FROM cards
+        WHERE name IN ({placeholders})
+        """, [en_name for en_name, _, _ in matches])
+        rows_by_name = {row[0]: row for row in cursor.fetchall()}
+        results = []
+        for en_name, matched_name, match_locale in matches:
+            if en_name in rows_by_name:
+                results.append((rows_by_name[en_name], matched_name, match_locale))
+    else:
+        query = """
+        SELECT name, humanReadableCardType, desc, race, atk, def, attribute, card_images, level
+        FROM cards
+        WHERE name LIKE ?
+        LIMIT 10
+        """
+        cursor.execute(query, (f"%{card_name}%",))
+        results = [(row, row[0], 'en') for row in cursor.fetchall()]
+
     cards = []
     
-    for result in results:
-        card_properties = dict(zip(columns, result))
+    for result, matched_name, match_locale in results:
+        card_properties = dict(zip(CARD_COLUMNS, result))
         card_properties['card_images'] = json.loads(card_properties['card_images'])
+        if match_locale != 'en' and matched_name != card_properties['name']:
+            card_properties['locale'] = match_locale
+            card_properties['localizedName'] = matched_name
         cards.append(card_properties)
     
-    conn.close()
     return cards
 
-def get_exact_rulings(card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+def get_cards_by_names(card_names: List[str], db_path: str = 'yugioh.db') -> List[Dict[str, Any]]:
+    # Full rows for exact `cards` names, in the order given
+    cursor = get_connection(db_path).cursor()
+    cursor.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE name IN ({', '.join('?' for _ in card_names)})", card_names)
+    rows_by_name = {row[0]: dict(zip(CARD_COLUMNS, row)) for row in cursor.fetchall()}
+    cards = []
+    for name in card_names:
+        if name in rows_by_name:
+            card_properties = rows_by_name[name]
+            card_properties['card_images'] = json.loads(card_properties['card_images'])
+            cards.append(card_properties)
+    return cards
+
+# Rulings Search
+RERANK_CANDIDATE_BUDGET = int(os.getenv("RERANK_CANDIDATE_BUDGET", "30"))  # max pairs sent to the cross-encoder
+RRF_K = 60
+QA_COLUMNS = "qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor"
+FAQ_COLUMNS = "cardId, locale, effect, sourceHash, content, name"
+
+def _qa_ruling(result) -> Dict[str, Any]:
+    return {
+        'source': 'qa_tl_fixed',
+        'qaId': result[0],
+        'locale': result[1],
+        'title': result[2],
+        'question': result[3],
+        'answer': result[4],
+        'date': result[5],
+        'sourceHash': result[6],
+        'translator': result[7],
+        'lastEditor': result[8]
+    }
+
+def _faq_ruling(result) -> Dict[str, Any]:
+    return {
+        'source': 'faq_tl_entries_fixed',
+        'cardId': result[0],
+        'locale': result[1],
+        'effect': result[2],
+        'sourceHash': result[3],
+        'content': result[4],
+        'name': result[5]
+    }
+
+def get_exact_rulings(card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False,
+                      locale: Optional[str] = None) -> List[Dict[str, Any]]:
+    # With a locale, only rulings in that locale are returned, unless there are none for these cards
+    conn = get_connection(db_path)
     cursor = conn.cursor()
     
     rulings = []
+    card_names = list(dict.fromkeys(resolve_card_names(cursor, card_names, locale)))
+    placeholders = ', '.join('?' for _ in card_names)
+    locale_params = [locale] if locale else []
     
     # Check qa_tl_fixed table
-    for card_name in card_names:
-        query = """
-        SELECT qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor
-        FROM qa_tl_fixed
-        WHERE question LIKE ?
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'qa_card_mentions'")
+    if cursor.fetchone():
+        # One indexed lookup through the card -> QA mapping built by fix_rulings.py
+        query = f"""
+        SELECT DISTINCT q.qaId, q.locale, q.title, q.question, q.answer, q.date, q.sourceHash, q.translator, q.lastEditor
+        FROM qa_card_mentions m
+        JOIN qa_tl_fixed q ON q.qaId = m.qaId AND q.locale = m.locale
+        WHERE m.name IN ({placeholders}) {"AND m.locale = ?" if locale else ""}
         """
-        cursor.execute(query, (f"%{card_name}%",))
-        results = cursor.fetchall()
-        for result in results:
-            rulings.append({
-                'source': 'qa_tl_fixed',
-                'qaId': result[0],
-                'locale': result[1],
-                'title': result[2],
-                'question': result[3],
-                'answer': result[4],
-                'date': result[5],
-                'sourceHash': result[6],
-                'translator': result[7],
-                'lastEditor': result[8]
-            })
+        cursor.execute(query, card_names + locale_params)
+        qa_results = cursor.fetchall()
+    else:
+        # Older databases without the mapping table
+        qa_results = []
+        for card_name in card_names:
+            query = f"""
+            SELECT qaId, locale, title, question, answer, date, sourceHash, translator, lastEditor
+            FROM qa_tl_fixed
+            WHERE question LIKE ? {"AND locale = ?" if locale else ""}
+            """
+            cursor.execute(query, [f"%{card_name}%"] + locale_params)
+            qa_results.extend(cursor.fetchall())
+
+    for result in qa_results:
+        rulings.append(_qa_ruling(result))
     
     # Check faq_tl_entries_fixed table
-    for card_name in card_names:
-        query = """
-        SELECT cardId, locale, effect, sourceHash, content, name
-        FROM faq_tl_entries_fixed
-        WHERE name = ?
-        """
-        cursor.execute(query, (card_name,))
-        results = cursor.fetchall()
-        for result in results:
-            rulings.append({
-                'source': 'faq_tl_entries_fixed',
-                'cardId': result[0],
-                'locale': result[1],
-                'effect': result[2],
-                'sourceHash': result[3],
-                'content': result[4],
-                'name': result[5]
-            })
-    
-    conn.close()
+    query = f"""
+    SELECT cardId, locale, effect, sourceHash, content, name
+    FROM faq_tl_entries_fixed
+    WHERE name IN ({placeholders}) {"AND locale = ?" if locale else ""}
+    """
+    cursor.execute(query, card_names + locale_params)
+    for result in cursor.fetchall():
+        rulings.append(_faq_ruling(result))
+
+    if locale and not rulings:
+        return get_exact_rulings(card_names, db_path, verbose)
     
     # Apply BM25 ranking to pare down to 10 most relevant rulings
     if rulings:
         ruling_texts = [r.get('question', '') + ' ' + r.get('answer', '') + ' ' + r.get('content', '') for r in rulings]
-        bm25 = BM25Okapi([text.split() for text in ruling_texts])
-        card_names_query = ' '.join(card_names)
-        scores = bm25.get_scores(card_names_query.split())
+        with span('bm25.rulings'):
+            bm25 = BM25Index.build([text.split() for text in ruling_texts])
+            card_names_query = ' '.join(card_names)
+            scores = bm25.get_scores(card_names_query.split())
         top_indices = np.argsort(scores)[-10:][::-1]
         rulings = [rulings[i] for i in top_indices]
     
@@ -148,20 +360,17 @@ def get_exact_rulings(card_names: List[str], db_path: str = 'yugioh.db', verbose
     
     return rulings
 
-def get_relevant_rulings(card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+def get_relevant_rulings(card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False,
+                         locale: Optional[str] = None) -> List[Dict[str, Any]]:
+    # Prebuilt BM25 index over all card descriptions (loaded once, rebuilt when the cards table changes)
+    card_index = get_card_index(db_path, verbose)
+
+    conn = get_connection(db_path)
     cursor = conn.cursor()
     
-    # Get all card descriptions for BM25
-    cursor.execute("SELECT name, desc FROM cards")
-    all_cards = cursor.fetchall()
-    
-    card_descriptions = [desc for _, desc in all_cards]
-    bm25 = BM25Okapi([desc.split() for desc in card_descriptions])
-    
     relevant_rulings = []
     
-    for card_name in card_names:
+    for card_name in resolve_card_names(cursor, card_names, locale):
         # Get the description of the current card
         cursor.execute("SELECT desc FROM cards WHERE name = ?", (card_name,))
         card_desc = cursor.fetchone()
@@ -169,20 +378,67 @@ def get_relevant_rulings(card_names: List[str], db_path: str = 'yugioh.db', verb
             continue
         
         # Find similar cards using BM25 (increased strictness)
-        scores = bm25.get_scores(card_desc[0].split())
-        similar_cards = [all_cards[i][0] for i in scores.argsort()[-5:][::-1]]  # Reduced from 10 to 5
+        with span('bm25.similar_cards'):
+            similar_cards = [card_index.labels[i] for i in card_index.top_n(card_desc[0].split(), 5)]  # Reduced from 10 to 5
         
         # Get exact match rulings for similar cards
-        similar_rulings = get_exact_rulings(similar_cards, db_path, verbose)
+        similar_rulings = get_exact_rulings(similar_cards, db_path, verbose, locale)
         relevant_rulings.extend(similar_rulings)
     
-    conn.close()
-    
     if verbose:
         print(f"Found {len(relevant_rulings)} relevant rulings for cards: {card_names}")
     
     return relevant_rulings
 
+def get_semantic_rulings(question: str, db_path: str = 'yugioh.db', k: int = DENSE_TOP_K, verbose: bool = False) -> List[Dict[str, Any]]:
+    # Nearest rulings to the question in embedding space; empty until `python dense_index.py` has run
+    dense_index = get_dense_index(db_path)
+    if dense_index is None:
+        return []
+
+    hits = dense_index.search(embed_texts([question])[0], k)
+    rowids = {source: [rowid for hit_source, rowid, _ in hits if hit_source == source] for source in RULING_SOURCES}
+
+    cursor = get_connection(db_path).cursor()
+    rows = {}
+    cursor.execute(f"SELECT rowid, {QA_COLUMNS} FROM qa_tl_fixed WHERE rowid IN ({', '.join('?' for _ in rowids['qa_tl_fixed'])})",
+                   rowids['qa_tl_fixed'])
+    rows.update((('qa_tl_fixed', row[0]), _qa_ruling(row[1:])) for row in cursor.fetchall())
+    cursor.execute(f"SELECT rowid, {FAQ_COLUMNS} FROM faq_tl_entries_fixed WHERE rowid IN ({', '.join('?' for _ in rowids['faq_tl_entries_fixed'])})",
+                   rowids['faq_tl_entries_fixed'])
+    rows.update((('faq_tl_entries_fixed', row[0]), _faq_ruling(row[1:])) for row in cursor.fetchall())
+
+    # Keep the nearest-first order from the index
+    semantic_rulings = [rows[(source, rowid)] for source, rowid, _ in hits if (source, rowid) in rows]
+
+    if verbose:
+        print(f"Found {len(semantic_rulings)} semantically similar rulings")
+
+    return semantic_rulings
+
+def ruling_key(ruling: Dict[str, Any]) -> tuple:
+    # FAQ rows are per card effect, so the effect number is part of their identity
+    if ruling['source'] == 'qa_tl_fixed':
+        return (ruling['source'], ruling.get('qaId'), ruling.get('locale'))
+    return (ruling['source'], ruling.get('cardId'), ruling.get('locale'), ruling.get('effect'))
+
+def fuse_rulings(ranked_lists: List[List[Dict[str, Any]]], budget: int = RERANK_CANDIDATE_BUDGET, k: int = RRF_K) -> List[Dict[str, Any]]:
+    # Reciprocal-rank fusion: each list adds 1 / (k + rank) for every ruling it contains
+    scores: Dict[tuple, float] = {}
+    rulings: Dict[tuple, Dict[str, Any]] = {}
+    for ranked in ranked_lists:
+        seen_in_list = set()
+        for rank, ruling in enumerate(ranked, 1):
+            key = ruling_key(ruling)
+            if key in seen_in_list:
+                continue
+            seen_in_list.add(key)
+            rulings.setdefault(key, ruling)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+
+    fused = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [rulings[key] for key in fused[:budget]]
+
 async def rerank_rulings(question: str, rulings: List[Dict[str, Any]], verbose: bool = False) -> List[Ruling]:
     total_rulings = len(rulings)
     print(f"Ranking {total_rulings} rulings...")
@@ -190,8 +446,9 @@ async def rerank_rulings(question: str, rulings: List[Dict[str, Any]], verbose:
     # Prepare pairs for the cross-encoder
     pairs = [(question, ruling.get('question', '') + ' ' + ruling.get('answer', '') + ' ' + ruling.get('content', '')) for ruling in rulings]
 
-    # Get scores from the cross-encoder
-    scores = cross_encoder.predict(pairs)
+    # Get scores from the cross-encoder (off the event loop, batched with other inquiries, cached)
+    with span('rerank'):
+        scores = await reranker.score(question, [text for _, text in pairs])
 
     # Sort rulings by score
     ranked_rulings = sorted(zip(rulings, scores), key=lambda x: x[1], reverse=True)
@@ -210,17 +467,41 @@ async def rerank_rulings(question: str, rulings: List[Dict[str, Any]], verbose:
     print(f"Selected top {len(top_rulings)} most relevant rulings.")
     return top_rulings
 
-async def get_rulings_for_question(question: str, card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False) -> Optional[List[Ruling]]:
-    exact_rulings = get_exact_rulings(card_names, db_path, verbose)
-    relevant_rulings = get_relevant_rulings(card_names, db_path, verbose)
-    all_rulings = exact_rulings + relevant_rulings
+async def search_card_by_name_async(card_name: str, db_path: str = 'yugioh.db', locale: Optional[str] = None) -> List[Dict[str, Any]]:
+    return await run_in_db(search_card_by_name, card_name, db_path, locale)
+
+async def get_rulings_for_question(question: str, card_names: List[str], db_path: str = 'yugioh.db', verbose: bool = False,
+                                   locale: Optional[str] = None) -> Optional[List[Ruling]]:
+    # Both lookups run on the database thread pool so they don't block the event loop
+    exact_rulings, relevant_rulings, semantic_rulings = await asyncio.gather(
+        run_in_db(get_exact_rulings, card_names, db_path, verbose, locale),
+        run_in_db(get_relevant_rulings, card_names, db_path, verbose, locale),
+        run_in_db(get_semantic_rulings, question, db_path, verbose=verbose),
+    )
+    # Dedupe and merge the lexical and semantic candidates, capped so the cross-encoder sees at most the budget
+    all_rulings = fuse_rulings([exact_rulings, relevant_rulings, semantic_rulings])
+    if verbose:
+        print(f"Fused {len(exact_rulings) + len(relevant_rulings) + len(semantic_rulings)} candidates into {len(all_rulings)}")
 
     reranked_rulings = await rerank_rulings(question, all_rulings, verbose)
     return reranked_rulings
 
-async def mechanics_search(card: Card) -> CardMechanic:
-    mechanics = analyze_card_mechanics(card)
-    return mechanics
+# Card Mechanics
+def get_card_mechanics(card: Card, db_path: str = 'yugioh.db') -> CardMechanic:
+    # One indexed lookup in the table the ETL precomputes (db_scripts/card_mechanics_table.py); cards that
+    # aren't in it, or a database built before it existed, fall back to the memoized analysis
+    cursor = get_connection(db_path).cursor()
+    try:
+        cursor.execute(f"SELECT {', '.join(MECHANIC_FIELDS)} FROM card_mechanics WHERE name = ? LIMIT 1", (card.name,))
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row is not None:
+        return mechanic_from_row(row)
+    return analyze_card_mechanics(card)
+
+async def mechanics_search(card: Card, db_path: str = 'yugioh.db') -> CardMechanic:
+    return await run_in_db(get_card_mechanics, card, db_path)
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from db import get_db_version
+from dense_index import embed_texts
+
+try:
+    import fcntl
+except ImportError:
+    # Not POSIX: no preforked workers either, so only threads of one process share the cache
+    fcntl = None
+
+# Near-duplicate question cache.
+# Stores the final Answer of each conclusive inquiry with an embedding of its question. A new
+# inquiry about the same set of cards reuses that Answer when the cosine similarity of the two
+# questions is at least SEMANTIC_CACHE_THRESHOLD, so rewordings skip the agent loop entirely.
+# On disk it is one .npz holding the float16 vector matrix and the JSON list of entries, replaced
+# atomically, so a reader never pairs the vectors of one save with the entries of another; the least
+# recently used entries are evicted past SEMANTIC_CACHE_MAX_ENTRIES. Several server processes
+# (prefork.py) can share one directory: each reloads the file when another one saved a newer one, and
+# a store re-reads it under an exclusive file lock before saving, so concurrent stores all land.
+
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", "semantic_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+def card_set_key(card_names: List[str]) -> str:
+    return '\x1f'.join(sorted(set(card_names)))
+
+class SemanticCache:
+    def __init__(self, cache_dir: str = SEMANTIC_CACHE_DIR, db_path: str = 'yugioh.db',
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._by_card_set: Dict[str, List[int]] = {}
+        self._loaded = False
+        self._loaded_version: Optional[Tuple[int, int]] = None
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(self.cache_dir, 'cache.npz')
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.cache_dir, 'cache.lock')
+
+    def _disk_version(self) -> Optional[Tuple[int, int]]:
+        # Every save replaces the file, so a new inode (or mtime) means another process saved
+        try:
+            stat = os.stat(self.cache_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @staticmethod
+    def _entry_key(entry: Dict[str, Any]) -> tuple:
+        return entry['card_set'], entry['question'], entry['created']
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # Serializes read-modify-write of the file between processes
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        version = self._disk_version()
+        if self._loaded and version == self._loaded_version:
+            return
+        self._loaded = True
+        if version is None:
+            return
+        with np.load(self.cache_path) as data:
+            vectors = data['vectors']
+            entries = json.loads(data['entries'].tobytes().decode('utf-8'))
+        # Hits this process served since its last load only updated its own copy; keep the later one
+        last_hits = {self._entry_key(entry): entry['last_hit'] for entry in self._entries}
+        for entry in entries:
+            entry['last_hit'] = max(entry['last_hit'], last_hits.get(self._entry_key(entry), 0.0))
+        self._vectors, self._entries = vectors, entries
+        self._loaded_version = version
+        self._reindex()
+
+    def _reindex(self):
+        self._by_card_set = {}
+        for i, entry in enumerate(self._entries):
+            self._by_card_set.setdefault(entry['card_set'], []).append(i)
+
+    def _save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp.npz'
+        np.savez(
+            tmp_path,
+            vectors=self._vectors,
+            entries=np.frombuffer(json.dumps(self._entries).encode('utf-8'), dtype=np.uint8),
+        )
+        os.replace(tmp_path, self.cache_path)
+        self._loaded_version = self._disk_version()
+
+    def _candidates(self, card_names: List[str]) -> List[int]:
+        db_version = get_db_version(self.db_path)
+        return [i for i in self._by_card_set.get(card_set_key(card_names), []) if self._entries[i]['db_version'] == db_version]
+
+    def lookup(self, question: str, card_names: List[str]) -> Optional[Dict[str, str]]:
+        with self._lock:
+            self._load()
+            if not self._candidates(card_names):
+                self.misses += 1
+                return None
+
+        # Embed outside the lock, then look the candidates up again in case entries were evicted meanwhile
+        query_vector = embed_texts([question])[0]
+        with self._lock:
+            candidates = self._candidates(card_names)
+            if not candidates:
+                self.misses += 1
+                return None
+            similarities = self._vectors[candidates].astype(np.float32) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[candidates[best]]
+            entry['last_hit'] = time.time()
+            self.hits += 1
+            return dict(entry['answer'])
+
+    def store(self, question: str, card_names: List[str], answer: Dict[str, str]):
+        vector = embed_texts([question])[0].astype(np.float16)
+        # Under the file lock, the load picks up every entry other processes stored before this one
+        with self._lock, self._file_lock():
+            self._load()
+            now = time.time()
+            self._entries.append({
+                'card_set': card_set_key(card_names),
+                'question': question,
+                'answer': answer,
+                'db_version': get_db_version(self.db_path),
+                'created': now,
+                'last_hit': now,
+            })
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector[None, :]])
+
+            # Drop answers recorded against older rulings, then keep the most recently used entries
+            db_version = self._entries[-1]['db_version']
+            keep = [i for i, entry in enumerate(self._entries) if entry['db_version'] == db_version]
+            if len(keep) > self.max_entries:
+                keep = sorted(sorted(keep, key=lambda i: self._entries[i]['last_hit'])[-self.max_entries:])
+            if len(keep) < len(self._entries):
+                self._entries = [self._entries[i] for i in keep]
+                self._vectors = self._vectors[keep]
+            self._reindex()
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+        }
@@ -1,15 +1,30 @@
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import asyncio
 import json
-from search import search_card_by_name
+from search import get_cross_encoder, search_card_by_name_async
+from db import run_in_db
+from inquiry_cache import InquiryCache
+from semantic_cache import SemanticCache
+from metrics import INQUIRIES, INQUIRY_SECONDS, render as render_metrics, trace_inquiry
+from bm25_index import get_card_index
+from card_mentions import get_card_mention_matcher
+from dense_index import get_dense_index, get_embedder
+from rulebook_index import get_rulebook_index
+from prefork import SERVER_WORKERS, serve
+from warmup import WarmUp
 import logging
 from starlette.websockets import WebSocketDisconnect  # Add this import
 import uvicorn
-from agent import YuGiOhAgent, Card, prompt  # Import the agent and necessary classes
+from agent import YuGiOhAgent, AgentDelta, Card, get_client, prompt  # Import the agent and necessary classes
 
 app = FastAPI()
 
+# Recorded agent responses for repeated inquiries, and final answers for reworded ones
+inquiry_cache = InquiryCache()
+semantic_cache = SemanticCache()
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +45,33 @@ def log(message):
     if ENABLE_LOGGING:
         logger.info(message)
 
+# Models and read-only indexes of the inquiry path: loaded in the background after startup, or once
+# in the prefork master and shared copy-on-write by the workers. card_search needs none of them
+warm_up = WarmUp([
+    ("card_index", lambda: get_card_index('yugioh.db')),
+    ("card_mentions", lambda: get_card_mention_matcher('yugioh.db')),
+    ("dense_index", lambda: get_dense_index('yugioh.db')),
+    ("rulebook_index", lambda: get_rulebook_index('yugioh.db')),
+    ("cross_encoder", get_cross_encoder),
+    ("embedder", get_embedder),
+    ("llm_client", get_client),
+])
+
+@app.on_event("startup")
+async def start_warm_up():
+    warm_up.start()
+
+@app.get("/ready")
+async def ready():
+    # Readiness probe: 503 until every model and index is loaded
+    status = warm_up.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    # Stage latency histograms and agent counters in the Prometheus text format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -46,8 +88,9 @@ async def websocket_endpoint(websocket: WebSocket):
                 log(f"type check: {type}")
                 if json_data.get("type") == "card_search":
                     query = json_data.get("query", "")
+                    locale = json_data.get("locale")  # optional, e.g. "ja"; all locales when omitted
                     log(f"Searching for card: {query}")
-                    results = search_card_by_name(query)
+                    results = await search_card_by_name_async(query, locale=locale)
                     await websocket.send_json({
                         "type": "search_results",
                         "results": results
@@ -68,16 +111,56 @@ async def websocket_endpoint(websocket: WebSocket):
                     log("Sent inquiry confirmation")
                     '''
                     cards = [Card(**card) for card in json_data.get("cards", [])]
-                    log(f"Received inquiry: {question} for cards: {', '.join([card.name for card in cards])}")
-                    
-                    # Create a new instance of the agent for each inquiry to ensure state is reset
-                    agent = YuGiOhAgent(prompt, verbose=True)
-                    # Call the agent and stream the response
-                    async for response in agent(question, cards):
-                        await websocket.send_json({
-                            "type": "agent_response",
-                            "data": response.dict()
-                        })
+                    card_names = [card.name for card in cards]
+                    log(f"Received inquiry: {question} for cards: {', '.join(card_names)}")
+
+                    # Everything the inquiry does is timed into its trace; the breakdown goes out with the final message
+                    with trace_inquiry() as trace:
+                        # Replay a previously recorded answer for the same question, cards and database version
+                        cached_responses = await run_in_db(inquiry_cache.get, question, card_names)
+                        if cached_responses is not None:
+                            for i, data in enumerate(cached_responses):
+                                message = {
+                                    "type": "agent_response",
+                                    "data": data,
+                                    "cached": True
+                                }
+                                if i == len(cached_responses) - 1:
+                                    message["timings"] = trace.breakdown()
+                                await websocket.send_json(message)
+                            INQUIRIES.inc(source="inquiry_cache")
+                            INQUIRY_SECONDS.observe(trace.elapsed(), source="inquiry_cache")
+                            log(f"Replayed cached inquiry ({inquiry_cache.hits} hits / {inquiry_cache.misses} misses)")
+                            continue
+
+                        # Create a new instance of the agent for each inquiry to ensure state is reset
+                        # prefetch runs the mechanics analysis and ruling search for every card before the first turn
+                        # link_mentions adds cards that the question names but the user didn't select
+                        agent = YuGiOhAgent(prompt, verbose=True, prefetch=True, stream=True, semantic_cache=semantic_cache,
+                                            link_mentions=True)
+                        # Call the agent and stream the response: agent_delta carries partial thought/answer
+                        # text as tokens arrive, agent_response the parsed step once the completion is done
+                        recorded_responses = []
+                        async for response in agent(question, cards):
+                            data = response.dict()
+                            message = {
+                                "type": "agent_delta" if isinstance(response, AgentDelta) else "agent_response",
+                                "data": data
+                            }
+                            if not isinstance(response, AgentDelta):
+                                recorded_responses.append(data)
+                                # Only the final response of an inquiry carries an answer
+                                if data.get("answer"):
+                                    message["timings"] = trace.breakdown()
+                            await websocket.send_json(message)
+
+                        # Only conclusive answers are worth replaying
+                        final_answer = recorded_responses[-1].get("answer") if recorded_responses else None
+                        if final_answer and not final_answer["ruling"].startswith("Inconclusive"):
+                            await run_in_db(inquiry_cache.put, question, card_names, recorded_responses)
+                        INQUIRIES.inc(source="agent")
+                        INQUIRY_SECONDS.observe(trace.elapsed(), source="agent")
+                        log(f"Inquiry timings: {trace.breakdown()}")
                     
                     log("Finished processing inquiry")
             except json.JSONDecodeError:
@@ -90,5 +173,6 @@ async def websocket_endpoint(websocket: WebSocket):
         log("WebSocket connection closed!")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # SERVER_WORKERS > 1 preforks that many workers sharing the models and indexes (prefork.py)
+    serve(app, host="0.0.0.0", port=8000, workers=SERVER_WORKERS, preload=warm_up.run)
     #uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
\ No newline at end of file
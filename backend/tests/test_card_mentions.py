@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'db_scripts'))
+import db
+from card_mentions import get_card_mention_matcher
+from db_meta import bump_db_version
+from fixture import build_fixture
+
+
+def test_matcher_rebuilt_after_cards_change(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'yugioh.db')
+    names = build_fixture(db_path, cards=20, rulings=10, seed=0)
+    text = f'Can "{names[0]}" negate "Brand New Dragon"?'
+    assert get_card_mention_matcher(db_path).mentioned_names(text) == [names[0]]
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO card_names VALUES ('Brand New Dragon', 'en', 1, 'Brand New Dragon')")
+        bump_db_version(conn, 'cards')
+    conn.close()
+    # Don't wait out DB_VERSION_TTL
+    monkeypatch.setattr(db, '_db_versions', {})
+    assert get_card_mention_matcher(db_path).mentioned_names(text) == [names[0], 'Brand New Dragon']
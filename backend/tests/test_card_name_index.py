@@ -0,0 +1,38 @@
+import json
+import os
+import sqlite3
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'db_scripts'))
+from card_name_index import refresh_card_name_keys
+from card_store import build_card_store
+from fixture import build_fixture
+
+
+def write_card(cards_dir, locale, card):
+    os.makedirs(cards_dir / locale, exist_ok=True)
+    (cards_dir / locale / f"{card['id']}.json").write_text(json.dumps(card, ensure_ascii=False), encoding='utf-8')
+
+
+def test_refresh_reads_names_from_the_given_store(tmp_path):
+    db_path = str(tmp_path / 'yugioh.db')
+    build_fixture(db_path, cards=20, rulings=10, seed=0)
+    cards_dir = tmp_path / 'cards'
+    write_card(cards_dir, 'en', {'id': 4242, 'name': 'Brand New Dragon'})
+    write_card(cards_dir, 'ja', {'id': 4242, 'name': 'ブランニュー・ドラゴン', 'nameRuby': 'ぶらんにゅー・どらごん'})
+    store_dir = str(tmp_path / 'card_store')
+    build_card_store(str(cards_dir), store_dir)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO cards VALUES (1, 'Brand New Dragon', 'Normal Monster', '', 'Dragon', 0, 0, 'LIGHT', '{}', 1)")
+        # The JSON directory isn't there: the names can only come from the store
+        refresh_card_name_keys(conn, ['Brand New Dragon'], str(tmp_path / 'no_cards'), store_dir)
+    rows = conn.execute("SELECT locale, card_id, name FROM card_names WHERE en_name = 'Brand New Dragon' ORDER BY locale").fetchall()
+    kinds = conn.execute("SELECT kind FROM card_name_keys WHERE en_name = 'Brand New Dragon' AND locale = 'ja' ORDER BY kind").fetchall()
+    conn.close()
+    assert rows == [('en', 4242, 'Brand New Dragon'), ('ja', 4242, 'ブランニュー・ドラゴン')]
+    assert kinds == [('name',), ('ruby',)]
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'db_scripts'))
+from etl import iter_json_array
+
+DOCUMENT = json.dumps({
+    'meta': {'count': 6},
+    'data': [12345, 678, -1.5e3, True, None, 'a "quoted" string', {'id': 7, 'name': 'Dark Magician', 'atk': 2500}, [1, [2, 3]]],
+    'after': 0,
+})
+
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+@pytest.mark.parametrize('size', range(1, len(DOCUMENT) + 1))
+def test_items_do_not_depend_on_chunk_size(size):
+    assert list(iter_json_array(chunked(DOCUMENT, size))) == json.loads(DOCUMENT)['data']
+
+
+@pytest.mark.parametrize('size', range(1, 12))
+def test_numbers_split_across_chunks(size):
+    assert list(iter_json_array(chunked('{"data": [12345, 678, 1e3, -2.25E-2, 0]}', size))) == [12345, 678, 1e3, -2.25e-2, 0]
+
+
+def test_unterminated_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked('{"data": [1, 2', 4)))
@@ -0,0 +1,17 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'db_scripts'))
+from fix_rulings import init_rewrite_worker, is_stale, with_stored_hashes
+
+
+def test_rows_missing_from_the_output_are_stale():
+    init_rewrite_worker({}, set(), full=False)
+    rows = [(1, 'en', 'a'), (2, 'en', 'b')]
+    seen = set()
+    [chunk] = with_stored_hashes([rows], {(1, 'en'): 'a'}, 2, seen)
+    assert chunk == [((1, 'en', 'a'), 'a'), ((2, 'en', 'b'), None)]
+    assert seen == {(1, 'en'), (2, 'en')}
+    assert [is_stale(stored_hash, row[2]) for row, stored_hash in chunk] == [False, True]
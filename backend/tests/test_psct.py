@@ -0,0 +1,78 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from psct import parse_effects
+
+ASH_BLOSSOM = (
+    'When a card or effect is activated that includes any of these effects (Quick Effect): '
+    'You can discard this card; negate the activation.\n'
+    '● Add a card from the Deck to your hand.\n'
+    '● Special Summon from the Deck.\n'
+    '● Send a card from the Deck to the GY.\n'
+    'You can only use this effect of "Ash Blossom & Joyous Spring" once per turn.'
+)
+
+
+def test_labeled_effects():
+    effects = parse_effects(
+        '(1): If this card is Normal Summoned: You can add 1 "Test Card" from your Deck to your hand.\n'
+        '(2): You can draw 1 card.\n'
+        '(3): Cannot be destroyed by battle.'
+    )
+    assert [effect.number for effect in effects] == [1, 2, 3]
+    assert [effect.effect_type for effect in effects] == ['Trigger', 'Ignition', 'Continuous']
+    assert effects[0].condition == 'If this card is Normal Summoned'
+
+
+def test_trailing_restriction_with_bullet_list():
+    effects = parse_effects(ASH_BLOSSOM)
+    assert len(effects) == 1
+    ash = effects[0]
+    assert ash.effect_type == 'Quick'
+    assert ash.cost == 'You can discard this card'
+    assert ash.hard_once_per_turn
+    assert '● Send a card from the Deck to the GY.' in ash.text
+
+
+def test_trailing_restriction_of_numbered_effect():
+    effects = parse_effects(
+        '(1): If this card is Normal Summoned: You can draw 1 card.\n'
+        '(2): If this card is sent to the GY: You can target 1 monster in your GY; add it to your hand.\n'
+        'You can only use the (2) effect of "Test Card" once per turn.'
+    )
+    assert [effect.hard_once_per_turn for effect in effects] == [False, True]
+    assert effects[1].targeting
+
+
+def test_leading_restriction_of_following_effects():
+    effects = parse_effects(
+        'You can only use each of the following effects of "Test Card" once per turn.\n'
+        '● If this card is Normal Summoned: You can draw 1 card.\n'
+        '● If this card is sent to the GY: You can add 1 card from your GY to your hand.'
+    )
+    assert len(effects) == 2
+    assert all(effect.hard_once_per_turn for effect in effects)
+    assert all(effect.effect_type == 'Trigger' for effect in effects)
+    assert effects[1].condition == 'If this card is sent to the GY'
+
+
+def test_card_activation_restriction():
+    effects = parse_effects('Draw 2 cards. You can only activate 1 "Test Spell" per turn.')
+    assert len(effects) == 1
+    assert effects[0].hard_once_per_turn
+
+
+def test_modal_effect_activates_through_bullets():
+    effects = parse_effects('Activate 1 of these effects.\n● Target 1 monster on the field; destroy it.\n● Draw 1 card.')
+    assert len(effects) == 1
+    assert effects[0].effect_type == 'Ignition'
+    assert effects[0].targeting
+
+
+def test_material_line():
+    effects = parse_effects('2 Level 4 monsters\nOnce per turn: You can detach 1 material from this card; draw 1 card.')
+    assert [effect.effect_type for effect in effects] == ['Materials', 'Ignition']
+    assert effects[1].cost == 'You can detach 1 material from this card'
+    assert effects[1].usage_limit == 'once per turn'
@@ -0,0 +1,36 @@
+import logging
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+import rulebook_index
+from rulebook_index import build_rulebook_index, get_rulebook_index
+
+RULEBOOK = '''CHAIN LINKS
+When a card or effect is activated in response to another, the activations form a chain. Each
+activation is a chain link, and the chain resolves from the last chain link back to the first one,
+so the card or effect activated last resolves first.
+'''
+
+
+def test_index_built_after_a_miss_is_picked_up(tmp_path, caplog):
+    db_path = str(tmp_path / 'yugioh.db')
+    source = tmp_path / 'rulebook.txt'
+    source.write_text(RULEBOOK, encoding='utf-8')
+
+    with caplog.at_level(logging.WARNING, logger='rulebook_index'):
+        assert get_rulebook_index(db_path) is None
+        # Re-checked on every call past the interval, but the notice is only logged once
+        rulebook_index._rulebook_index_checked[db_path] = 0.0
+        assert get_rulebook_index(db_path) is None
+    assert len(caplog.records) == 1
+
+    # Built by another process: this one still has the miss cached
+    build_rulebook_index(db_path, [str(source)], embeddings=False, verbose=False)
+    rulebook_index._rulebook_indexes[db_path] = None
+    assert get_rulebook_index(db_path) is None
+    rulebook_index._rulebook_index_checked[db_path] = 0.0
+    index = get_rulebook_index(db_path)
+    assert index is not None
+    assert [section['title'] for section in index.sections] == ['CHAIN LINKS']
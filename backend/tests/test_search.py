@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+from fixture import build_fixture
+from search import get_exact_rulings
+
+
+@pytest.fixture(scope='module')
+def db_without_mentions(tmp_path_factory):
+    # A database from before fix_rulings.py built the card -> QA mapping
+    db_path = str(tmp_path_factory.mktemp('db') / 'yugioh.db')
+    build_fixture(db_path, cards=50, rulings=150, seed=0)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DROP TABLE qa_card_mentions")
+        question = conn.execute("SELECT question FROM qa_tl_fixed LIMIT 1").fetchone()[0]
+        card = conn.execute("SELECT name FROM cards WHERE instr(?, name) > 0 LIMIT 1", (question,)).fetchone()[0]
+    conn.close()
+    return db_path, card
+
+
+@pytest.mark.parametrize('locale', [None, 'en'])
+def test_exact_rulings_without_mentions_table(db_without_mentions, locale):
+    db_path, card = db_without_mentions
+    rulings = get_exact_rulings([card], db_path, locale=locale)
+    qa_rulings = [ruling for ruling in rulings if ruling['source'] == 'qa_tl_fixed']
+    assert qa_rulings
+    assert all(card in ruling['question'] for ruling in qa_rulings)
@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Background warm-up of the models and indexes behind inquiries, and the readiness state of /ready.
+# Nothing heavy loads when server.py is imported: torch, sentence-transformers and the models load
+# on first use, so card_search is served as soon as the process is up. WarmUp.start() loads them
+# on a background thread right after startup so the first inquiry doesn't pay for it; every step is
+# one of the lazy getters (get_cross_encoder, get_card_index, ...), so an inquiry that arrives
+# first simply loads that piece itself and the warm-up finds it done. prefork.py calls run() in the
+# master instead, before the workers are forked.
+
+logger = logging.getLogger(__name__)
+
+class WarmUp:
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        self.steps = steps
+        self._status: Dict[str, Dict[str, Any]] = {name: {'state': 'pending'} for name, _ in steps}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    def run(self):
+        for name, step in self.steps:
+            with self._lock:
+                if self._status[name]['state'] == 'ready':
+                    continue
+                self._status[name] = {'state': 'loading'}
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                # A failed step stays unready; the inquiry path retries it lazily on first use
+                logger.exception(f"Warm-up step {name} failed")
+                status = {'state': 'failed', 'error': str(e)}
+            else:
+                status = {'state': 'ready'}
+            status['seconds'] = round(time.perf_counter() - start, 3)
+            with self._lock:
+                self._status[name] = status
+            logger.info(f"Warm-up {name}: {status['state']} in {status['seconds']:.2f}s")
+        self._done.set()
+
+    def start(self):
+        # Once per process; a worker forked after run() finds everything ready
+        with self._lock:
+            if self._thread is not None or self._done.is_set():
+                return
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(status['state'] == 'ready' for status in self._status.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(status) for name, status in self._status.items()}
+        return {
+            'ready': all(status['state'] == 'ready' for status in steps.values()),
+            'steps': steps,
+        }